@@ -0,0 +1,2 @@
+""" Stand-alone scripts measuring the cost of FreeNote's persistence paths. Run them from the repository root as
+modules, e.g. `python -m benchmarks.fsync_policy`. None of them need a display. """
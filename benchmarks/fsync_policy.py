@@ -0,0 +1,51 @@
+""" measures how long saving a notebook takes under each fsync policy, to choose between durability and latency.
+
+Usage: python -m benchmarks.fsync_policy [directory] [repetitions]
+
+Run it against the directory you actually keep your workspace in (a network home directory behaves very
+differently from a local SSD). Defaults to a temporary directory. """
+
+import sys
+from io import StringIO
+from os import remove
+from os.path import join, getsize
+from tempfile import mkdtemp
+from time import perf_counter
+from statistics import median
+from benchmarks.synthetic import make_notebook
+from oyaml import dump
+from utilities.notebook_files import write_snapshot, Dumper
+from utilities.atomic_write import FSYNC_POLICIES
+
+
+def bench(directory: str, repetitions: int):
+    filename = join(directory, "notebook-fsync-benchmark.fnbook")
+    data = make_notebook(sections=2, pages=5)
+    # warm up, and report the size we're writing
+    write_snapshot(filename, data, FSYNC_POLICIES[0])
+    print("writing {:.1f} KB to {}, {} times per policy".format(getsize(filename) / 1024, directory, repetitions))
+    # serializing costs the same under every policy; subtract it to see what each policy costs on this disk
+    start = perf_counter()
+    for _ in range(repetitions):
+        dump(data, StringIO(), Dumper=Dumper)
+    print("serialize only: {:8.2f} ms".format((perf_counter() - start) * 1000 / repetitions))
+    try:
+        for policy in FSYNC_POLICIES:
+            times = []
+            for _ in range(repetitions):
+                start = perf_counter()
+                write_snapshot(filename, data, policy)
+                times.append((perf_counter() - start) * 1000)
+            times.sort()
+            print("{:>8}: median {:8.2f} ms   p95 {:8.2f} ms   max {:8.2f} ms".format(
+                policy, median(times), times[int(len(times) * 0.95) - 1], times[-1]
+            ))
+    finally:
+        remove(filename)
+
+
+if __name__ == "__main__":
+    bench(
+        sys.argv[1] if len(sys.argv) > 1 else mkdtemp(),
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+    )
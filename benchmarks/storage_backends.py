@@ -0,0 +1,101 @@
+""" compares the YAML, sharded YAML and SQLite storage backends on a synthetic workspace: saving and loading whole notebooks,
+loading a single page, saving a single item edit, and searching the workspace for text.
+
+Usage: python -m benchmarks.storage_backends [notebooks] [repetitions] """
+
+import sys
+from tempfile import mkdtemp
+from time import perf_counter
+from statistics import median
+from benchmarks.synthetic import make_notebook
+from settings.__init__ import settings
+from storage import open_store, BACKEND_YAML, BACKEND_SQLITE, BACKEND_SHARDED
+from utilities.journal import diff
+
+
+def _time(repetitions: int, f) -> float:
+    """ median milliseconds taken by f """
+    times = []
+    for _ in range(repetitions):
+        start = perf_counter()
+        f()
+        times.append((perf_counter() - start) * 1000)
+    return median(times)
+
+
+def _edit(data: dict) -> dict:
+    """ a copy of data with one item moved, sharing every untouched container like a real snapshot would """
+    section_id, section = next(iter(data["sections"].items()))
+    page_id, page = next(iter(section["pages"].items()))
+    item_id, item = next(iter(page["items"].items()))
+    geometry = item["geometry"]
+    new_page = dict(page, items=dict(page["items"]))
+    new_page["items"][item_id] = dict(item, geometry=(geometry[0] + 1,) + tuple(geometry[1:]))
+    new_section = dict(section, pages=dict(section["pages"]))
+    new_section["pages"][page_id] = new_page
+    new = dict(data, sections=dict(data["sections"]))
+    new["sections"][section_id] = new_section
+    return new
+
+
+def _search_yaml(store, text: str) -> list:
+    found = []
+    for id in store.notebook_ids():
+        for section_id, section in store.load_notebook(id)["sections"].items():
+            for page_id, page in section["pages"].items():
+                for item_id, item in page["items"].items():
+                    if text in item["contents"].get("value", ""):
+                        found.append((id, section_id, page_id, item_id))
+    return found
+
+
+def bench(notebooks: int, repetitions: int):
+    settings.override("workspace_dir", mkdtemp())
+    settings.override("asset_dir", settings.workspace_dir)
+    workspace = [make_notebook("Notebook {}".format(i), seed=i) for i in range(notebooks)]
+    print("{} notebooks of {} items each, in {}".format(notebooks, sum(
+        len(page["items"]) for section in workspace[0]["sections"].values() for page in section["pages"].values()
+    ), settings.workspace_dir))
+    for backend in (BACKEND_YAML, BACKEND_SHARDED, BACKEND_SQLITE):
+        store = open_store(backend)
+        results = {}
+
+        def save_workspace():
+            for data in workspace:
+                if backend == BACKEND_SHARDED:
+                    # otherwise every page after the first save is skipped as unchanged
+                    store.remove_notebook(data["id"])
+                store.write_notebook(data["id"], data)
+        results["save workspace"] = _time(repetitions, save_workspace)
+        results["load workspace"] = _time(repetitions, lambda: [store.load_notebook(id) for id in store.notebook_ids()])
+        first = workspace[0]
+        section_id = next(iter(first["sections"]))
+        page_id = next(iter(first["sections"][section_id]["pages"]))
+        if backend == BACKEND_YAML:
+            # a YAML notebook has to be parsed whole to read any of it
+            results["load one page"] = _time(
+                repetitions, lambda: store.load_notebook(first["id"])["sections"][section_id]["pages"][page_id]
+            )
+        else:
+            results["load one page"] = _time(repetitions, lambda: store.load_page(first["id"], section_id, page_id))
+        if backend == BACKEND_SQLITE:
+            results["search workspace"] = _time(repetitions, lambda: store.find_items("summary meeting"))
+        else:
+            results["search workspace"] = _time(repetitions, lambda: _search_yaml(store, "summary meeting"))
+        state = {"saved": store.load_notebook(first["id"])}
+
+        def save_edit():
+            edited = _edit(state["saved"])
+            store.notebook_job(first["id"], edited, diff(state["saved"], edited))()
+            state["saved"] = edited
+        results["save one item"] = _time(repetitions, save_edit)
+        print(backend)
+        for name, ms in results.items():
+            print("  {:>18}: {:10.2f} ms".format(name, ms))
+
+
+if __name__ == "__main__":
+    bench(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 3,
+    )
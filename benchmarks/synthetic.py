@@ -0,0 +1,44 @@
+""" builds synthetic workspace data in the same shape Notebook.snapshot produces, for benchmarking """
+
+from random import Random
+
+_WORDS = ("note", "meeting", "project", "idea", "review", "draft", "todo", "design", "plan", "summary")
+
+
+def _html(rng: Random, words: int) -> str:
+    body = " ".join(rng.choice(_WORDS) for _ in range(words))
+    # roughly what QTextEdit.toHtml produces around a paragraph of text
+    return ('<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.0//EN" "http://www.w3.org/TR/REC-html40/strict.dtd">\n'
+            '<html><head><meta name="qrichtext" content="1" /><style type="text/css">\np, li {{ white-space: pre-wrap; '
+            '}}\n</style></head><body style=" font-family:\'Sans Serif\'; font-size:10pt;">\n<p style=" margin-top:0px; '
+            'margin-bottom:0px;">{}</p></body></html>').format(body)
+
+
+def make_notebook(id="Benchmark", sections=4, pages=10, items=20, words=200, images=2, seed=0) -> dict:
+    """ a notebook with sections * pages * items text items (of roughly `words` words each), plus `images` image
+    items per page """
+    rng = Random(seed)
+    data = {"id": id, "sections": {}}
+    for s in range(sections):
+        section = {"pages": {}}
+        for p in range(pages):
+            page = {"items": {}, "geometry": (1200, 2000)}
+            for i in range(items):
+                page["items"]["Text Box {}".format(i) if i else "Text Box"] = {
+                    "geometry": (rng.randrange(1000), rng.randrange(1800), 400, 100),
+                    "contents": {"type": "text", "value": _html(rng, words)},
+                }
+            for i in range(images):
+                name = "{:032x}".format(rng.getrandbits(128))
+                page["items"]["Image {}".format(i) if i else "Image"] = {
+                    "geometry": (rng.randrange(1000), rng.randrange(1800), 200, 150),
+                    "contents": {
+                        "type": "image",
+                        "url": "file:{}.fna".format(name),
+                        "asset_name": name,
+                        "extra": {"transform": {"rotation": 0}},
+                    },
+                }
+            section["pages"]["page-{}".format(p + 1)] = page
+        data["sections"]["section-{}".format(chr(ord("A") + s))] = section
+    return data
@@ -0,0 +1,49 @@
+""" compares how long loading and saving a large notebook takes with libyaml's C parser and emitter against PyYAML's
+pure Python ones.
+
+Usage: python -m benchmarks.yaml_speed [repetitions] """
+
+import sys
+from io import StringIO
+from time import perf_counter
+from statistics import median
+from oyaml import load, dump, FullLoader, Dumper
+from benchmarks.synthetic import make_notebook
+from utilities import notebook_files
+
+
+def _time(repetitions: int, fn) -> float:
+    times = []
+    for _ in range(repetitions):
+        start = perf_counter()
+        fn()
+        times.append((perf_counter() - start) * 1000)
+    return median(times)
+
+
+def bench(repetitions: int):
+    data = make_notebook(sections=4, pages=10)
+    text = dump(data, Dumper=Dumper)
+    print("notebook of {:.1f} KB, median of {} runs".format(len(text.encode()) / 1024, repetitions))
+    implementations = [("pure python", FullLoader, Dumper)]
+    if notebook_files.Loader is not FullLoader:
+        implementations.append(("libyaml", notebook_files.Loader, notebook_files.Dumper))
+    else:
+        print("libyaml isn't available; PyYAML was installed without it")
+    results = {}
+    for name, loader, dumper in implementations:
+        if load(text, Loader=loader) != data:
+            raise AssertionError("{} didn't load the notebook back unchanged".format(name))
+        results[name] = (
+            _time(repetitions, lambda: load(text, Loader=loader)),
+            _time(repetitions, lambda: dump(data, StringIO(), Dumper=dumper)),
+        )
+        print("{:>12}: load {:9.2f} ms   dump {:9.2f} ms".format(name, *results[name]))
+    if len(results) == 2:
+        print("     speedup: load {:8.1f}x    dump {:8.1f}x".format(
+            results["pure python"][0] / results["libyaml"][0], results["pure python"][1] / results["libyaml"][1]
+        ))
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
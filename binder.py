@@ -1,14 +1,35 @@
-from PySide6.QtWidgets import QTabWidget
+from PySide6.QtWidgets import QTabWidget, QWidget, QProgressBar
+from PySide6.QtCore import QTimer, Qt
 from settings.__init__ import G_QSETTINGS, settings
 from utilities.rename_dialog import RenameableMixin
+from utilities.save_mixin import ChangeTracker
+from utilities.save_worker import g_save_worker
+from utilities.debounce import g_save_debouncer
 from notebook import Notebook
-from os import path, listdir, rename
+from storage import workspace_store
+from storage.parallel_load import ParallelLoader
 from style_consants import TAB_PANE_BORDER_COLOR
+from time import perf_counter
 
 
-class Binder(QTabWidget, RenameableMixin):
-    """ Binders are the root of the notebook workspace. Where each notebook is a file, binders are the folder those
-    files are in. Binders display each notebook as a tab, and allow the user to add a new notebook. """
+class NotebookPlaceholder(QWidget):
+    """ Stands in for a notebook that hasn't been loaded yet. Knows only the notebook's id, which the storage backend
+    can list without reading the notebook itself """
+
+    # nothing to save until the real notebook is loaded
+    dirty = False
+
+    def __init__(self, id: str):
+        super().__init__()
+        self.id = id
+        # being parsed in a worker process, so the warm timer leaves it alone
+        self.parsing = False
+
+
+class Binder(QTabWidget, RenameableMixin, ChangeTracker):
+    """ Binders are the root of the notebook workspace. Where each notebook is a file (or a set of rows, depending on
+    the storage backend), binders are the folder those files are in. Binders display each notebook as a tab, and allow
+    the user to add a new notebook. """
 
     _unique_resource_name = "notebook"
 
@@ -18,9 +39,18 @@ class Binder(QTabWidget, RenameableMixin):
         super().__init__()
         self.notebooks = []
         self.ids = set()
-        self._just_loaded = False
         self.setTabPosition(self.West)
         self.tabBarDoubleClicked.connect(self._rename_dialog)
+        self.currentChanged.connect(self._notebook_activated)
+        # loads the notebooks nobody has looked at yet, one at a time, whenever the event loop is idle
+        self._warm_timer = QTimer(self)
+        self._warm_timer.setInterval(0)
+        self._warm_timer.timeout.connect(self._warm_next)
+        self._loader = None
+        self._progress = QProgressBar(self)
+        self._progress.setFormat("Loading %v/%m")
+        self._progress.hide()
+        self.setCornerWidget(self._progress, Qt.TopLeftCorner)
         self.setStyleSheet("""
         QTabWidget::pane {{
             border: 0px;
@@ -36,33 +66,114 @@ class Binder(QTabWidget, RenameableMixin):
         if index > len(self.notebooks):
             return True
         if new_id not in self.ids:
-            notebook = self.notebooks[index]
+            # the notebook's id is saved inside it, so it has to be loaded to be renamed
+            notebook = self._materialize(index)
             self.ids.remove(notebook.id)
-            rename(
-                path.join(settings.workspace_dir, "notebook-{}.fnbook".format(notebook.id)),
-                path.join(settings.workspace_dir, "notebook-{}.fnbook".format(new_id))
-            )
+            # the writer thread may still be writing the notebook under its old name
+            g_save_worker.flush()
+            workspace_store().rename_notebook(notebook.id, new_id)
             self.ids.add(new_id)
             notebook.id = new_id
+            notebook.mark_dirty()
             self.setTabText(index, new_id)
             return True
         return False
 
     def load_workspace(self):
-        self._just_loaded = True
-        for each in listdir(settings.workspace_dir):
-            if each.endswith(".fnbook"):
-                notebook = Notebook.from_file(path.join(settings.workspace_dir, each))
-                self._add_notebook(notebook)
+        """ add a tab for every notebook in the workspace, but only load the one last used. The rest are loaded when
+        their tab is first opened, or in the background: parsed in worker processes where the storage backend makes
+        that worthwhile, otherwise one at a time whenever the application is idle """
+        # adding the first tab makes it current, which would load it
+        self.blockSignals(True)
+        for id in workspace_store().notebook_ids():
+            self._add_notebook(NotebookPlaceholder(id))
+        self.blockSignals(False)
         if len(self.notebooks) == 0:
             # Append a starting notebook
             notebook = Notebook("My Notebook")
             self._add_notebook(notebook)
+        else:
+            self.mark_clean()
+            last = [i for i, each in enumerate(self.notebooks) if each.id == settings.last_notebook]
+            index = last[0] if last else 0
+            self._materialize(index)
+            self.setCurrentIndex(index)
+            self._parse_placeholders()
+            self._warm_timer.start()
 
-    def _add_notebook(self, book: Notebook):
+    def _parse_placeholders(self):
+        """ hand every notebook the store can parse in a worker process to a pool of them """
+        store = workspace_store()
+        parsers = {}
+        for each in self.notebooks:
+            if isinstance(each, NotebookPlaceholder):
+                parser = store.notebook_parser(each.id)
+                if parser is not None:
+                    parsers[each.id] = parser
+                    each.parsing = True
+        if len(parsers) == 0:
+            return
+        self._loader = ParallelLoader(store, self)
+        self._loader.parsed.connect(self._notebook_parsed)
+        self._progress.setRange(0, len(parsers))
+        self._progress.setValue(0)
+        self._progress.show()
+        self._loader.start(parsers)
+
+    def _notebook_parsed(self, id: str, result):
+        """ a worker process finished parsing a notebook. Unless it was opened (and so loaded) in the meantime, swap it
+        in for its placeholder """
+        self._progress.setValue(self._progress.value() + 1)
+        if self._progress.value() == self._progress.maximum():
+            self._progress.hide()
+        if result is None:
+            return
+        for i, each in enumerate(self.notebooks):
+            if isinstance(each, NotebookPlaceholder) and each.id == id:
+                self._replace_placeholder(i, Notebook.unmarshal(self._loader.store.parsed_notebook(id, result)))
+                return
+
+    def _materialize(self, index: int) -> Notebook:
+        """ load the notebook at index, if it is still a placeholder, swapping it into its tab """
+        placeholder = self.notebooks[index]
+        if not isinstance(placeholder, NotebookPlaceholder):
+            return placeholder
+        notebook = Notebook.load(workspace_store(), placeholder.id)
+        self._replace_placeholder(index, notebook)
+        return notebook
+
+    def _replace_placeholder(self, index: int, notebook: Notebook):
+        placeholder = self.notebooks[index]
+        current = self.currentIndex()
+        # swapping the tab would otherwise look like switching tabs
+        self.blockSignals(True)
+        self.removeTab(index)
+        self.insertTab(index, notebook, notebook.id)
+        self.setCurrentIndex(current)
+        self.blockSignals(False)
+        self.notebooks[index] = notebook
+        placeholder.deleteLater()
+
+    def _notebook_activated(self, index: int):
+        if 0 <= index < len(self.notebooks):
+            notebook = self._materialize(index)
+            settings.last_notebook = notebook.id
+
+    def _warm_next(self):
+        """ load the next notebook that's still a placeholder (and not being parsed elsewhere), stopping once there are
+        none left """
+        for i, each in enumerate(self.notebooks):
+            if isinstance(each, NotebookPlaceholder) and not each.parsing:
+                self._materialize(i)
+                return
+        self._warm_timer.stop()
+
+    def _add_notebook(self, book):
         self.addTab(book, book.id)
         self.notebooks.append(book)
         self.ids.add(book.id)
+        if book.dirty:
+            self.mark_dirty()
 
     def new_notebook(self, name: str) -> bool:
         """ Try to create a new notebook with name. If the name already exists, return False"""
@@ -72,11 +183,28 @@ class Binder(QTabWidget, RenameableMixin):
         self._add_notebook(nb)
         return True
 
+    def assets_in_use(self) -> set:
+        """ the names of the assets items refer to right now, saved or not. Notebooks and pages that haven't been
+        loaded yet are left out, as nothing about them can have changed since they were saved """
+        names = set()
+        for notebook in self.notebooks:
+            if not isinstance(notebook, Notebook):
+                continue
+            for section in notebook.sections:
+                for page in section.pages:
+                    names.update(item.asset_name for item in page.items if item.asset_name is not None)
+        return names
+
     def save(self):
-        if self._just_loaded:
-            self._just_loaded = False
-            return
+        """ snapshot every notebook changed since the last save and queue it to be written in the background.
+        Notebooks that haven't changed are skipped entirely. Must be called on the GUI thread """
         G_QSETTINGS.sync()
+        if not self.dirty:
+            return
+        start = perf_counter()
+        self.mark_clean()
+        store = workspace_store()
         for each in self.notebooks:
-            filename = path.join(settings.workspace_dir, "notebook-{}.fnbook".format(each.id))
-            each.save(filename)
+            if each.dirty:
+                each.save(store)
+        g_save_debouncer.record_save_cost(perf_counter() - start)
@@ -1,59 +1,151 @@
 from PySide6 import QtWidgets, QtGui, QtCore
 from utilities.save_mixin import SaveMixin
-from os import chdir, getcwd, remove
-from urllib.request import urlopen
-from settings.__init__ import settings
-from os.path import exists, join
+from utilities.image_source import ImageSource, GIF_MIMETYPE
+from utilities.scheduler import g_scheduler
+from utilities.image_edits import ImageEdits
+from utilities.toaster import toast_near
+from functools import partial
 from style_consants import *
-import uuid
+
+# how many seconds an image has to keep its size before it's smoothly rescaled (and cached) at that size
+REFINE_DELAY = 0.3
+# crops smaller than this many pixels (as shown) each way are taken to be stray clicks
+MIN_CROP = 4
 
 
 class PageImageItem(QtWidgets.QLabel, SaveMixin):
-    """ Supports common image formats, as well as GIF images, which technically load as QMovies, instead of Pixmaps """
+    """ Supports common image formats, as well as GIF images, which technically load as QMovies, instead of Pixmaps.
+
+    Images are read and decoded in the background, by the item's ImageSource. Until then, the item shows a placeholder
+    of the size the image is expected to be (height, if known, or a guess from the width), and emits loaded once the
+    image is showing.
+
+    Restored images show the thumbnail cached when they were last shown at their width, and are only decoded in full
+    once something (like a resize) needs it. Decoded images belong to g_decoded_images; an item only keeps its own
+    while it's in view (see set_in_view).
+
+    Crops, flips and rotations never change the asset. They're saved with the item, and applied to the decoded image
+    before its renditions are made """
+
+    loaded = QtCore.Signal()
 
-    def __init__(self, parent, img_url, width: int, asset_name=None, **extra):
+    def __init__(self, parent, img_url, width: int, asset_name=None, height=None, **extra):
         super().__init__(parent)
 
         self._play_btn = None
         self._toolbar = None
-        # The name of the asset file once saved to disk
-        self.asset_name = str(uuid.uuid4())
-        if asset_name is not None:
-            self.asset_name = asset_name
-        # asset URLs, when they are local files, are relative paths, not absolute
-        # for portability reasons. When we are restoring from a saved state. So, we should
-        # set our working directory to the asset directory
-        # URLs for files dragged in should be absolute anyway and not affected.
-        old_wd = getcwd()
-        chdir(settings.asset_dir)
-        data = urlopen(img_url).read()
-        chdir(old_wd)
+        self._image = ImageSource(self, img_url, asset_name, ImageEdits.unmarshal(extra.get("transform", {})))
+        self._image.thumbnail.connect(self._thumbnail_loaded)
+        self._image.decoded.connect(self._image_loaded)
+        self._image.rendition.connect(self._refined)
+        self._image.named.connect(self._changed)
+        self._image.failed.connect(self._failed)
+        # the decoded pyramid of smaller levels (which the image is scaled down to fit from) while the item is in view
+        self._pyramid = None
+        self._in_view = True
+        # whether the item shows the image yet, or just the placeholder
+        self._shown = False
+        # pyramid levels converted to pixmaps, as they're needed
+        self._levels = {}
+        self._refine_call = None
+        # GIFs only have a movie while they're in view. Out of view, they show the frame they stopped on, and carry on
+        # from it once back in view, unless they were paused
+        self._movie = None
+        self._buffer = None
+        self._frame = 0
+        self._playing = True
+        self._width = width
+        # where a crop being drawn started, and the band showing it
+        self._crop_origin = None
+        self._crop_band = None
+        self._cropping = False
         self.setStyleSheet("background: transparent;")
+        placeholder = QtGui.QPixmap(width, height if height else width * 3 // 4)
+        placeholder.fill(QtGui.QColor(PAGE_ITEM_MENU_BG))
+        self.setPixmap(placeholder)
+        self._image.load(width)
 
-        orig_pixmap = QtGui.QPixmap()
-        orig_pixmap.loadFromData(data)
-        pixmap = orig_pixmap.scaledToWidth(width)
-        # orig pixmap is an asset that gets saved to disk
-        self._orig_pixmap = orig_pixmap
-        if "transform" in extra:
-            self._rotation = extra['transform']['rotation']
-        else:
-            self._rotation = 0
-
-        self._mimedb = QtCore.QMimeDatabase()
-        if self._mimedb.mimeTypeForData(data).name() == "image/gif":
-            self._mimetype = "GIF"
-            # If this is a qmovie, we need to write the bytes to disk ourselves, the QMovie object doesn't save()
-            self._data = data
-            self.save_asset()
-            movie = QtGui.QMovie(self.asset_file_fq)
-            self._movie = movie
-            self.setMovie(self._movie)
-            self._movie.start()
-            self._playing = True
-        else:
-            self.setPixmap(pixmap)
-            self._mimetype = "PNG"
+    @property
+    def asset_name(self):
+        return self._image.asset_name
+
+    def _thumbnail_loaded(self, image: QtGui.QImage):
+        if not self._shown:
+            self.setPixmap(QtGui.QPixmap.fromImage(image))
+            self._shown = True
+            self.loaded.emit()
+
+    def _failed(self, error):
+        toast_near(self.parent(), "Couldn't load image")
+        if self._image.asset_name is None:
+            # a newly added image that can't be read is of no use to anyone
+            self.parent().deleteLater()
+
+    def _image_loaded(self, image):
+        if self._in_view:
+            self._pyramid = image.pyramid
+        if self._image.mimetype == GIF_MIMETYPE and self._movie is None and self._in_view:
+            self._start_movie(image.data)
+        self._render()
+        if not self._shown:
+            self._shown = True
+            self.loaded.emit()
+
+    def set_in_view(self, in_view: bool):
+        """ called by the page as the item scrolls into or out of view, or the page is shown or hidden. Out of view, the
+        item lets go of its decoded image, keeping only the rendition it shows """
+        if in_view == self._in_view:
+            return
+        self._in_view = in_view
+        if not in_view:
+            self._pyramid = None
+            self._levels.clear()
+            self._stop_movie()
+        elif self._image.mimetype == GIF_MIMETYPE and self._movie is None:
+            # decoded again for the movie to play from
+            self._image.decode()
+
+    def _start_movie(self, data: bytes):
+        # play from memory, so the movie doesn't depend on the asset having been written yet
+        self._buffer = QtCore.QBuffer(self)
+        self._buffer.setData(QtCore.QByteArray(data))
+        self._buffer.open(QtCore.QIODevice.ReadOnly)
+        self._movie = QtGui.QMovie(self._buffer, QtCore.QByteArray(), self)
+        # decode each frame as it's shown, rather than keeping every frame of a long GIF around
+        self._movie.setCacheMode(QtGui.QMovie.CacheNone)
+        self.setMovie(self._movie)
+        self._movie.start()
+        # without a frame cache, movies can't jump, only step forwards through the frames to the one they stopped on
+        for _ in range(self._frame):
+            self._movie.jumpToNextFrame()
+        self._movie.setPaused(not self._playing)
+
+    def _stop_movie(self):
+        """ stop a GIF from playing and let go of its movie, frames and bytes, leaving the current frame showing """
+        if self._movie is None:
+            return
+        self._frame = self._movie.currentFrameNumber()
+        # replaces the movie in the label
+        self.setPixmap(self._movie.currentPixmap())
+        self._movie.stop()
+        self._movie.deleteLater()
+        self._buffer.deleteLater()
+        self._movie = None
+        self._buffer = None
+
+    def _pixels(self):
+        """ the decoded pyramid, or None if it's been dropped from memory (or was never decoded) """
+        pyramid = self._pyramid
+        if pyramid is None:
+            pyramid = self._image.pixels()
+            if self._in_view:
+                self._pyramid = pyramid
+        return pyramid
+
+    @property
+    def ready(self) -> bool:
+        """ whether the image can be saved yet; newly added images can't until they've loaded """
+        return self._image.ready
 
     @property
     def height(self):
@@ -69,71 +161,111 @@ class PageImageItem(QtWidgets.QLabel, SaveMixin):
         mimetype, configuration, etc. This is to provide more control over what attributes get saved for images and
          remove responsibility for those attributes from parent widgets"""
         return {
-            "transform": {
-                "rotation": self._rotation
-            }
+            "transform": self._image.edits.marshal()
         }
 
     def save_asset(self):
-        """ If there is an asset, save it if it hasn't been saved, yet """
-        if not exists(self.asset_file_fq):
-            if self._mimetype != "GIF":
-                self._orig_pixmap.save(self.asset_file_fq, self._mimetype)  # TODO support GIFs
-            else:
-                with open(self.asset_file_fq, "wb") as f:
-                    f.write(self._data)
+        """ If there is an asset, queue its original bytes to be saved if it hasn't been saved, yet """
+        self._image.save_asset()
 
-    def delete_asset(self):
-        """ If there is an asset, delete it """
-        try:
-            remove(self.asset_file_fq)
-        except FileNotFoundError:
-            """ Do nothing """
+    @property
+    def asset_url(self) -> str:
+        return self._image.asset_url
 
     def resize(self, width: int):
-        pixmap = self._orig_pixmap
-        pixmap = pixmap.scaledToWidth(width)
-        if self._mimetype != "GIF":
-            self.setPixmap(pixmap)
-        else:
-            self._movie.setScaledSize(pixmap.size())
+        if width == self._width and self._shown:
+            # nothing to do, and rendering again could mean decoding an image only its thumbnail was needed of
+            return
+        self._width = width
+        self._render()
 
-    def setPixmap(self, pixmap):
-        pixmap = self._rotate(pixmap)
-        super().setPixmap(pixmap)
+    def _display_size(self) -> QtCore.QSize:
+        """ the size the image is shown at: scaled to the item's width """
+        size = self._image.size
+        return QtCore.QSize(self._width, max(1, round(size.height() * self._width / size.width())))
 
-    @property
-    def asset_file(self):
-        """ return the calculated, unique name of this item for the workspace. """
-        return "{}.fna".format(self.asset_name)
+    def _render(self):
+        """ show the image at its current width right away, by quickly scaling the nearest pyramid level, and schedule a
+        smooth rescale for once the width stops changing """
+        if self._image.size is None:
+            # still loading. It's scaled to the latest width when it arrives
+            return
+        if self._movie is not None:
+            self._movie.setScaledSize(self._display_size())
+            return
+        pyramid = self._pixels()
+        if pyramid is None:
+            # showing a thumbnail. Render again once the full image has been decoded
+            self._image.decode()
+            return
+        level = pyramid.level(self._width)
+        if level not in self._levels:
+            self._levels[level] = QtGui.QPixmap.fromImage(pyramid.levels[level])
+        self.setPixmap(self._levels[level].scaled(self._display_size(), QtCore.Qt.IgnoreAspectRatio))
+        if self._refine_call is not None:
+            self._refine_call.cancel()
+        # holds on to the pyramid until then, even if the item goes out of view
+        self._refine_call = g_scheduler.call_later(REFINE_DELAY, partial(self._refine, pyramid), self)
 
-    @property
-    def asset_file_fq(self):
-        return join(settings.asset_dir, self.asset_file)
+    def _refine(self, pyramid):
+        self._refine_call = None
+        self._image.refine(pyramid, self._width)
+
+    def _refined(self, image: QtGui.QImage):
+        if image.width() == self._width and self._movie is None:
+            # otherwise, resized (which gets its own refinement) or started playing since
+            self.setPixmap(QtGui.QPixmap.fromImage(image))
 
     def _toggle_movie_play(self):
-        if self._movie.state() == self._movie.Running:
-            self._movie.setPaused(True)
-        else:
-            self._movie.setPaused(False)
+        self._playing = self._movie.state() != QtGui.QMovie.MovieState.Running
+        self._movie.setPaused(not self._playing)
         if self._play_btn is not None:
             self._play_btn.deleteLater()
             self._play_btn = None
 
     def mousePressEvent(self, ev: QtGui.QMouseEvent):
-        if self._mimetype == "GIF" and ev.button() == QtCore.Qt.LeftButton:
+        if self._cropping and ev.button() == QtCore.Qt.LeftButton:
+            ev.accept()
+            self._crop_origin = ev.pos()
+            if self._crop_band is None:
+                self._crop_band = QtWidgets.QRubberBand(QtWidgets.QRubberBand.Rectangle, self)
+            self._crop_band.setGeometry(QtCore.QRect(self._crop_origin, QtCore.QSize()))
+            self._crop_band.show()
+        elif self._movie is not None and ev.button() == QtCore.Qt.LeftButton:
             ev.accept()
             self._toggle_movie_play()
         else:
             # If it's a right click or otherwise, pass it on
             ev.ignore()
 
+    def mouseMoveEvent(self, ev: QtGui.QMouseEvent):
+        if self._crop_origin is not None:
+            ev.accept()
+            self._crop_band.setGeometry(QtCore.QRect(self._crop_origin, ev.pos()).normalized())
+        else:
+            super().mouseMoveEvent(ev)
+
+    def mouseReleaseEvent(self, ev: QtGui.QMouseEvent):
+        if self._crop_origin is not None:
+            ev.accept()
+            self._crop_band.hide()
+            self._crop_origin = None
+            if not self._croppable:
+                # still cropping, so the crop can be drawn again once the image is ready
+                toast_near(self.parent(), "Image still loading")
+                return
+            self._cropping = False
+            self.unsetCursor()
+            self.crop(self._crop_band.geometry())
+        else:
+            super().mouseReleaseEvent(ev)
+
     def enterEvent(self, ev: QtGui.QMouseEvent):
         """ on images, if the mimetype is GIF, we want to allow the user to play the GIF and present a play button
         on mouseover """
-        if self._mimetype == "GIF" and self._play_btn is None:
+        if self._image.mimetype == GIF_MIMETYPE and self._play_btn is None and self._movie is not None:
             self._play_btn = QtWidgets.QLabel(self)
-            if self._movie.state() == self._movie.Running:
+            if self._movie.state() == QtGui.QMovie.MovieState.Running:
                 icon = QtGui.QIcon.fromTheme("media-playback-pause")
             else:
                 icon = QtGui.QIcon.fromTheme("media-playback-start")
@@ -150,35 +282,75 @@ class PageImageItem(QtWidgets.QLabel, SaveMixin):
                 # But if we're taller than we are wide, we need to offset on the other axis
                 pos.setY(int((self.geometry().height() - self.geometry().width()) / 2))
             self._play_btn.setGeometry(pos)
-        elif self._mimetype == "PNG" and self._toolbar is None:
+        elif self._image.mimetype != GIF_MIMETYPE and self._toolbar is None:
             self._toolbar = ImageEditToolbar(self)
             self._toolbar.show()
 
     def leaveEvent(self, event: QtCore.QEvent):
         """ on images, if the mimetype is GIF, we need to get rid of the play/pause button if their mouse leaves the
         screen """
-        if self._mimetype == "GIF" and self._play_btn is not None:
+        if self._image.mimetype == GIF_MIMETYPE and self._play_btn is not None:
             self._play_btn.deleteLater()
             self._play_btn = None
-        elif self._mimetype == "PNG" and self._toolbar is not None:
+        elif self._image.mimetype != GIF_MIMETYPE and self._toolbar is not None:
             self._toolbar.deleteLater()
             self._toolbar = None
 
+    def _edit(self, edits: ImageEdits, preview=None):
+        """ show the image with edits instead. Until it's been decoded with them, what's showing is transformed by
+        preview (a QTransform), if given """
+        self._pyramid = None
+        self._levels.clear()
+        if self._refine_call is not None:
+            self._refine_call.cancel()
+            self._refine_call = None
+        if self._image.edit(edits) is not None:
+            # edited like this before
+            self._render()
+        elif preview is not None:
+            self.setPixmap(self.pixmap().transformed(preview))
+        self._changed()
+
     def rotate_counter_clockwise(self):
-        self._rotation = (self._rotation - 90) % 360
-        transform = QtGui.QTransform()
-        pixmap = self.pixmap().transformed(transform.rotate(-90))
-        super().setPixmap(pixmap)
+        self._edit(self._image.edits.rotated(-90), QtGui.QTransform().rotate(-90))
 
     def rotate_clockwise(self):
-        self._rotation = (self._rotation + 90) % 360
-        transform = QtGui.QTransform()
-        pixmap = self.pixmap().transformed(transform.rotate(90))
-        super().setPixmap(pixmap)
+        self._edit(self._image.edits.rotated(90), QtGui.QTransform().rotate(90))
+
+    def flip(self):
+        self._edit(self._image.edits.flipped(), QtGui.QTransform.fromScale(-1, 1))
+
+    def start_crop(self):
+        """ let the user drag out the rectangle to crop the image to """
+        self._cropping = True
+        self.setCursor(QtCore.Qt.CrossCursor)
+        if self._image.source_size is None:
+            # crops are mapped onto the image as it's stored, so restored images need decoding to know its size
+            self._image.decode()
+
+    @property
+    def _croppable(self) -> bool:
+        """ whether crops can be mapped onto the stored image: its size is known, and what's showing is the image as
+        it's currently edited, rather than a preview of an edit that's still decoding """
+        return self._image.source_size is not None and self._image.size_edits is self._image.edits
+
+    def crop(self, rect: QtCore.QRect):
+        """ crop the image to rect, a rectangle of the item as it's shown. Only call once it's _croppable """
+        if not self._croppable:
+            return
+        shown = QtWidgets.QStyle.alignedRect(self.layoutDirection(), self.alignment(), self.pixmap().size(),
+                                             self.contentsRect())
+        rect = rect.intersected(shown).translated(-shown.topLeft())
+        if rect.width() < MIN_CROP or rect.height() < MIN_CROP:
+            return
+        # from the pixels shown to those of the edited image, then back through the edits to the stored image
+        scale = self._image.size.width() / shown.width()
+        rect = QtGui.QTransform.fromScale(scale, scale).mapRect(rect)
+        self._edit(self._image.edits.cropped(self._image.edits.source_rect(rect, self._image.source_size)))
 
-    def _rotate(self, pixmap):
-        transform = QtGui.QTransform()
-        return pixmap.transformed(transform.rotate(self._rotation))
+    def reset_crop(self):
+        if self._image.edits.crop is not None:
+            self._edit(self._image.edits.cropped(None))
 
 
 class ImageEditToolbar(QtWidgets.QToolBar):
@@ -190,9 +362,11 @@ class ImageEditToolbar(QtWidgets.QToolBar):
         rotate_ccw = QtGui.QIcon.fromTheme("transform-rotate")
         pixmap = rotate_ccw.pixmap(QtCore.QSize(32, 32)).transformed(QtGui.QTransform().rotate(180, QtCore.Qt.Axis.YAxis))
         rotate_ccw = QtGui.QIcon(pixmap)
-        self.addAction(crop_icon, "crop")
+        self.addAction(crop_icon, "crop", parent.start_crop)
+        self.addAction(QtGui.QIcon.fromTheme("edit-undo"), "remove crop", parent.reset_crop)
         self.addAction(rotate_cw, "rotate", parent.rotate_clockwise)
         self.addAction(rotate_ccw, "rotate back", parent.rotate_counter_clockwise)
+        self.addAction(QtGui.QIcon.fromTheme("object-flip-horizontal"), "flip", parent.flip)
         self.setIconSize(QtCore.QSize(32, 32))
         self.setStyleSheet("""
         QToolBar {{
@@ -2,14 +2,22 @@
 
 import sys
 from PySide6.QtWidgets import QWidget, QMessageBox, QApplication, QFileDialog, QVBoxLayout, QMainWindow, QMenu
-from PySide6.QtWidgets import QInputDialog, QLineEdit
+from PySide6.QtWidgets import QInputDialog, QLineEdit, QProgressDialog
 from PySide6.QtGui import QIcon, QCloseEvent, QAction
+from PySide6.QtCore import Qt
 from binder import Binder
 from text_format_palette import TextFormatPalette
 from settings.dialog import SettingsDialog
 from settings.__init__ import settings
 from utilities.debounce import g_save_debouncer
+from utilities.save_worker import g_save_worker
+from storage import workspace_store, BACKENDS
+from storage.asset_gc import g_asset_collector
+from storage.convert import g_workspace_converter
+from utilities.toaster import toast_near
 from os import environ, path
+import logging
+from multiprocessing import freeze_support
 
 
 class MainWindow(QMainWindow):
@@ -21,9 +29,14 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self._content)
         self.menuBar().addMenu(self._file_menu)
         self.menuBar().addMenu(QMenu("Edit", self))
-        self.menuBar().addMenu(QMenu("Tools", self))
+        self.menuBar().addMenu(self._tools_menu)
         self.menuBar().addMenu(self._help_menu)
         self.menuBar().triggered.connect(self._menu_dispatch)
+        g_asset_collector.scanned.connect(self._assets_scanned)
+        g_save_worker.failed.connect(self._save_failed)
+        g_workspace_converter.progressed.connect(self._conversion_progressed)
+        g_workspace_converter.converted.connect(self._workspace_converted)
+        self._conversion_progress = None
 
     @property
     def _file_menu(self):
@@ -39,6 +52,13 @@ class MainWindow(QMainWindow):
         menu.addAction("Exit")
         return menu
 
+    @property
+    def _tools_menu(self):
+        menu = QMenu("Tools", self)
+        menu.addAction("Check Assets")
+        menu.addAction("Convert Workspace...")
+        return menu
+
     @property
     def _help_menu(self):
         menu = QMenu("&Help")
@@ -72,6 +92,59 @@ class MainWindow(QMainWindow):
                               "For more information, please visit github.com/qmuloadmin/freenote")
         elif action.text() == "S&ettings":
             SettingsDialog(self).show()
+        elif action.text() == "Check Assets":
+            # everything unsaved is saved first, so the scan counts it
+            self._content.binder.save()
+            g_asset_collector.scan(workspace_store())
+        elif action.text() == "Convert Workspace...":
+            self._convert_workspace()
+
+    def _assets_scanned(self, report):
+        if not report.orphaned:
+            QMessageBox.information(self, "Check Assets", str(report))
+            return
+        answer = QMessageBox.question(self, "Check Assets",
+                                      "{}\n\nRemove the unused assets?".format(report),
+                                      QMessageBox.Yes, QMessageBox.No)
+        if answer == QMessageBox.Yes:
+            g_asset_collector.remove_orphans(workspace_store(), report, self._content.binder.assets_in_use())
+
+    def _convert_workspace(self):
+        others = [backend for backend in BACKENDS if backend != settings.storage_backend]
+        backend, ok = QInputDialog.getItem(self, "Convert Workspace",
+                                           "Store the workspace as (currently {}):".format(settings.storage_backend),
+                                           others, 0, False)
+        if not ok:
+            return
+        # everything unsaved is saved first, so it's copied, and nothing more is saved until the workspace has switched
+        g_save_debouncer.stop()
+        self._content.binder.save()
+        self._conversion_progress = QProgressDialog("Converting the workspace to {}...".format(backend), None, 0, 0,
+                                                    self)
+        self._conversion_progress.setWindowModality(Qt.WindowModal)
+        self._conversion_progress.setMinimumDuration(0)
+        self._conversion_progress.show()
+        g_workspace_converter.convert(settings.storage_backend, backend)
+
+    def _conversion_progressed(self, done: int, total: int):
+        if self._conversion_progress is not None:
+            self._conversion_progress.setMaximum(total)
+            self._conversion_progress.setValue(done)
+
+    def _workspace_converted(self, backend: str, error):
+        if self._conversion_progress is not None:
+            self._conversion_progress.deleteLater()
+            self._conversion_progress = None
+        if error is not None:
+            QMessageBox.warning(self, "Convert Workspace", "The workspace couldn't be converted: {}".format(error))
+            return
+        # the old copy is left where it was
+        settings.storage_backend = backend
+        toast_near(self._content.binder.currentWidget(), "Converted to {}".format(backend))
+
+    def _save_failed(self, key: str):
+        # what went wrong is in the log
+        toast_near(self._content.binder.currentWidget(), "Save failed")
 
     def show(self):
         super().show()
@@ -102,6 +175,11 @@ class MainWindow(QMainWindow):
         size = self.size()
         settings.window_height = size.height()
         settings.window_width = size.width()
+        # save anything still waiting on the debouncer, and wait for the writer thread to finish with it
+        g_save_debouncer.stop()
+        if settings.auto_save:
+            self._content.binder.save()
+        g_save_worker.flush()
         super().closeEvent(event)
 
 
@@ -112,9 +190,10 @@ class ContentWidget(QWidget):
         super().__init__(parent)
         self.lo = QVBoxLayout()
         self.binder = Binder()
-        # Allow the user to disable auto save
+        # Allow the user to disable auto save. The debouncer fires on the GUI thread, where the document can be safely
+        # snapshotted
         if settings.auto_save:
-            g_save_debouncer.action = self.binder.save
+            g_save_debouncer.bounced.connect(self.binder.save)
 
     def _show_layout(self):
         self.binder.load_workspace()
@@ -146,6 +225,9 @@ class ContentWidget(QWidget):
 
 
 if __name__ == "__main__":
+    # notebooks are parsed in worker processes on startup, which frozen (packaged) builds have to be told about
+    freeze_support()
+    logging.basicConfig(format="%(asctime)s %(name)s %(levelname)s: %(message)s", level=logging.INFO)
     app = QApplication([])
     app.setApplicationName("Free Note")
     window = MainWindow()
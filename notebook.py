@@ -1,16 +1,19 @@
 from PySide6.QtWidgets import QTabWidget, QWidget
 from section import Section
-from oyaml import load, dump
 from utilities.toaster import ToasterMixin
+from utilities.save_mixin import ChangeTracker, g_save_debouncer
+from utilities.save_worker import g_save_worker
+from utilities.journal import diff
+from storage import notebook_key
 from utilities.rename_dialog import RenameableMixin
 from settings.__init__ import settings
 from string import ascii_uppercase
 from style_consants import *
 
 
-class Notebook(QTabWidget, ToasterMixin, RenameableMixin):
+class Notebook(QTabWidget, ToasterMixin, RenameableMixin, ChangeTracker):
     """ Notebooks hold sections, which hold pages. They are part of a binder, the root of the workspace. Each notebook
-     is its own file """
+     is saved separately, usually as its own file """
 
     _unique_resource_name = "section"
 
@@ -34,6 +37,8 @@ class Notebook(QTabWidget, ToasterMixin, RenameableMixin):
         self.tabBar().tabBarClicked.connect(self._check_handle_new_section)
         self.tabCloseRequested.connect(self._remove_section)
         self.tabBarDoubleClicked.connect(self._rename_dialog)
+        # the data this notebook was last saved as (or loaded from), to work out what changed on the next save
+        self._saved = None
         for each in sections:
             self._add_section(each)
 
@@ -66,6 +71,8 @@ class Notebook(QTabWidget, ToasterMixin, RenameableMixin):
         self.removeTab(index)
         section = self.sections.pop(index)
         self.ids.remove(section.id)
+        self.mark_dirty()
+        g_save_debouncer.start()
 
     def _add_section(self, section: Section):
         self.tabBar().removeTab(len(self.sections))
@@ -73,6 +80,7 @@ class Notebook(QTabWidget, ToasterMixin, RenameableMixin):
         self.ids.add(section.id)
         self.addTab(section, section.id)
         self.tabBar().addTab("New Section")
+        self.mark_dirty()
 
     def addTab(self, widget: QWidget, id: str):
         index = super().addTab(widget, self._shorten_name(id))
@@ -98,24 +106,40 @@ class Notebook(QTabWidget, ToasterMixin, RenameableMixin):
         return "{}-{}".format(prefix, ascii_uppercase[i])
 
     @classmethod
-    def from_file(cls, filename: str):
-        with open(filename) as f:
-            data = load(f)
+    def unmarshal(cls, data: dict):
         sections = []
         new_id = data["id"]
         for id, each in data["sections"].items():
             section = Section.unmarshal(id, each)
             sections.append(section)
         notebook = cls(new_id, sections)
+        notebook.mark_clean()
+        notebook._saved = data
         return notebook
 
-    def save(self, filename: str):
-        self.toasted.emit("Saving...")
+    @classmethod
+    def load(cls, store, id: str):
+        """ load the notebook with the given id from a storage backend """
+        return cls.unmarshal(store.load_notebook(id))
+
+    def snapshot(self) -> dict:
+        """ marshal this notebook into plain data that can be written from any thread. Must be called on the GUI thread.
+        Sections and pages that haven't changed since they were last saved reuse their previously marshalled data
+        instead of walking their widgets again """
+        self.mark_clean()
         data = {
             "id": self.id,
             "sections": {}
         }
         for each in self.sections:
             data["sections"][each.id] = each.marshal()
-        with open(filename, "w") as f:
-            dump(data, f)
+        return data
+
+    def save(self, store):
+        """ snapshot this notebook and hand it to the writer thread to be saved to store. Where the changes since the
+        last save are only to items, the store is only given those changes to write """
+        self.toasted.emit("Saving...")
+        data = self.snapshot()
+        records = diff(self._saved, data)
+        self._saved = data
+        g_save_worker.submit(notebook_key(self.id), store.notebook_job(self.id, data, records))
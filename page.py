@@ -1,27 +1,80 @@
 from PySide6 import QtWidgets, QtGui, QtCore
-from utilities.debounce import Debouncer
-from page_item import PageItem
-from threading import Timer
+from style_consants import ITEM_BORDER_COLOR, SELECTION_BORDER_COLOR
+from utilities.debounce import Debouncer, FrameThrottle, g_save_debouncer
+from utilities.save_mixin import ChangeTracker
+from page_item import PageItem, PageItemRecord
+from utilities.spatial_index import SpatialIndex
+from utilities.z_order import ZOrder
+from settings.__init__ import settings
+from uuid import uuid4
 
+# how far around the visible part of a virtualized page items keep their widgets, so short scrolls don't build any
+VIRTUAL_MARGIN = 512
+# selected items are outlined this far outside their edges
+SELECTION_MARGIN = 2
+# text items' widgets are kept for reuse once virtualized pages are done with them, up to this many
+SPARE_ITEMS = 32
 
-class Page(QtWidgets.QWidget):
+# detached text PageItems, shared by every page
+_spare_items = []
+
+
+def dropped_image_url(mime_data: QtCore.QMimeData):
+    """ the url of the image dropped onto a page, or None if what was dropped isn't one """
+    if not mime_data.hasFormat("text/uri-list"):
+        return None
+    url = mime_data.urls()[0].url()
+    mimetype = QtCore.QMimeDatabase().mimeTypeForUrl(mime_data.urls()[0]).name()
+    if "image" in mimetype:
+        return url
+    if "application/octet-stream" in mimetype:
+        # If it's a stream, we need to download it. However, that could be arbitrarily huge
+        # For now, we're going to base the decision on the file extension.
+        if url.endswith(".png") or url.endswith(".jpg") or url.endswith(".jpeg") or url.endswith(".gif"):
+            return url
+    return None
+
+
+class Page(QtWidgets.QWidget, ChangeTracker):
     """ Page is a single, infinitely scrolling, drag and drop target-able page in the notebook """
 
     def __init__(self, id="1"):
         super().__init__()
         self.id = id
+        # unlike the id, never changes, so storage can tell a renamed page from a new one
+        self.uid = uuid4().hex
         self.ids = set()
         self._section = None
         self._scroll_area = None
-        # NOTE: order of items is SIGNIFICANT. Do not arbitrarily adjust it, without updating child item's z_index
-        self.items = []
+        # every item, in stacking order (which is also the order they're saved in)
+        self.items = ZOrder()
         # debouncing for resizing (shrinking) purposes
-        self.size_debouncer = Debouncer(self._size_timer, timeout=0.5)
+        self.size_debouncer = Debouncer(timeout=0.5, parent=self)
+        self.size_debouncer.action = self._eval_resize
         self.size_debouncer.start()
-        # these max variables store the farthest items for resizing based on item geometry
-        self.bottom_max = None
-        self.right_max = None
+        # where every item is, so finding the farthest items (for resizing) or those in view doesn't check them all
+        self._index = SpatialIndex()
+        # the items last told they're in view
+        self._in_view = set()
+        # the items that have widgets. On a virtualized page, the rest of self.items are PageItemRecords
+        self._live = set()
+        # marshalled data of a loaded page whose items haven't been built yet. See _materialize
+        self._pending = None
+        # tells items when they scroll into or out of view, or the page is shown or hidden
+        self.view_debouncer = Debouncer(timeout=0.1, parent=self, max_wait=0.2)
+        self.view_debouncer.action = self._update_view
+        # selected items (always live ones), and a rubber band being dragged out from the page to select them with
+        self.selection = set()
+        self._band = None
+        self._band_origin = None
+        # a drag or resize of the whole selection: where each item started, the item being dragged, and its frames
+        self._group_start = None
+        self._group_leader = None
+        self._group_frames = FrameThrottle(self)
+        self._group_frames.action = self._preview_group
         self.setAcceptDrops(True)
+        # so Delete and Escape reach the page once a rubber band has selected something
+        self.setFocusPolicy(QtCore.Qt.ClickFocus)
 
     @property
     def scroll_area(self):
@@ -30,6 +83,23 @@ class Page(QtWidgets.QWidget):
     @scroll_area.setter
     def scroll_area(self, v):
         self._scroll_area = v
+        v.horizontalScrollBar().valueChanged.connect(self.view_debouncer.start)
+        v.verticalScrollBar().valueChanged.connect(self.view_debouncer.start)
+
+    @property
+    def virtualized(self) -> bool:
+        """ whether the page has so many items that only those near the view have widgets """
+        return 0 < settings.virtual_page_items < len(self.items)
+
+    @property
+    def right_max(self):
+        """ the item reaching furthest right, or None on an empty page """
+        return self._index.right_most
+
+    @property
+    def bottom_max(self):
+        """ the item reaching furthest down, or None on an empty page """
+        return self._index.bottom_most
 
     @property
     def section(self):
@@ -39,54 +109,49 @@ class Page(QtWidgets.QWidget):
     def section(self, value):
         self._section = value
 
-    def _size_timer(self):
-        return Timer(0.5, self._eval_resize)
-
-    def _raise_item(self, index):
-        """ Slot for listening to child item's raised signals. Handles reordering of the list of items """
-        item = self.items.pop(index)
-        self.items.append(item)
-        for i, each in enumerate(self.items):
-            each.z_index = i
+    def _raise_item(self, item: PageItem):
+        """ Slot for listening to child item's raised signals """
+        self.items.raise_(item)
         item.raise_()
 
-    def _lower_item(self, index):
-        """ Slot for listening to child item's lowered signals. Handles reordering of the list of items """
-        item = self.items.pop(index)
-        self.items.insert(0, item)
-        for i, each in enumerate(self.items):
-            each.z_index = i
+    def _lower_item(self, item: PageItem):
+        """ Slot for listening to child item's lowered signals """
+        self.items.lower(item)
         item.lower()
 
     def _eval_resize(self):
         """ Called to re-evaluate what the right-most and bottom-most items are based on their geometries, and
         shrink to fit them """
+        if self._pending is not None:
+            # keep the loaded size until the items it was sized for exist
+            return
         pos = self.geometry()
         # If there are no items, resize to the size of the parent
         if len(self.items) == 0:
             pos.setHeight(self.section.height())
             pos.setWidth(self.section.width())
-            self.setGeometry(pos)
+            self._resize_to(pos)
             return
 
-        self.bottom_max = self.items[0]
-        self.right_max = self.items[0]
+        bottom = self._index.rect(self.bottom_max).bottom()
+        right = self._index.rect(self.right_max).right()
 
-        for item in self.items:
-            if item.geometry().right() > self.right_max.geometry().right():
-                self.right_max = item
-            if item.geometry().bottom() > self.bottom_max.geometry().bottom():
-                self.bottom_max = item
-
-        if self.bottom_max.geometry().bottom() < self.scroll_area.viewport().height():
+        if bottom < self.scroll_area.viewport().height():
             pos.setHeight(self.scroll_area.viewport().height())
         else:
-            pos.setHeight(self.bottom_max.geometry().bottom())
+            pos.setHeight(bottom)
 
-        if self.right_max.geometry().right() < self.scroll_area.viewport().width():
+        if right < self.scroll_area.viewport().width():
             pos.setWidth(self.scroll_area.viewport().width())
         else:
-            pos.setWidth(self.right_max.geometry().right())
+            pos.setWidth(right)
+        self._resize_to(pos)
+
+    def _resize_to(self, pos: QtCore.QRect):
+        """ set the page's geometry. Its size is saved with it, so a change of size counts as a change to the page """
+        if pos.size() == self.geometry().size():
+            return
+        self.mark_dirty()
         self.setGeometry(pos)
 
     def rename_item(self, item, name: str) -> bool:
@@ -100,79 +165,334 @@ class Page(QtWidgets.QWidget):
         return True
 
     def marshal(self):
+        if self._pending is not None:
+            # never shown, so nothing can have changed since it was loaded
+            return self._pending
+        if not self.dirty and self._marshalled is not None:
+            return self._marshalled
+        self.mark_clean()
         data = {
+            "uid": self.uid,
             "items": {},
             "geometry": (self.geometry().width(), self.geometry().height()),
         }
         for each in self.items:
-            data["items"][each.id] = each.marshal()
+            # items still loading are saved once they've loaded, which marks them changed
+            if each.ready:
+                data["items"][each.id] = each.marshal()
+        self._marshalled = data
         return data
 
     @classmethod
     def unmarshal(cls, id: str, data: {}):
+        """ create a page from its marshalled data. Only one page per section is visible at a time, so the page's
+        items (and their text documents and decoded images) aren't built until the page is first shown """
         page = cls(id)
+        # pages saved before uids existed get one now, kept in the loaded data so it's saved with them
+        page.uid = data.setdefault("uid", page.uid)
         pos = page.geometry()
         pos.setWidth(data["geometry"][0])
         pos.setHeight(data["geometry"][1])
         page.setGeometry(pos)
+        page._pending = data
+        page.mark_clean(data)
+        return page
+
+    def _materialize(self):
+        """ build the widgets for a page loaded by unmarshal """
+        data = self._pending
+        if data is None:
+            return
+        self._pending = None
+        if 0 < settings.virtual_page_items < len(data['items']):
+            # widgets are only built for the items near the view, by _update_view
+            for id, each in data['items'].items():
+                record = PageItemRecord(id, each)
+                self.ids.add(id)
+                self.items.append(record)
+                self._index.insert(record, record.geometry())
+            return
         for id, each in data['items'].items():
             item = PageItem.unmarshall(id, each)
-            page._add_item(item)
-        return page
+            self._attach_item(item)
+
+    def showEvent(self, event: QtGui.QShowEvent):
+        self._materialize()
+        super().showEvent(event)
+        if len(self._live) < len(self.items):
+            # build what's in view right away, rather than show the page without it
+            self._update_view()
+        else:
+            self.view_debouncer.start()
+
+    def hideEvent(self, event: QtGui.QHideEvent):
+        super().hideEvent(event)
+        self.view_debouncer.start()
+
+    def resizeEvent(self, event: QtGui.QResizeEvent):
+        super().resizeEvent(event)
+        self.view_debouncer.start()
+
+    def _update_view(self):
+        """ let each item know whether any of it is in view. Nothing on a hidden page (like one in another tab) is """
+        visible = self.visibleRegion() if self.isVisible() else QtGui.QRegion()
+        if self.isVisible() and (self.virtualized or len(self._live) < len(self.items)):
+            self._update_live(visible.boundingRect())
+        in_view = {item for item in self._index.intersecting(visible.boundingRect())
+                   if item in self._live and visible.intersects(self._index.rect(item))}
+        # only items coming into or going out of view need telling
+        for item in self._in_view - in_view:
+            item.set_in_view(False)
+        for item in in_view - self._in_view:
+            item.set_in_view(True)
+        self._in_view = in_view
+
+    def _update_live(self, visible: QtCore.QRect):
+        """ give the items near the view widgets, and swap those that have moved away from it for records. Once the
+        page has few enough items not to be virtualized, every item gets its widgets back """
+        if self.virtualized:
+            near = self._index.intersecting(visible.adjusted(-VIRTUAL_MARGIN, -VIRTUAL_MARGIN,
+                                                             VIRTUAL_MARGIN, VIRTUAL_MARGIN))
+            for item in self._live - near:
+                if item.retirable and item not in self.selection:
+                    self._retire(item)
+        else:
+            near = self.items
+        for record in [each for each in near if isinstance(each, PageItemRecord)]:
+            self._realize(record)
+        self.update()
+
+    def _realize(self, record: PageItemRecord) -> PageItem:
+        """ build the widgets of an item the page only has a record of """
+        if record.type == "text" and _spare_items:
+            item = _spare_items.pop()
+            item.reuse(record.id, record.data)
+        else:
+            item = PageItem.unmarshall(record.id, record.data)
+        self.items.replace(record, item)
+        self._index.remove(record)
+        self._connect_item(item)
+        # new widgets go on top. Put it back under the items that were above it
+        above = [each for each in self._live if each is not item and each.z_index > item.z_index]
+        if above:
+            item.stackUnder(min(above, key=lambda each: each.z_index))
+        return item
+
+    def _retire(self, item: PageItem):
+        """ swap a live item for a record of it, and let go of (or keep for reuse) its widgets """
+        record = PageItemRecord(item.id, item.marshal())
+        self.items.replace(item, record)
+        self._disconnect_item(item)
+        self._index.insert(record, record.geometry())
+        if item.type == "text" and len(_spare_items) < SPARE_ITEMS:
+            item.hide()
+            item.setParent(None)
+            _spare_items.append(item)
+        else:
+            item.release()
+
+    def paintEvent(self, event: QtGui.QPaintEvent):
+        super().paintEvent(event)
+        if len(self._live) == len(self.items) and not self.selection:
+            return
+        painter = QtGui.QPainter(self)
+        if len(self._live) < len(self.items):
+            # items scrolled into view before their widgets are built are outlined until they are
+            painter.setPen(QtGui.QPen(QtGui.QColor(ITEM_BORDER_COLOR), 1, QtCore.Qt.DotLine))
+            for each in self.items_in(event.rect()):
+                if isinstance(each, PageItemRecord):
+                    painter.drawRect(each.geometry().adjusted(0, 0, -1, -1))
+        # selected items are outlined just outside their edges, where the page shows around them
+        painter.setPen(QtGui.QPen(QtGui.QColor(SELECTION_BORDER_COLOR), SELECTION_MARGIN))
+        for each in self.selection:
+            painter.drawRect(each.geometry().adjusted(-SELECTION_MARGIN, -SELECTION_MARGIN,
+                                                      SELECTION_MARGIN - 1, SELECTION_MARGIN - 1))
+        painter.end()
+
+    def toggle_selected(self, item: PageItem):
+        if item in self.selection:
+            self.selection.remove(item)
+        else:
+            self.selection.add(item)
+        self.update()
+
+    def select(self, items, add=False):
+        """ select items, instead of what's selected already unless add is set. Records are given widgets first, as
+        only live items can be selected """
+        if not add:
+            self.selection.clear()
+        for each in items:
+            if isinstance(each, PageItemRecord):
+                each = self._realize(each)
+            self.selection.add(each)
+        self.update()
+
+    def clear_selection(self):
+        if self.selection:
+            self.selection.clear()
+            self.update()
+
+    def set_geometries(self, geometries: dict):
+        """ move and resize many items as a single change. Each item is placed without the bookkeeping setGeometry does
+        for it, which is done once for all of them: one reindex, one check of the page's extent, one save and one
+        repaint, however many items there are """
+        right = bottom = 0
+        for item, rect in geometries.items():
+            item.place(rect)
+            item.dirty = True
+            self._index.insert(item, rect)
+            right = max(right, rect.right())
+            bottom = max(bottom, rect.bottom())
+        pos = self.geometry()
+        if right > pos.width() or bottom > pos.height():
+            pos.setWidth(max(right, pos.width()))
+            pos.setHeight(max(bottom, pos.height()))
+            self._resize_to(pos)
+        # the items may have been the farthest, in which case the page can shrink
+        self.size_debouncer.start()
+        self.view_debouncer.start()
+        self._batch_changed()
+
+    @staticmethod
+    def scaled_geometry(rect: QtCore.QRect, anchor: QtCore.QPoint, sx: float, sy: float) -> QtCore.QRect:
+        """ rect scaled by sx and sy about anchor, which stays where it is """
+        x = anchor.x() + round((rect.x() - anchor.x()) * sx)
+        y = anchor.y() + round((rect.y() - anchor.y()) * sy)
+        return QtCore.QRect(x, y, max(1, round(rect.width() * sx)), max(1, round(rect.height() * sy)))
+
+    def delete_items(self, items):
+        """ delete many items as a single change """
+        for item in items:
+            self._forget(item)
+            item.release()
+        self.size_debouncer.start()
+        self._batch_changed()
+
+    def raise_items(self, items):
+        """ bring items to the front as a single change, keeping their order among themselves """
+        self.items.raise_all(items)
+        for each in sorted(items, key=lambda item: item.z_index):
+            each.raise_()
+        self._batch_changed()
+
+    def lower_items(self, items):
+        """ send items to the back as a single change, keeping their order among themselves """
+        self.items.lower_all(items)
+        for each in sorted(items, key=lambda item: item.z_index, reverse=True):
+            each.lower()
+        self._batch_changed()
+
+    def _batch_changed(self):
+        self.mark_dirty()
+        g_save_debouncer.start()
+        self.update()
+
+    def begin_group_gesture(self, leader: PageItem):
+        """ called as leader, one of the selected items, starts being dragged or resized along with the others """
+        self._group_start = {item: item.geometry() for item in self.selection}
+        self._group_leader = leader
+
+    def group_gesture_to(self, pos: QtCore.QRect):
+        """ where the leader's drag or resize has got to. Everything selected is shown following it on the next
+        frame """
+        self._group_frames.post(pos)
+
+    def _group_geometries(self, pos: QtCore.QRect) -> dict:
+        start = self._group_start[self._group_leader]
+        if pos.size() == start.size():
+            offset = pos.topLeft() - start.topLeft()
+            return {item: rect.translated(offset) for item, rect in self._group_start.items()}
+        # resized by the leader's corner. Everything scales about the leader's top left, which stays put
+        sx = pos.width() / start.width()
+        sy = pos.height() / start.height()
+        return {item: self.scaled_geometry(rect, start.topLeft(), sx, sy) for item, rect in self._group_start.items()}
+
+    def _preview_group(self, pos: QtCore.QRect):
+        for item, rect in self._group_geometries(pos).items():
+            item.place(rect)
+        self.update()
+
+    def end_group_gesture(self):
+        self._group_frames.flush()
+        start = self._group_start
+        self._group_start = None
+        self._group_leader = None
+        if start is not None and any(item.geometry() != rect for item, rect in start.items()):
+            self.set_geometries({item: item.geometry() for item in start})
+
+    def items_at(self, point: QtCore.QPoint) -> list:
+        """ the items under point, bottom-most first """
+        found = self._index.at(point)
+        return sorted(found, key=lambda item: item.z_index)
+
+    def items_in(self, rect: QtCore.QRect) -> list:
+        """ the items at least partly inside rect, bottom-most first """
+        found = self._index.intersecting(rect)
+        return sorted(found, key=lambda item: item.z_index)
 
     def _edge_check(self, item: PageItem):
         """ Called when a PageItem is moved, sending it's new right-most point and bottom-most point """
         # TODO make this support top left corner detection for infinite scrolling in both directions (more complicated)
+        was_farthest = item is self.right_max or item is self.bottom_max
+        self._index.insert(item, item.geometry())
         pos = self.geometry()
         right = item.geometry().right()
         bottom = item.geometry().bottom()
         if right > pos.width():
             pos.setWidth(right)
-            self.right_max = item
-        elif self.right_max == item:
-            # The element being moved right now was the previous right-most element. Check if it still is
-            self.size_debouncer.start()
-
         if bottom > pos.height():
             pos.setHeight(bottom)
-            self.bottom_max = item
-        elif self.bottom_max == item:
+        if was_farthest:
+            # The element being moved right now was the previous right-most or bottom-most element. The page may
+            # be able to shrink
             self.size_debouncer.start()
-        # TODO don't bother setting if there's no change (or is this already checked downstream?)
-        self.setGeometry(pos)
+        self._resize_to(pos)
 
     def _add_item(self, item: PageItem):
+        """ add a new item to the page """
+        self._attach_item(item)
+        self.mark_dirty()
+
+    def _attach_item(self, item: PageItem):
+        """ place an item on the page and connect to it, without counting as a change (as when loading) """
         self.ids.add(item.id)
         self.items.append(item)
+        self._connect_item(item)
+        item.setFocus()
+
+    def _connect_item(self, item: PageItem):
+        """ show an item already in self.items on the page, and connect to it """
         item.setParent(self)
         item.show()
-        item.setFocus()
-        item.z_index = len(self.items) - 1  # MUST start at zero for proper behavior of self._raise_item
+        self._index.insert(item, item.geometry())
+        self._live.add(item)
+        # items start out assuming they're in view, until told otherwise
+        self._in_view.add(item)
         item.raised.connect(self._raise_item)
         item.lowered.connect(self._lower_item)
         item.geometry_changed.connect(self._edge_check)
+        item.geometry_changed.connect(self.view_debouncer.start)
+
+    def _disconnect_item(self, item: PageItem):
+        item.raised.disconnect(self._raise_item)
+        item.lowered.disconnect(self._lower_item)
+        item.geometry_changed.disconnect(self._edge_check)
+        item.geometry_changed.disconnect(self.view_debouncer.start)
+        self._index.remove(item)
+        self._live.discard(item)
+        self._in_view.discard(item)
 
     def dropEvent(self, event: QtGui.QDropEvent):
         super().dropEvent(event)
-        if event.mimeData().hasFormat("text/uri-list"):
+        url = dropped_image_url(event.mimeData())
+        if url is not None:
             pos = QtCore.QRect()
             pos.setX(int(event.pos().x()))
             pos.setY(int(event.pos().y()))
             pos.setWidth(200)  # TODO find a better way to set default width
-            db = QtCore.QMimeDatabase()
-            if "image" in db.mimeTypeForUrl(event.mimeData().urls()[0]).name():
-                image = event.mimeData().urls()[0].url()
-                id = self._next_id("Image")
-                item = PageItem(id, pos, img=image, height_from_width=True)
-                self._add_item(item)
-            elif "application/octet-stream" in db.mimeTypeForUrl(event.mimeData().urls()[0]).name():
-                # If it's a stream, we need to download it. However, that could be arbitrarily huge
-                # For now, we're going to base the decision on the file extension.
-                url = event.mimeData().urls()[0].url()
-                if url.endswith(".png") or url.endswith(".jpg") or url.endswith(".jpeg") or url.endswith(".gif"):
-                    id = self._next_id("Image")
-                    item = PageItem(id, pos, img=url, height_from_width=True)
-                    self._add_item(item)
+            id = self._next_id("Image")
+            item = PageItem(id, pos, img=url, height_from_width=True)
+            self._add_item(item)
 
         event.accept()
 
@@ -180,14 +500,60 @@ class Page(QtWidgets.QWidget):
         event.accept()
 
     def mousePressEvent(self, event: QtGui.QMouseEvent):
+        point = event.localPos().toPoint()
+        if any(isinstance(each, PageItemRecord) for each in self.items_at(point)):
+            # a click on an item that hasn't got its widgets yet. Build them, rather than add an item beneath it
+            self._update_view()
+            event.accept()
+            return
+        if event.button() == QtCore.Qt.LeftButton:
+            # a click adds a text box once the button is released; dragging instead draws a rubber band
+            self._band_origin = point
+        event.accept()
+
+    def mouseMoveEvent(self, event: QtGui.QMouseEvent):
+        if self._band_origin is None:
+            return
+        point = event.localPos().toPoint()
+        if self._band is None:
+            if (point - self._band_origin).manhattanLength() < QtWidgets.QApplication.startDragDistance():
+                return
+            self._band = QtWidgets.QRubberBand(QtWidgets.QRubberBand.Rectangle, self)
+            self._band.show()
+        self._band.setGeometry(QtCore.QRect(self._band_origin, point).normalized())
+        event.accept()
+
+    def mouseReleaseEvent(self, event: QtGui.QMouseEvent):
+        origin = self._band_origin
+        self._band_origin = None
+        if origin is None:
+            return
+        event.accept()
+        if self._band is not None:
+            add = bool(event.modifiers() & (QtCore.Qt.ControlModifier | QtCore.Qt.ShiftModifier))
+            self.select(self.items_in(self._band.geometry()), add)
+            self._band.deleteLater()
+            self._band = None
+            self.setFocus()
+            return
+        self.clear_selection()
         pos = QtCore.QRect()
-        pos.setX(int(event.localPos().x()))
-        pos.setY(int(event.localPos().y()))
+        pos.setX(origin.x())
+        pos.setY(origin.y())
         pos.setHeight(100)
         pos.setWidth(400)
         id = self._next_id("Text Box")
         item = PageItem(id, pos)
         self._add_item(item)
+
+    def keyPressEvent(self, event: QtGui.QKeyEvent):
+        if event.key() in (QtCore.Qt.Key_Delete, QtCore.Qt.Key_Backspace) and self.selection:
+            self.delete_items(list(self.selection))
+        elif event.key() == QtCore.Qt.Key_Escape:
+            self.clear_selection()
+        else:
+            super().keyPressEvent(event)
+            return
         event.accept()
 
     def _next_id(self, prefix: str) -> str:
@@ -198,8 +564,18 @@ class Page(QtWidgets.QWidget):
             i += 1
         return "{} {}".format(prefix, i)
 
-    def delete_item(self, i: int):
-        item = self.items.pop(i)
+    def delete_item(self, item: PageItem):
+        self._forget(item)
+        self.size_debouncer.start()
+        self.mark_dirty()
+
+    def _forget(self, item: PageItem):
+        """ drop everything the page keeps about an item being deleted """
+        self.items.remove(item)
         self.ids.remove(item.id)
-        for i, each in enumerate(self.items):
-            each.z_index = i
+        self._index.remove(item)
+        self._live.discard(item)
+        self._in_view.discard(item)
+        if item in self.selection:
+            self.selection.discard(item)
+            self.update()
@@ -1,23 +1,23 @@
 from style_consants import *
 from PySide6 import QtWidgets, QtGui, QtCore
-from utilities.save_mixin import SaveMixin
-from utilities.debounce import Debouncer
+from utilities.save_mixin import SaveMixin, ChangeTracker
+from utilities.debounce import Debouncer, FrameThrottle
 from text_format_palette import G_FORMAT_SIGNALLER
-from threading import Timer
+from utilities.scheduler import g_scheduler
 from image_page_item import PageImageItem
 from utilities.rename_dialog import RenameableMixin
 from settings.__init__ import settings
 
 
-class PageItem(SaveMixin, QtWidgets.QWidget, RenameableMixin):
+class PageItem(SaveMixin, QtWidgets.QWidget, RenameableMixin, ChangeTracker):
     """ Surrounds every EditText or Image widget so it can be dragged and dropped and resized.
      Can be either text (default) or an image (if `img` is provided, which should be a URL).
      Set height_from_width when providing an image to scale the height of the entire widget from
      the width of the image. (Mostly useful when instantiating from a new image, as opposed to from a file) """
 
     # raised and lowered indicate that the item has been brought to front or sent to back
-    raised = QtCore.Signal(int)
-    lowered = QtCore.Signal(int)
+    raised = QtCore.Signal(QtWidgets.QWidget)
+    lowered = QtCore.Signal(QtWidgets.QWidget)
     geometry_changed = QtCore.Signal(QtWidgets.QWidget)
 
     _unique_resource_name = "Item"
@@ -28,27 +28,30 @@ class PageItem(SaveMixin, QtWidgets.QWidget, RenameableMixin):
         self.id = id
         self._lo = QtWidgets.QVBoxLayout()
         self._lo.setContentsMargins(0, 0, 0, 0)
+        # the item's key in its page's ZOrder
         self.z_index = 0
         self._header = PageItemHeader(id)
         self._header.setAlignment(QtCore.Qt.AlignCenter)
         # if img was provided, don't set the content as text, but as a label
         if img != "":
-            self._contents = PageImageItem(self, img, pos.width(), *content_args, **extra_args)
             if height_from_width:
-                # Make the widget big enough to contain the image
+                self._contents = PageImageItem(self, img, pos.width(), *content_args, **extra_args)
+                # Make the widget big enough to contain the image. Until it's loaded, that's the placeholder
                 pos.setHeight(self._contents.height + self._non_content_height())
+                self._contents.loaded.connect(self._fit_image)
+            else:
+                self._contents = PageImageItem(self, img, pos.width(), *content_args,
+                                               height=pos.height() - self._non_content_height(), **extra_args)
             try:
                 # Let the user customize how often a resize of the image is done when resizing the item container
                 timeout = settings.img_resize_interval
             except ValueError:
                 timeout = 0.05
-            self._resize_debouncer = Debouncer(timeout=timeout)
+            self._resize_debouncer = Debouncer(timeout=timeout, parent=self)
             self._resize_debouncer.action = self._resize_image
             self._type = "image"
         else:
             self._contents = PageTextEdit()
-            self._html_contents = ""  # stores item contents in a thread-safe way for saving
-            self._contents.textChanged.connect(self._set_html_contents)
             self._type = "text"
 
         self._resizeArrow = PageItemResizeLabel()
@@ -59,6 +62,12 @@ class PageItem(SaveMixin, QtWidgets.QWidget, RenameableMixin):
         self._lo.setSpacing(0)
         self.setLayout(self._lo)
         self.setGeometry(pos)
+        # drags and resizes move the item at most once a frame, and only count as a change once they're over
+        self._gesture = FrameThrottle(self)
+        self._gesture.action = self.place
+        self._gesture_start = None
+        # whether the current gesture moves (or resizes) the page's whole selection, with this item leading it
+        self._group_gesture = False
         self._connect_signals()
 
     def convert_contents(self, new_type: str):
@@ -69,18 +78,12 @@ class PageItem(SaveMixin, QtWidgets.QWidget, RenameableMixin):
             self._contents = PageCodeEditItem(text)
             self._lo.insertWidget(1, self._contents)
             self._type = new_type
-            self._contents.textChanged.connect(self._set_html_contents)
+            self._changed()
 
     @property
     def page(self):
         return self.parent()
 
-    def _set_html_contents(self):
-        """ stores the contents of the inner text edit widget in the main thread """
-        # this means all text is duplicated in memory. Should find a safer way to save that can access
-        # the toHTML() method safely without causing whatever races condition causes it to crash
-        self._html_contents = self._contents.toHtml()
-
     def _non_content_height(self) -> int:
         """ The vertical space occupied by things other than the content (header, footer) """
         return 30  # TODO make it calculated, not hardcoded
@@ -107,19 +110,27 @@ class PageItem(SaveMixin, QtWidgets.QWidget, RenameableMixin):
         pos.setY(map.y())
         pos.setWidth(width)
         pos.setHeight(height)
-        self.setGeometry(pos)
+        self.gesture_to(pos)
 
     def mouseDoubleClickEvent(self, event: QtGui.QMouseEvent):
         self._rename_dialog()
 
     def mouseReleaseEvent(self, event: QtGui.QMouseEvent):
         self.setMouseTracking(False)
+        self.end_gesture()
         event.accept()
 
     def mousePressEvent(self, ev: QtGui.QMouseEvent):
-        if ev.button() == QtCore.Qt.LeftButton:
+        selecting = ev.modifiers() & (QtCore.Qt.ControlModifier | QtCore.Qt.ShiftModifier)
+        if ev.button() == QtCore.Qt.LeftButton and selecting:
+            self.page.toggle_selected(self)
+            ev.accept()
+        elif ev.button() == QtCore.Qt.LeftButton:
+            if self not in self.page.selection:
+                self.page.clear_selection()
             self.drag_offset = ev.globalPos() - self.parent().mapToGlobal(self.pos())
             self.setMouseTracking(True)
+            self.begin_gesture()
             ev.accept()
         elif ev.button() == QtCore.Qt.RightButton:
             """Open context dialog"""
@@ -138,14 +149,22 @@ class PageItem(SaveMixin, QtWidgets.QWidget, RenameableMixin):
             }}
             """.format(PAGE_ITEM_MENU_BG, PAGE_ITEM_MENU_SELECTED, DEFAULT_ITEM_TEXT_COLOR))
             close_option = QtWidgets.QAction("Remove", dialog)
-            close_option.setStatusTip("Delete this text box and all its contents")
-            close_option.triggered.connect(self.deleteLater)
             raise_option = QtWidgets.QAction("Bring To Front", dialog)
-            # Using parent() (and especially parent().parent()) is extremely fragile.
-            # TODO make more clear cut ways of retrieving the element we want
-            raise_option.triggered.connect(lambda: self.raised.emit(self.z_index))
             lower_option = QtWidgets.QAction("Send To Back", dialog)
-            lower_option.triggered.connect(lambda: self.lowered.emit(self.z_index))
+            group = self._group()
+            if group is not None:
+                # the actions apply to everything selected, as one change
+                close_option.setStatusTip("Delete the selected items and all their contents")
+                close_option.triggered.connect(lambda: self.page.delete_items(group))
+                raise_option.triggered.connect(lambda: self.page.raise_items(group))
+                lower_option.triggered.connect(lambda: self.page.lower_items(group))
+            else:
+                close_option.setStatusTip("Delete this text box and all its contents")
+                close_option.triggered.connect(self.deleteLater)
+                # Using parent() (and especially parent().parent()) is extremely fragile.
+                # TODO make more clear cut ways of retrieving the element we want
+                raise_option.triggered.connect(lambda: self.raised.emit(self))
+                lower_option.triggered.connect(lambda: self.lowered.emit(self))
             rename_option = QtWidgets.QAction("Rename", dialog)
             rename_option.triggered.connect(self._rename_dialog)
             cancel_option = QtWidgets.QAction("Cancel", dialog)
@@ -174,6 +193,102 @@ class PageItem(SaveMixin, QtWidgets.QWidget, RenameableMixin):
         if self.parent() is not None:
             self.geometry_changed.emit(self)
 
+    def _group(self):
+        """ the page's selection, if this item is part of it (and it's more than just this item), otherwise None """
+        selection = self.page.selection
+        if self in selection and len(selection) > 1:
+            return list(selection)
+        return None
+
+    def begin_gesture(self):
+        """ called as a drag or resize starts """
+        self._gesture_start = self.geometry()
+        self._group_gesture = self._group() is not None
+        if self._group_gesture:
+            self.page.begin_group_gesture(self)
+
+    def gesture_to(self, pos: QtCore.QRect):
+        """ where a drag or resize has got to. Shown on the next frame """
+        if self._group_gesture:
+            self.page.group_gesture_to(pos)
+        else:
+            self._gesture.post(pos)
+
+    def place(self, pos: QtCore.QRect):
+        """ show the item at pos without setGeometry's bookkeeping (saving, growing the page, indexing), which waits for
+        the gesture (or batch of changes) to end. Moving a child widget is cheap; resizing an image scales it from its
+        pyramid """
+        resized = pos.size() != self.size()
+        QtWidgets.QWidget.setGeometry(self, pos)
+        if resized and self._type == "image":
+            self._resize_image()
+
+    def end_gesture(self):
+        start = self._gesture_start
+        self._gesture_start = None
+        if self._group_gesture:
+            self._group_gesture = False
+            self.page.end_group_gesture()
+            return
+        self._gesture.flush()
+        if start is not None and start != self.geometry():
+            # everything the gesture's previews skipped, once
+            self.setGeometry(self.geometry())
+
+    def _fit_image(self):
+        """ make the item fit its image, once the image has loaded """
+        geometry = self.geometry()
+        geometry.setHeight(self._contents.height + self._non_content_height())
+        self.setGeometry(geometry)
+
+    @property
+    def type(self) -> str:
+        """ text, code or image """
+        return self._type
+
+    @property
+    def asset_name(self):
+        """ the asset an image item shows, or None """
+        return self._contents.asset_name if self._type == "image" else None
+
+    @property
+    def ready(self) -> bool:
+        """ whether the item can be saved yet. Images can't be until they've loaded """
+        return self._type != "image" or self._contents.ready
+
+    def set_in_view(self, in_view: bool):
+        """ called by the page as the item scrolls into or out of view. Images out of view let go of their pixels """
+        if self._type == "image":
+            self._contents.set_in_view(in_view)
+
+    @property
+    def retirable(self) -> bool:
+        """ whether a virtualized page may swap the item for a PageItemRecord. Not while it's being edited, dragged,
+        resized or loaded, or while it's empty and about to be deleted """
+        focused = QtWidgets.QApplication.focusWidget()
+        if focused is not None and self.isAncestorOf(focused):
+            return False
+        if self._gesture_start is not None:
+            return False
+        if self._type != "image" and self._contents.delete_timer is not None:
+            return False
+        return self.ready
+
+    def reuse(self, id: str, data: dict):
+        """ show another saved text item with this (detached) text item's widgets, rather than building new ones """
+        self.id = id
+        self._header.setText(id)
+        self.setGeometry(QtCore.QRect(*data["geometry"]))
+        self._contents.setHtml(data["contents"]["value"])
+        # as with unmarshall, nothing has changed since it was saved
+        self.mark_clean(data)
+
+    def release(self):
+        """ delete the widgets without deleting the item from its page, once a record has taken its place """
+        self.hide()
+        self.setParent(None)
+        QtWidgets.QWidget.deleteLater(self)
+
     def _resize_image(self):
         width = self.geometry().width()
         self._contents.resize(width)
@@ -189,17 +304,22 @@ class PageItem(SaveMixin, QtWidgets.QWidget, RenameableMixin):
         if data['contents']['type'] == "image":
             item = cls(id, pos, data['contents']['asset_name'], img=data['contents']['url'],
                        **data['contents'].get('extra', {}))
-            item._contents.asset_name = data['contents']['asset_name']
         else:
             item = cls(id, pos)
             item._contents.setHtml(data['contents']['value'])
             if data['contents']['type'] != 'text':
                 item.convert_contents(data['contents']['type'])
-
+        # Building the widget fires the usual change hooks, but nothing has actually changed since it was loaded
+        item.mark_clean(data)
         return item
 
     def marshal(self) -> dict:
-        """ marshal should return the content necessary to later restore this widget from a file """
+        """ marshal should return the content necessary to later restore this widget from a file.
+        Only call on the GUI thread; the result is plain data that can be handed to the writer thread """
+        if not self.dirty and self._marshalled is not None:
+            return self._marshalled
+        # clear the flag before reading our state, so changes made while marshalling are picked up next save
+        self.mark_clean()
         # TODO should probably make this a formal type
         geometry = (
             self.geometry().x(),
@@ -211,28 +331,59 @@ class PageItem(SaveMixin, QtWidgets.QWidget, RenameableMixin):
             "type": self._type,
         }
         if self._type == "text":
-            contents["value"] = self._html_contents
+            contents["value"] = self._contents.toHtml()
         elif self._type == "code":
-            contents["value"] = self._html_contents
+            contents["value"] = self._contents.toHtml()
         elif self._type == "image":
-            # Write assets to a file, then generate a url from it
+            # Queue the asset to be written to a file, then generate a url from it
             self._contents.save_asset()
-            url = QtCore.QUrl.fromLocalFile(self._contents.asset_file)
-            contents["url"] = url.url()
+            contents["url"] = self._contents.asset_url
             contents["asset_name"] = self._contents.asset_name
             contents["extra"] = self._contents.extra
-        return {
+        self._marshalled = {
             "geometry": geometry,
             "contents": contents,
         }
+        return self._marshalled
 
     def deleteLater(self):
-        if self._type == "image":
-            self._contents.delete_asset()
-        self.parent().delete_item(self.z_index)
+        # an image's asset may be shared with other items. The store deletes it once no saved notebook refers to it
+        self.parent().delete_item(self)
         super().deleteLater()
 
 
+class PageItemRecord:
+    """ stands in for a PageItem while a virtualized page has no widgets for it: its marshalled data, and enough of
+    the PageItem interface (id, z_index, geometry, marshal) for the page to order, save and find it """
+
+    # records are only made of items that could be saved
+    ready = True
+
+    def __init__(self, id: str, data: dict):
+        self.id = id
+        self.data = data
+        # set by the page's ZOrder
+        self.z_index = 0
+        self._geometry = QtCore.QRect(*data["geometry"])
+
+    @property
+    def type(self) -> str:
+        return self.data["contents"]["type"]
+
+    @property
+    def asset_name(self):
+        return self.data["contents"].get("asset_name")
+
+    def geometry(self) -> QtCore.QRect:
+        return QtCore.QRect(self._geometry)
+
+    def marshal(self) -> dict:
+        return self.data
+
+    def set_in_view(self, in_view: bool):
+        """ records have nothing to show """
+
+
 class PageTextContent(QtWidgets.QTextBrowser, SaveMixin):
     """ Super class of all text-based item types."""
     # _active_item tracks, statically, which Item currently has focus. This is for receiving text format signals
@@ -244,7 +395,8 @@ class PageTextContent(QtWidgets.QTextBrowser, SaveMixin):
         super().__init__()
         self.setHtml(initial_text)
         self.setReadOnly(False)
-        self.delete_timer = Timer(5, self.deleteLater)
+        # an empty item is deleted a few seconds after it loses focus, unless it gets focus back first
+        self.delete_timer = None
         self.setStyleSheet("""
             QTextEdit {{
                 background-color: transparent;
@@ -268,8 +420,9 @@ class PageTextContent(QtWidgets.QTextBrowser, SaveMixin):
     def focusInEvent(self, e: QtGui.QFocusEvent):
         super().focusInEvent(e)
         # If this widget is pending deletion and we click it again, cancel deletion
-        if self.delete_timer.is_alive():
+        if self.delete_timer is not None:
             self.delete_timer.cancel()
+            self.delete_timer = None
         self.set_active_item(self)
         self._connect_format_signals()
         # Update the global text formatter with our current font size
@@ -284,8 +437,9 @@ class PageTextContent(QtWidgets.QTextBrowser, SaveMixin):
         """ If the text widget loses focus and has no text, delete it"""
         super().focusOutEvent(e)
         if self.toPlainText() == "":
-            self.delete_timer = Timer(5, self.parent().deleteLater)
-            self.delete_timer.start()
+            if self.delete_timer is not None:
+                self.delete_timer.cancel()
+            self.delete_timer = g_scheduler.call_later(5, self.parent().deleteLater, self)
 
     def get_format(self) -> QtGui.QTextCharFormat:
         cursor = self.textCursor()
@@ -540,23 +694,28 @@ class PageItemResizeLabel(PageItemSurround):
 
     def __init__(self):
         super().__init__("⇲")
-        self.last_pos = None
+        # where the resize started, and the item's geometry then. The item only catches up once a frame, so the
+        # resize is measured from the start rather than from the last mouse move
+        self.start_pos = None
+        self.start_geometry = None
 
     def mousePressEvent(self, ev: QtGui.QMouseEvent):
-        self.last_pos = ev.globalPos()
+        self.start_pos = ev.globalPos()
+        self.start_geometry = self.parent().geometry()
+        self.parent().begin_gesture()
         self.setMouseTracking(True)
 
     def mouseReleaseEvent(self, ev: QtGui.QMouseEvent):
         self.setMouseTracking(False)
-        self.last_pos = None
+        self.start_pos = None
+        self.parent().end_gesture()
 
     def mouseMoveEvent(self, ev: QtGui.QMouseEvent):
-        if self.last_pos is None:
+        if self.start_pos is None:
             return
-        travel_x = ev.globalPos().x() - self.last_pos.x()
-        travel_y = ev.globalPos().y() - self.last_pos.y()
-        self.last_pos = ev.globalPos()
-        pos = self.parent().geometry()
+        travel_x = ev.globalPos().x() - self.start_pos.x()
+        travel_y = ev.globalPos().y() - self.start_pos.y()
+        pos = QtCore.QRect(self.start_geometry)
         pos.setWidth(pos.width() + travel_x)
         pos.setHeight(pos.height() + travel_y)
-        self.parent().setGeometry(pos)
+        self.parent().gesture_to(pos)
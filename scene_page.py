@@ -0,0 +1,579 @@
+""" a page drawn by a QGraphicsView, as an alternative to Page's child widgets (see the page_backend setting). Items
+are graphics items in a QGraphicsScene: a frame with a header to drag them by and a corner to resize them from, around
+a QGraphicsTextItem or a QGraphicsPixmapItem. The scene's BSP index only paints and hit tests the items near what's
+being looked at, so pages with hundreds of items scroll and drag smoothly, and the view can zoom.
+
+ScenePages marshal to exactly the same data as Pages, so a workspace can be opened with either. """
+
+from PySide6 import QtWidgets, QtGui, QtCore
+from utilities.debounce import Debouncer, FrameThrottle, g_save_debouncer
+from utilities.save_mixin import ChangeTracker
+from utilities.rename_dialog import RenameableMixin
+from utilities.image_source import ImageSource
+from utilities.image_edits import ImageEdits
+from utilities.z_order import ZOrder
+from utilities.scheduler import g_scheduler
+from utilities.toaster import toast_near
+from image_page_item import REFINE_DELAY
+from page import dropped_image_url
+from settings.__init__ import settings
+from style_consants import *
+from uuid import uuid4
+
+PAGE_BACKEND_WIDGETS = "widgets"
+PAGE_BACKEND_SCENE = "scene"
+PAGE_BACKENDS = (PAGE_BACKEND_WIDGETS, PAGE_BACKEND_SCENE)
+
+# the frame around an item's contents, as with PageItem's header and resize label
+HEADER_HEIGHT = 15
+FOOTER_HEIGHT = 15
+MIN_ITEM_SIZE = 40
+# each step of the mouse wheel (with ctrl held) zooms by this much, up to these limits
+ZOOM_STEP = 1.15
+MIN_ZOOM = 0.25
+MAX_ZOOM = 4
+
+
+class SceneItem(QtWidgets.QGraphicsObject, ChangeTracker):
+    """ the frame of an item on a ScenePage, positioned and sized like a PageItem's geometry. Its contents are a child
+    graphics item, laid out by subclasses in _layout """
+
+    # the asset an image item shows
+    asset_name = None
+
+    def __init__(self, id: str, rect: QtCore.QRect, type: str):
+        super().__init__()
+        self.id = id
+        # text, code or image. Not type, which QGraphicsItem already has
+        self._type = type
+        self.page = None
+        self.z_index = 0
+        self._size = QtCore.QSize(rect.width(), rect.height())
+        self._hovered = False
+        # where a resize from the bottom right corner started, while one is under way
+        self._resize_origin = None
+        # the geometry a drag or resize started from. Until it ends, moves aren't counted as changes, and resizes are
+        # shown at most once a frame
+        self._gesture_start = None
+        self._resize_frames = FrameThrottle(self)
+        self._resize_frames.action = self._preview_geometry
+        self.setPos(rect.x(), rect.y())
+        self.setFlags(QtWidgets.QGraphicsItem.ItemIsMovable | QtWidgets.QGraphicsItem.ItemSendsGeometryChanges |
+                      QtWidgets.QGraphicsItem.ItemClipsChildrenToShape)
+        self.setAcceptHoverEvents(True)
+
+    @property
+    def ready(self) -> bool:
+        return True
+
+    def geometry(self) -> QtCore.QRect:
+        return QtCore.QRect(round(self.x()), round(self.y()), self._size.width(), self._size.height())
+
+    def set_geometry(self, rect: QtCore.QRect):
+        self.prepareGeometryChange()
+        self._size = QtCore.QSize(max(MIN_ITEM_SIZE, rect.width()), max(MIN_ITEM_SIZE, rect.height()))
+        self.setPos(rect.x(), rect.y())
+        self._layout()
+        self._changed()
+
+    def _preview_geometry(self, rect: QtCore.QRect):
+        self.prepareGeometryChange()
+        self._size = QtCore.QSize(max(MIN_ITEM_SIZE, rect.width()), max(MIN_ITEM_SIZE, rect.height()))
+        self._layout()
+
+    def _content_rect(self) -> QtCore.QRectF:
+        return QtCore.QRectF(0, HEADER_HEIGHT, self._size.width(),
+                             max(1, self._size.height() - HEADER_HEIGHT - FOOTER_HEIGHT))
+
+    def _layout(self):
+        """ fit the contents to the frame """
+
+    def _changed(self, *args):
+        """ the scene's equivalent of SaveMixin._changed. Graphics items have no widget parents to mark dirty """
+        self.dirty = True
+        if self.page is not None:
+            self.page.mark_dirty()
+            self.page.item_changed(self)
+        g_save_debouncer.start()
+
+    def boundingRect(self) -> QtCore.QRectF:
+        return QtCore.QRectF(0, 0, self._size.width(), self._size.height())
+
+    def paint(self, painter: QtGui.QPainter, option, widget=None):
+        if not self._hovered:
+            return
+        # the header and resize corner only show while the mouse is over the item, as with PageItem's
+        header = QtCore.QRectF(0, 0, self._size.width(), HEADER_HEIGHT).adjusted(0.5, 0.5, -0.5, -0.5)
+        painter.setPen(QtGui.QColor(ITEM_BORDER_COLOR))
+        painter.drawRoundedRect(header, 3, 3)
+        painter.setPen(QtGui.QColor(DEFAULT_ITEM_TEXT_COLOR))
+        painter.drawText(header, QtCore.Qt.AlignCenter, self.id)
+        footer = QtCore.QRectF(0, self._size.height() - FOOTER_HEIGHT, self._size.width(), FOOTER_HEIGHT)
+        painter.drawText(footer, QtCore.Qt.AlignRight, "⇲")
+
+    def _in_resize_corner(self, pos: QtCore.QPointF) -> bool:
+        return pos.x() > self._size.width() - FOOTER_HEIGHT and pos.y() > self._size.height() - FOOTER_HEIGHT
+
+    def hoverEnterEvent(self, event):
+        self._hovered = True
+        self.update()
+
+    def hoverMoveEvent(self, event):
+        if self._in_resize_corner(event.pos()):
+            self.setCursor(QtCore.Qt.SizeFDiagCursor)
+        elif event.pos().y() < HEADER_HEIGHT:
+            self.setCursor(QtCore.Qt.SizeAllCursor)
+        else:
+            self.unsetCursor()
+
+    def hoverLeaveEvent(self, event):
+        self._hovered = False
+        self.unsetCursor()
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == QtCore.Qt.LeftButton:
+            self._gesture_start = self.geometry()
+        if event.button() == QtCore.Qt.LeftButton and self._in_resize_corner(event.pos()):
+            self._resize_origin = (event.scenePos(), QtCore.QSize(self._size))
+            event.accept()
+        else:
+            super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self._resize_origin is None:
+            super().mouseMoveEvent(event)
+            return
+        origin, size = self._resize_origin
+        travel = event.scenePos() - origin
+        rect = self.geometry()
+        rect.setWidth(size.width() + round(travel.x()))
+        rect.setHeight(size.height() + round(travel.y()))
+        self._resize_frames.post(rect)
+
+    def mouseReleaseEvent(self, event):
+        self._resize_frames.flush()
+        self._resize_origin = None
+        start = self._gesture_start
+        self._gesture_start = None
+        super().mouseReleaseEvent(event)
+        if start is not None and start != self.geometry():
+            self._changed()
+
+    def mouseDoubleClickEvent(self, event):
+        if event.pos().y() < HEADER_HEIGHT:
+            self.page._rename_dialog(self)
+        else:
+            super().mouseDoubleClickEvent(event)
+
+    def itemChange(self, change, value):
+        if change == QtWidgets.QGraphicsItem.ItemPositionHasChanged and self._gesture_start is None:
+            self._changed()
+        return super().itemChange(change, value)
+
+    def contextMenuEvent(self, event):
+        menu = QtWidgets.QMenu("Actions")
+        menu.addAction("Bring To Front", lambda: self.page._raise_item(self))
+        menu.addAction("Send To Back", lambda: self.page._lower_item(self))
+        menu.addAction("Rename", lambda: self.page._rename_dialog(self))
+        menu.addSeparator()
+        menu.addAction("Remove", self.remove)
+        self._add_actions(menu)
+        menu.addSeparator()
+        menu.addAction("Cancel")
+        menu.exec(event.screenPos())
+        event.accept()
+
+    def _add_actions(self, menu: QtWidgets.QMenu):
+        """ add the actions particular to the kind of item to its context menu """
+
+    def remove(self):
+        self.page.delete_item(self)
+
+    def marshal(self) -> dict:
+        """ the same data PageItem.marshal makes """
+        if not self.dirty and self._marshalled is not None:
+            return self._marshalled
+        self.mark_clean()
+        geometry = self.geometry()
+        self._marshalled = {
+            "geometry": (geometry.x(), geometry.y(), geometry.width(), geometry.height()),
+            "contents": self._marshal_contents(),
+        }
+        return self._marshalled
+
+    def _marshal_contents(self) -> dict:
+        """ the same contents PageItem.marshal makes for each type """
+        contents = {
+            "type": self._type,
+        }
+        if self._type == "image":
+            # Queue the asset to be written, then generate a url from it
+            self._image.save_asset()
+            contents["url"] = self._image.asset_url
+            contents["asset_name"] = self._image.asset_name
+            contents["extra"] = self.extra
+        else:
+            contents["value"] = self._text.toHtml()
+        return contents
+
+    @staticmethod
+    def unmarshal(id: str, data: dict):
+        rect = QtCore.QRect(*data["geometry"])
+        contents = data["contents"]
+        if contents["type"] == "image":
+            item = SceneImageItem(id, rect, contents["url"], contents["asset_name"], **contents.get("extra", {}))
+        else:
+            item = SceneTextItem(id, rect, contents["value"], contents["type"])
+        item.mark_clean(data)
+        return item
+
+
+class SceneTextItem(SceneItem):
+    """ text or code, edited in place """
+
+    def __init__(self, id: str, rect: QtCore.QRect, html="", type="text"):
+        super().__init__(id, rect, type)
+        self._text = QtWidgets.QGraphicsTextItem(self)
+        self._text.setTextInteractionFlags(QtCore.Qt.TextEditorInteraction)
+        self._text.setHtml(html)
+        if type == "code":
+            # the same way PageCodeEditItem does, as a character format over all the text, so code saves the same
+            # under either backend
+            document = self._text.document()
+            cursor = QtGui.QTextCursor(document)
+            cursor.select(QtGui.QTextCursor.Document)
+            fmt = QtGui.QTextCharFormat()
+            fmt.setFontFamilies([settings.code_font])
+            cursor.mergeCharFormat(fmt)
+            option = document.defaultTextOption()
+            option.setTabStopDistance(settings.tabstop * QtGui.QFontMetrics(self._text.font()).horizontalAdvance(" "))
+            document.setDefaultTextOption(option)
+        self._layout()
+        self._text.document().contentsChanged.connect(self._changed)
+
+    def setFocus(self):
+        self._text.setFocus()
+
+    def _layout(self):
+        content = self._content_rect()
+        self._text.setPos(content.topLeft())
+        self._text.setTextWidth(content.width())
+
+    def paint(self, painter: QtGui.QPainter, option, widget=None):
+        content = self._content_rect().adjusted(0.5, 0.5, -0.5, -0.5)
+        if self._type == "code":
+            painter.fillRect(content, QtGui.QColor(EDIT_CODE_BG))
+            painter.setPen(QtGui.QColor(ITEM_BORDER_COLOR))
+        else:
+            painter.setPen(QtGui.QPen(QtGui.QColor(ITEM_BORDER_COLOR), 1, QtCore.Qt.DotLine))
+        painter.drawRect(content)
+        super().paint(painter, option, widget)
+
+
+class SceneImageItem(SceneItem):
+    """ an image, shown at the width of its frame. Its ImageSource reads, decodes, scales and caches it the way it does
+    for PageImageItems, and it's edited (rotated and flipped) the same non-destructive way. While a resize is under
+    way, the image shown is scaled by the scene, which costs nothing, until it's smoothly rescaled once the size
+    settles. GIFs show their first frame """
+
+    def __init__(self, id: str, rect: QtCore.QRect, img_url: str, asset_name=None, height_from_width=False, **extra):
+        super().__init__(id, rect, "image")
+        # whether the frame should take the image's height once it's known
+        self._fit_height = height_from_width
+        self._extra = extra
+        self._image = ImageSource(self, img_url, asset_name, ImageEdits.unmarshal(extra.get("transform", {})))
+        self._image.thumbnail.connect(self._show)
+        self._image.decoded.connect(self._image_loaded)
+        self._image.rendition.connect(self._show)
+        self._image.named.connect(self._changed)
+        self._image.failed.connect(self._failed)
+        self._refine_call = None
+        self._pixmap = QtWidgets.QGraphicsPixmapItem(self)
+        self._pixmap.setTransformationMode(QtCore.Qt.SmoothTransformation)
+        width = round(self._content_rect().width())
+        placeholder = QtGui.QPixmap(width, max(1, round(self._content_rect().height())))
+        placeholder.fill(QtGui.QColor(PAGE_ITEM_MENU_BG))
+        self._pixmap.setPixmap(placeholder)
+        self._layout()
+        self._image.load(width)
+
+    @property
+    def asset_name(self):
+        return self._image.asset_name
+
+    @property
+    def ready(self) -> bool:
+        return self._image.ready
+
+    @property
+    def extra(self) -> dict:
+        extra = dict(self._extra)
+        extra["transform"] = self._image.edits.marshal()
+        return extra
+
+    def _layout(self):
+        content = self._content_rect()
+        self._pixmap.setPos(content.topLeft())
+        pixmap = self._pixmap.pixmap()
+        if pixmap.width() > 0:
+            # shown at the new width right away. _render replaces it with a smooth rendition once resizing stops
+            self._pixmap.setScale(content.width() / pixmap.width())
+        self._render()
+
+    def _show(self, image: QtGui.QImage):
+        self._pixmap.setPixmap(QtGui.QPixmap.fromImage(image))
+        self._pixmap.setScale(self._content_rect().width() / image.width())
+
+    def _failed(self, error):
+        toast_near(self.page, "Couldn't load image")
+        if self._image.asset_name is None:
+            # a newly added image that can't be read is of no use to anyone
+            self.remove()
+
+    def _image_loaded(self, image):
+        # the nearest level straight away, scaled by the scene, until _render has it smoothly rescaled
+        pyramid = image.pyramid
+        self._show(pyramid.levels[pyramid.level(round(self._content_rect().width()))])
+        if self._fit_height:
+            self._fit_height = False
+            rect = self.geometry()
+            size = self._image.size
+            rect.setHeight(round(self._content_rect().width() * size.height() / size.width()) +
+                           HEADER_HEIGHT + FOOTER_HEIGHT)
+            self.set_geometry(rect)
+        else:
+            self._render()
+
+    def _render(self):
+        """ schedule a smooth rescale to the frame's width, for once it stops changing """
+        if self._image.size is None:
+            return
+        if self._refine_call is not None:
+            self._refine_call.cancel()
+        self._refine_call = g_scheduler.call_later(REFINE_DELAY, self._refine, self)
+
+    def _refine(self):
+        self._refine_call = None
+        width = round(self._content_rect().width())
+        if self._pixmap.pixmap().width() == width and self._pixmap.scale() == 1:
+            return
+        pyramid = self._image.pixels()
+        if pyramid is None:
+            self._image.decode()
+            return
+        self._image.refine(pyramid, width)
+
+    def _edit(self, edits: ImageEdits, preview: QtGui.QTransform):
+        self._pixmap.setPixmap(self._pixmap.pixmap().transformed(preview))
+        self._pixmap.setScale(self._content_rect().width() / self._pixmap.pixmap().width())
+        if self._image.edit(edits) is not None:
+            self._render()
+        self._changed()
+
+    def _add_actions(self, menu: QtWidgets.QMenu):
+        menu.addSeparator()
+        edits = self._image.edits
+        menu.addAction("Rotate", lambda: self._edit(edits.rotated(90), QtGui.QTransform().rotate(90)))
+        menu.addAction("Rotate Back", lambda: self._edit(edits.rotated(-90), QtGui.QTransform().rotate(-90)))
+        menu.addAction("Flip", lambda: self._edit(edits.flipped(), QtGui.QTransform.fromScale(-1, 1)))
+
+
+class ScenePage(QtWidgets.QGraphicsView, ChangeTracker, RenameableMixin):
+    """ a page of SceneItems. Scrolls itself (so sections show it without a scroll area), grows as items are moved
+    past its edges, and zooms with ctrl and the mouse wheel """
+
+    _unique_resource_name = "Item"
+
+    def __init__(self, id="1"):
+        super().__init__()
+        self.id = id
+        self.uid = uuid4().hex
+        self.ids = set()
+        self.section = None
+        # in stacking order, as with Page. Their z values are their ZOrder keys
+        self.items = ZOrder()
+        self._pending = None
+        self._scene = QtWidgets.QGraphicsScene(self)
+        self._scene.setItemIndexMethod(QtWidgets.QGraphicsScene.BspTreeIndex)
+        self.setScene(self._scene)
+        self.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
+        self.setBackgroundBrush(QtGui.QColor(PAGE_BG))
+        self.setCacheMode(QtWidgets.QGraphicsView.CacheBackground)
+        self.setViewportUpdateMode(QtWidgets.QGraphicsView.SmartViewportUpdate)
+        self.setTransformationAnchor(QtWidgets.QGraphicsView.AnchorUnderMouse)
+        self.setAcceptDrops(True)
+        self.setSceneRect(0, 0, 1, 1)
+        # the page only shrinks once items have stopped moving
+        self.size_debouncer = Debouncer(timeout=0.5, parent=self)
+        self.size_debouncer.action = self._eval_resize
+
+    @property
+    def scroll_area(self):
+        return self
+
+    def viewport_size(self) -> QtCore.QSizeF:
+        """ the size of the page that's in view, at the current zoom """
+        return self.mapToScene(self.viewport().rect()).boundingRect().size()
+
+    def _eval_resize(self):
+        """ fit the page to its items, but never smaller than the view """
+        if self._pending is not None:
+            return
+        rect = QtCore.QRectF(QtCore.QPointF(0, 0), self.viewport_size())
+        if self.items:
+            bounds = self._scene.itemsBoundingRect()
+            rect = rect.united(QtCore.QRectF(0, 0, bounds.right(), bounds.bottom()))
+        self.setSceneRect(rect)
+
+    def item_changed(self, item: SceneItem):
+        """ called by items as they're moved or resized, to grow the page past them right away """
+        rect = self.sceneRect()
+        bounds = item.sceneBoundingRect()
+        if bounds.right() > rect.right() or bounds.bottom() > rect.bottom():
+            self.setSceneRect(rect.united(QtCore.QRectF(0, 0, bounds.right(), bounds.bottom())))
+        self.size_debouncer.start()
+
+    def resizeEvent(self, event: QtGui.QResizeEvent):
+        super().resizeEvent(event)
+        self.size_debouncer.start()
+
+    def showEvent(self, event: QtGui.QShowEvent):
+        self._materialize()
+        super().showEvent(event)
+
+    def wheelEvent(self, event: QtGui.QWheelEvent):
+        if not event.modifiers() & QtCore.Qt.ControlModifier:
+            super().wheelEvent(event)
+            return
+        step = ZOOM_STEP if event.angleDelta().y() > 0 else 1 / ZOOM_STEP
+        zoom = self.transform().m11() * step
+        if MIN_ZOOM <= zoom <= MAX_ZOOM:
+            self.scale(step, step)
+            self.size_debouncer.start()
+        event.accept()
+
+    def _raise_item(self, item: SceneItem):
+        self.items.raise_(item)
+        item.setZValue(item.z_index)
+        item._changed()
+
+    def _lower_item(self, item: SceneItem):
+        self.items.lower(item)
+        item.setZValue(item.z_index)
+        item._changed()
+
+    def _try_rename(self, name: str, item: SceneItem) -> bool:
+        if not self.rename_item(item, name):
+            return False
+        item._changed()
+        item.update()
+        return True
+
+    def rename_item(self, item, name: str) -> bool:
+        if name in self.ids:
+            return False
+        self.ids.add(name)
+        self.ids.remove(item.id)
+        item.id = name
+        return True
+
+    def marshal(self):
+        if self._pending is not None:
+            return self._pending
+        if not self.dirty and self._marshalled is not None:
+            return self._marshalled
+        self.mark_clean()
+        rect = self.sceneRect()
+        data = {
+            "uid": self.uid,
+            "items": {},
+            "geometry": (round(rect.width()), round(rect.height())),
+        }
+        for each in self.items:
+            if each.ready:
+                data["items"][each.id] = each.marshal()
+        self._marshalled = data
+        return data
+
+    @classmethod
+    def unmarshal(cls, id: str, data: dict):
+        """ create a page from its marshalled data. As with Page, its items aren't built until it's first shown """
+        page = cls(id)
+        page.uid = data.setdefault("uid", page.uid)
+        page.setSceneRect(0, 0, data["geometry"][0], data["geometry"][1])
+        page._pending = data
+        page.mark_clean(data)
+        return page
+
+    def _materialize(self):
+        data = self._pending
+        if data is None:
+            return
+        self._pending = None
+        for id, each in data["items"].items():
+            self._attach_item(SceneItem.unmarshal(id, each))
+
+    def _add_item(self, item: SceneItem):
+        self._attach_item(item)
+        self.mark_dirty()
+
+    def _attach_item(self, item: SceneItem):
+        self.ids.add(item.id)
+        self.items.append(item)
+        item.page = self
+        item.setZValue(item.z_index)
+        self._scene.addItem(item)
+        self.item_changed(item)
+
+    def delete_item(self, item: SceneItem):
+        self.items.remove(item)
+        self.ids.remove(item.id)
+        self._scene.removeItem(item)
+        item.deleteLater()
+        self.size_debouncer.start()
+        self.mark_dirty()
+        g_save_debouncer.start()
+
+    def items_at(self, point: QtCore.QPoint) -> list:
+        """ the items under point (in page coordinates), bottom-most first """
+        return sorted((each for each in self._scene.items(QtCore.QPointF(point)) if isinstance(each, SceneItem)),
+                      key=lambda item: item.z_index)
+
+    def items_in(self, rect: QtCore.QRect) -> list:
+        """ the items at least partly inside rect (in page coordinates), bottom-most first """
+        return sorted((each for each in self._scene.items(QtCore.QRectF(rect)) if isinstance(each, SceneItem)),
+                      key=lambda item: item.z_index)
+
+    def mousePressEvent(self, event: QtGui.QMouseEvent):
+        if event.button() != QtCore.Qt.LeftButton or self.itemAt(event.pos()) is not None:
+            super().mousePressEvent(event)
+            return
+        # a click on an empty part of the page starts a new text box there, as on a Page
+        pos = self.mapToScene(event.pos()).toPoint()
+        item = SceneTextItem(self._next_id("Text Box"), QtCore.QRect(pos.x(), pos.y(), 400, 100))
+        self._add_item(item)
+        item.setFocus()
+        event.accept()
+
+    def dragEnterEvent(self, event: QtGui.QDragEnterEvent):
+        event.accept()
+
+    def dragMoveEvent(self, event: QtGui.QDragMoveEvent):
+        event.accept()
+
+    def dropEvent(self, event: QtGui.QDropEvent):
+        url = dropped_image_url(event.mimeData())
+        if url is not None:
+            pos = self.mapToScene(event.pos()).toPoint()
+            rect = QtCore.QRect(pos.x(), pos.y(), 200, 150 + HEADER_HEIGHT + FOOTER_HEIGHT)
+            self._add_item(SceneImageItem(self._next_id("Image"), rect, url, height_from_width=True))
+        event.accept()
+
+    def _next_id(self, prefix: str) -> str:
+        if prefix not in self.ids:
+            return prefix
+        i = 1
+        while "{} {}".format(prefix, i) in self.ids:
+            i += 1
+        return "{} {}".format(prefix, i)
@@ -1,11 +1,18 @@
 from PySide6 import QtWidgets, QtGui
-from utilities.save_mixin import SaveMixin
+from utilities.save_mixin import SaveMixin, ChangeTracker
 from utilities.rename_dialog import RenameableMixin
 from page import Page
+from scene_page import ScenePage, PAGE_BACKEND_SCENE
+from settings.__init__ import settings
 from style_consants import *
 
 
-class Section(QtWidgets.QTabWidget, SaveMixin, RenameableMixin):
+def page_class():
+    """ what pages are built as, per the page_backend setting """
+    return ScenePage if settings.page_backend == PAGE_BACKEND_SCENE else Page
+
+
+class Section(QtWidgets.QTabWidget, SaveMixin, RenameableMixin, ChangeTracker):
 
     _unique_resource_name = "Page"
 
@@ -62,7 +69,7 @@ class Section(QtWidgets.QTabWidget, SaveMixin, RenameableMixin):
     def _check_handle_new_section(self, index: str):
         if index == len(self.pages):
             id = self._next_id()
-            page = Page(id)
+            page = page_class()(id)
             i = self._add_page(page)
             self.setCurrentIndex(i)
 
@@ -70,6 +77,7 @@ class Section(QtWidgets.QTabWidget, SaveMixin, RenameableMixin):
         self.removeTab(index)
         page = self.pages.pop(index)
         self.ids.remove(page.id)
+        self.mark_dirty()
 
     def _next_id(self, prefix="page", start="1"):
         if "{}-{}".format(prefix, start) not in self.ids:
@@ -82,10 +90,14 @@ class Section(QtWidgets.QTabWidget, SaveMixin, RenameableMixin):
     def _add_page(self, page: Page) -> int:
         self.tabBar().removeTab(len(self.pages))
         page.section = self
-        scroll = QtWidgets.QScrollArea(self)
-        scroll.setWidget(page)
-        scroll.setStyleSheet("border: 0px;")
-        page.scroll_area = scroll
+        if isinstance(page, ScenePage):
+            # scrolls itself
+            tab = page
+        else:
+            tab = QtWidgets.QScrollArea(self)
+            tab.setWidget(page)
+            tab.setStyleSheet("border: 0px;")
+            page.scroll_area = tab
         self.ids.add(page.id)
         self.pages.append(page)
         pos = page.geometry()
@@ -93,16 +105,18 @@ class Section(QtWidgets.QTabWidget, SaveMixin, RenameableMixin):
         pos.setHeight(self.height())
         page.setGeometry(pos)
         self._append_placeholder()
-        return self.addTab(scroll, page.id)
+        self.mark_dirty()
+        return self.addTab(tab, page.id)
 
     def transform_page(self, event: QtGui.QMouseEvent):
         """ Turns the current dummy page into a real page and adds a new dummy page tab """
         id = self._next_id()
-        page = Page(id)
+        page = page_class()(id)
         self.removeTab(len(self.pages))
         index = self._add_page(page)
         self.setCurrentIndex(index)
         page.mousePressEvent(event)
+        page.mouseReleaseEvent(event)
         self._append_placeholder()
 
     # overridden methods to deal with using the id (which starts with page-) without displaying the prefix
@@ -116,16 +130,21 @@ class Section(QtWidgets.QTabWidget, SaveMixin, RenameableMixin):
     def unmarshal(cls, new_id: str, data: dict):
         pages = []
         for id, each in data["pages"].items():
-            page = Page.unmarshal(id, each)
+            page = page_class().unmarshal(id, each)
             pages.append(page)
         section = cls(new_id, pages)
         section.setCurrentIndex(len(section.pages) - 1)
+        section.mark_clean(data)
         return section
 
     def marshal(self) -> dict:
+        if not self.dirty and self._marshalled is not None:
+            return self._marshalled
+        self.mark_clean()
         data = {
             "pages": {}
         }
         for page in self.pages:
             data["pages"][page.id] = page.marshal()
+        self._marshalled = data
         return data
@@ -1,6 +1,7 @@
 from PySide6.QtCore import QSettings
 from typing import Callable, Any
 from .password import Password
+from utilities.atomic_write import FSYNC_POLICIES, FSYNC_FILE
 import subprocess
 from os import getcwd, chdir
 
@@ -96,6 +97,75 @@ def validate_enable_git(value: bool):
     return True
 
 
+def validate_auto_save_interval(value: float):
+    """ Ensure the interval is a positive number of seconds """
+    try:
+        value = float(value)
+    except ValueError as e:
+        raise ValidationError(e)
+    if value <= 0:
+        raise ValidationError("the auto save interval must be more than 0 seconds")
+    return True
+
+
+def validate_page_backend(value: str):
+    """ Ensure the page backend exists """
+    # imported here, as pages themselves depend on settings
+    from scene_page import PAGE_BACKENDS
+    if value not in PAGE_BACKENDS:
+        raise ValidationError("page backend must be one of: {}".format(", ".join(PAGE_BACKENDS)))
+    return True
+
+
+def validate_virtual_page_items(value: int):
+    """ Ensure the threshold isn't negative """
+    try:
+        value = int(value)
+    except ValueError as e:
+        raise ValidationError(e)
+    if value < 0:
+        raise ValidationError("the number of items before pages are virtualized can't be negative")
+    return True
+
+
+def validate_thumbnail_cache(value: int):
+    """ Ensure there's room for at least some thumbnails """
+    try:
+        value = int(value)
+    except ValueError as e:
+        raise ValidationError(e)
+    if value <= 0:
+        raise ValidationError("the thumbnail cache must be more than 0 MB")
+    return True
+
+
+def validate_image_memory(value: int):
+    """ Ensure there's room for at least one decoded image """
+    try:
+        value = int(value)
+    except ValueError as e:
+        raise ValidationError(e)
+    if value <= 0:
+        raise ValidationError("the image memory budget must be more than 0 MB")
+    return True
+
+
+def validate_fsync_policy(value: str):
+    """ Ensure the fsync policy is one the atomic file writer understands """
+    if value not in FSYNC_POLICIES:
+        raise ValidationError("fsync policy must be one of: {}".format(", ".join(FSYNC_POLICIES)))
+    return True
+
+
+def validate_storage_backend(value: str):
+    """ Ensure the storage backend exists """
+    # imported here, as the storage backends themselves depend on settings
+    from storage import BACKENDS
+    if value not in BACKENDS:
+        raise ValidationError("storage backend must be one of: {}".format(", ".join(BACKENDS)))
+    return True
+
+
 class _Settings:
     """ A class holding globally significant settings that affect application behavior. Pulls and updates values in
      QStorage automatically, and allows for overridden values to be set at runtime """
@@ -129,13 +199,30 @@ class _Settings:
     def asset_dir(self):
         """ If specified, the directory where art assets (usually images/videos) for the workspace should be saved """
 
+    @setting("workspace/storage_backend", str, "yaml", validate=validate_storage_backend)
+    def storage_backend(self):
+        """ How the workspace is stored: 'yaml' (a file per notebook), 'sharded' (a folder per notebook, with a file
+        per page) or 'sqlite' (a single database). Changed with Tools > Convert Workspace, which copies the current
+        workspace over, leaving the old copy in place """
+
+    @setting("workspace/fsync_policy", str, FSYNC_FILE, validate=validate_fsync_policy)
+    def fsync_policy(self):
+        """ How hard saves try to reach the disk: 'never' (fastest, only protects against crashes), 'file' (sync each
+        file before it replaces the old version) or 'always' (also sync the directory; safest, slowest) """
+
+    @setting("workspace/journal_compaction_kb", int, 256)
+    def journal_compaction_kb(self):
+        """ Autosaves append small edit records to a journal beside each notebook. Once a journal grows past this
+        many kilobytes, the notebook is rewritten in full and the journal starts over """
+
     @setting("application/autosave", bool, True)
     def auto_save(self):
         """ Turn on or off the application auto save functionality"""
 
-    @setting("application/autosave_interval", float, 3)
+    @setting("application/autosave_interval", float, 3, validate=validate_auto_save_interval)
     def auto_save_interval(self):
-        """  """
+        """ The number of seconds after the last change before auto save saves it. While changes keep coming, auto save
+        still saves every so often: more often when saving is quick, less often for large workspaces """
 
     @setting("application/icons/path", str)
     def icon_path(self):
@@ -146,6 +233,32 @@ class _Settings:
     def tab_text_length(self):
         """ The maximum number of characters shown in a section, page, notebook tab before being truncated """
 
+    @setting("application/image_recompress_kb", int, 0)
+    def image_recompress_kb(self):
+        """ Images are saved exactly as they were added. Images bigger than this many kilobytes are recompressed when
+        added instead, if that makes them smaller. 0 never recompresses """
+
+    @setting("application/image_memory_mb", int, 256, validate=validate_image_memory)
+    def image_memory_mb(self):
+        """ How many megabytes decoded images may take up. Images out of view keep only the size they're shown at, and
+        are decoded again when needed once they've been dropped to stay within this """
+
+    @setting("application/thumbnail_cache_mb", int, 128, validate=validate_thumbnail_cache)
+    def thumbnail_cache_mb(self):
+        """ How many megabytes of thumbnails (images at the sizes they're shown at, so pages open without decoding them
+        in full) are kept on disk. The least recently used are removed to stay within this """
+
+    @setting("application/page_backend", str, "widgets", validate=validate_page_backend)
+    def page_backend(self):
+        """ How pages are drawn: 'widgets' (each item is a widget) or 'scene' (items are drawn by a QGraphicsView,
+        which handles pages with many items more smoothly, and zooms with ctrl and the mouse wheel). Pages already open
+        keep the one they were opened with """
+
+    @setting("application/virtual_page_items", int, 200, validate=validate_virtual_page_items)
+    def virtual_page_items(self):
+        """ Pages with more items than this only keep widgets for the items in and near view, so scrolling and memory
+        stay fast however many items a page has. 0 always keeps widgets for every item """
+
     @setting("application/interval_image_resize", float, 0.05)
     def img_resize_interval(self):
         """ The number of seconds (may be a fraction of a second) of respite during resizing for images to re-render """
@@ -162,6 +275,10 @@ class _Settings:
     def window_width(self):
         """ the last width of the application window on close """
 
+    @setting("restore/workspace/last_notebook", str, "")
+    def last_notebook(self):
+        """ the notebook open when the application was last used, which is loaded first on the next run """
+
     @setting("code/font", str, "DejaVu Sans Mono")
     def code_font(self):
         """ The font family to use to display code in code items """
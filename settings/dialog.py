@@ -19,6 +19,9 @@ class SettingsDialog(QtWidgets.QDialog):
             # Skip 'restore' key, as this is just for restoring the previous session and can't be edited
             if key == "restore":
                 continue
+            # switching backends means converting the workspace, which is done from the Tools menu
+            if val.name == "storage_backend":
+                continue
             if key in self._categories:
                 self._categories[key].append(val)
             else:
@@ -0,0 +1,80 @@
+""" Storage backends for the workspace. A store knows how to list, load and save notebooks, and read and write image
+assets, for one workspace. Everything above it (the binder, notebooks, images) only deals in marshalled data.
+
+Every store provides:
+    notebook_ids()                          ids of the notebooks in the workspace, in display order
+    load_notebook(id)                       the marshalled data of a notebook
+    notebook_parser(id)                     a picklable callable that reads a notebook in a worker process, or None
+                                            when loading it directly is already cheap
+    parsed_notebook(id, result)             the marshalled data of a notebook, given what its parser returned. Call on
+                                            the GUI thread, and only for notebooks that haven't been loaded yet
+    read_notebook(id)                       the marshalled data of a notebook as saved, without loading it into the
+                                            store (like for a scan). Safe on any thread
+    notebook_job(id, data, records)         a writer thread job saving data (records are journal.diff records)
+    write_notebook(id, data)                save data immediately, on the calling thread
+    remove_notebook(id)                     delete a notebook
+    rename_notebook(id, new_id)             rename a notebook. Only call while the writer thread is idle
+    asset_names()                           names of every stored asset
+    shared_assets()                         names of assets other layouts' notebooks sharing the asset directory use
+    read_asset(name)                        the bytes of an asset
+    asset_job(name, payload, mimetype)      a writer thread job saving an asset, given as bytes or a QImage, and its
+                                            mimetype (like image/jpeg)
+    remove_asset_job(name)                  a writer thread job deleting an asset
+    write_asset(name, data, mimetype)       save asset bytes immediately, on the calling thread
+
+Job factories must be called on the GUI thread (they read settings); the jobs themselves run on the writer thread. """
+
+from settings.__init__ import settings
+from PySide6 import QtCore, QtGui
+
+BACKEND_YAML = "yaml"
+BACKEND_SQLITE = "sqlite"
+BACKEND_SHARDED = "sharded"
+BACKENDS = (BACKEND_YAML, BACKEND_SQLITE, BACKEND_SHARDED)
+
+_stores = {}
+
+
+def open_store(backend: str):
+    """ the store for the configured workspace using the given backend. Stores are cached, as they hold state (like
+    open journals and database connections) that should live as long as the workspace does """
+    key = (backend, settings.workspace_dir, settings.asset_dir)
+    if key not in _stores:
+        if backend == BACKEND_SQLITE:
+            from storage.sqlite_store import SqliteStore
+            _stores[key] = SqliteStore(settings.workspace_dir)
+        elif backend == BACKEND_YAML:
+            from storage.yaml_store import YamlStore
+            _stores[key] = YamlStore(settings.workspace_dir, settings.asset_dir)
+        elif backend == BACKEND_SHARDED:
+            from storage.sharded_store import ShardedStore
+            _stores[key] = ShardedStore(settings.workspace_dir, settings.asset_dir)
+        else:
+            raise ValueError("unknown storage backend {}".format(backend))
+    return _stores[key]
+
+
+def workspace_store():
+    """ the store for the configured workspace and backend """
+    return open_store(settings.storage_backend)
+
+
+def notebook_key(id: str) -> str:
+    """ the writer thread key for saves of a notebook """
+    return "notebook/{}".format(id)
+
+
+def asset_key(name: str) -> str:
+    """ the writer thread key for saves of an asset """
+    return "asset/{}".format(name)
+
+
+def encode_asset(payload, mimetype: str) -> bytes:
+    """ asset payloads are either the original bytes or a QImage to encode as mimetype (like image/png). Safe off the
+    GUI thread """
+    if isinstance(payload, QtGui.QImage):
+        buffer = QtCore.QBuffer()
+        buffer.open(QtCore.QIODevice.WriteOnly)
+        payload.save(buffer, QtCore.QMimeDatabase().mimeTypeForName(mimetype).preferredSuffix())
+        return bytes(buffer.data())
+    return payload
@@ -0,0 +1,118 @@
+""" checks a workspace's assets against its notebooks: assets no notebook refers to any more (like those of deleted
+notebooks, which are never released on their own), and assets notebooks refer to that are missing or damaged. Notebooks
+are read one at a time as plain data, and assets one at a time, so scanning a large workspace never holds much of it in
+memory at once, or builds a single widget.
+
+Usage: python -m storage.asset_gc <backend> <workspace dir> [asset dir] [--remove] """
+
+import sys
+from functools import partial
+from utilities.log import g_log
+from PySide6.QtCore import QObject, Signal
+from storage import asset_key
+from storage.assets import content_name, is_content_name, referenced_assets
+from utilities.save_worker import g_save_worker
+
+# the writer thread key of scans. There's only ever a need for the latest one
+SCAN_KEY = "assets/scan"
+
+
+class AssetReport:
+    """ what a scan found. Orphans are only reported when every notebook could be read; otherwise an unreadable
+    notebook's assets would look unused. Assets used by another layout's copy of the workspace are never orphans """
+
+    def __init__(self):
+        self.referenced = set()
+        self.shared = set()
+        self.orphaned = []
+        self.missing = []
+        self.damaged = []
+        self.unreadable = []
+
+    @property
+    def clean(self) -> bool:
+        return not (self.orphaned or self.missing or self.damaged or self.unreadable)
+
+    def __str__(self):
+        lines = ["{} assets in use".format(len(self.referenced))]
+        if self.shared:
+            lines.append("{} kept for other storage layouts".format(len(self.shared)))
+        for label, names in (("unused", self.orphaned), ("missing", self.missing), ("damaged", self.damaged),
+                             ("unreadable notebooks", self.unreadable)):
+            if names:
+                lines.append("{} {}: {}".format(len(names), label, ", ".join(names)))
+        return "\n".join(lines)
+
+
+def scan_assets(store, verify=True) -> AssetReport:
+    """ compare the assets in store against what its notebooks refer to. With verify, also read every asset in use
+    and check it against its name; only content named assets can be checked. Run on the writer thread (or with it
+    idle), so notebooks aren't being written while they're read """
+    report = AssetReport()
+    stored = set(store.asset_names())
+    for id in store.notebook_ids():
+        try:
+            report.referenced |= referenced_assets(store.read_notebook(id))
+        except Exception:
+            g_log.exception("couldn't read notebook %s while scanning assets", id)
+            report.unreadable.append(id)
+    if not report.unreadable:
+        report.shared = (store.shared_assets() & stored) - report.referenced
+        report.orphaned = sorted(stored - report.referenced - report.shared)
+    report.missing = sorted(report.referenced - stored)
+    if verify:
+        for name in sorted(report.referenced & stored):
+            if not is_content_name(name):
+                continue
+            try:
+                intact = content_name(store.read_asset(name)) == name
+            except OSError:
+                intact = False
+            if not intact:
+                report.damaged.append(name)
+    return report
+
+
+class AssetCollector(QObject):
+    """ runs scans as writer thread jobs, so they see the workspace as it was saved by every save queued before them,
+    and nothing is written while they read. scanned is emitted on the GUI thread with the AssetReport """
+
+    scanned = Signal(object)
+
+    def scan(self, store, verify=True):
+        """ queue a scan of store. Save anything unsaved first, or it won't be counted """
+        g_save_worker.submit(SCAN_KEY, partial(self._scan, store, verify))
+
+    def _scan(self, store, verify: bool):
+        self.scanned.emit(scan_assets(store, verify))
+
+    @staticmethod
+    def remove_orphans(store, report: AssetReport, in_use=()) -> list:
+        """ queue the removal of the unused assets in report. in_use are names referred to since the scan, by items
+        that haven't been saved yet, which are kept. Call on the GUI thread. Returns the names being removed """
+        removed = [name for name in report.orphaned if name not in in_use]
+        for name in removed:
+            g_save_worker.submit(asset_key(name), store.remove_asset_job(name))
+        return removed
+
+
+g_asset_collector = AssetCollector()
+
+
+if __name__ == "__main__":
+    from storage import open_store, BACKENDS
+    args = [each for each in sys.argv[1:] if each != "--remove"]
+    if len(args) < 2 or args[0] not in BACKENDS:
+        print(__doc__)
+        sys.exit(1)
+    from settings.__init__ import settings
+    settings.override("workspace_dir", args[1])
+    settings.override("asset_dir", args[2] if len(args) > 2 else args[1])
+    cli_store = open_store(args[0])
+    cli_report = scan_assets(cli_store)
+    print(cli_report)
+    if "--remove" in sys.argv:
+        for orphan in AssetCollector.remove_orphans(cli_store, cli_report):
+            print("removing {}".format(orphan))
+        g_save_worker.flush()
+    sys.exit(0 if cli_report.clean else 2)
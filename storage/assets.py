@@ -0,0 +1,119 @@
+""" content addressed assets. An asset is named by the SHA-256 of its bytes, so the same image dropped onto any number
+of pages is only ever stored once, and writing an asset that already exists is skipped outright. With assets shared,
+an asset can only be deleted once no notebook in the workspace refers to it any more, so stores keep track of which
+notebooks refer to which assets and release the ones nothing refers to after each save """
+
+from hashlib import sha256
+from threading import Lock
+from string import hexdigits
+from utilities.atomic_write import atomic_write
+import json
+
+REFERENCES_FILE = "references.fnrefs"
+
+
+def content_name(data: bytes) -> str:
+    """ the name of the asset holding data """
+    return sha256(data).hexdigest()
+
+
+def is_content_name(name: str) -> bool:
+    """ whether name is a content address, rather than the random uuid assets used to be named with """
+    return len(name) == 64 and all(each in hexdigits for each in name)
+
+
+def referenced_assets(data: dict) -> set:
+    """ the names of every asset the items of a notebook's data refer to """
+    names = set()
+    for section in data["sections"].values():
+        for page in section["pages"].values():
+            for item in page["items"].values():
+                name = item["contents"].get("asset_name")
+                if name is not None:
+                    names.add(name)
+    return names
+
+
+class AssetReferences:
+    """ Which notebooks refer to which assets, for stores keeping assets as files in an asset directory. Saved as JSON
+    beside the assets, and shared by every store using that directory (notebooks are keyed by layout and id), so
+    converting between layouts never releases an asset the other layout's copy still uses.
+
+    An asset is only released once every notebook of the saving store is known to the index; notebooks saved before
+    the index existed are added as they're loaded or saved. Until then, unused assets are kept rather than risk
+    deleting one an unindexed notebook uses. """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        # loaded is called on the GUI thread, written on the writer thread
+        self._lock = Lock()
+        try:
+            with open(filename) as f:
+                self._references = {key: set(names) for key, names in json.load(f).items()}
+        except (FileNotFoundError, ValueError):
+            self._references = {}
+        # whether the index has changed since it was last written
+        self._changed = False
+
+    def loaded(self, key: str, data: dict):
+        """ record what a notebook refers to as it was loaded. Written out with the next save """
+        names = referenced_assets(data)
+        with self._lock:
+            if self._references.get(key) != names:
+                self._references[key] = names
+                self._changed = True
+
+    def written(self, key: str, data: dict, keys, fsync_policy: str) -> list:
+        """ record what a notebook refers to once it has been saved as data. keys are the keys of every notebook in
+        the saving store. Returns the assets the notebook no longer refers to that nothing else does either, which the
+        caller should delete """
+        names = referenced_assets(data)
+        with self._lock:
+            previous = self._references.get(key, set())
+            if names != previous:
+                self._references[key] = names
+                self._changed = True
+            released = []
+            dropped = previous - names
+            if dropped and all(each in self._references for each in keys):
+                in_use = set().union(*self._references.values())
+                released = [name for name in dropped if name not in in_use]
+            if self._changed:
+                self._write(fsync_policy)
+        return released
+
+    def removed(self, key: str, fsync_policy: str):
+        """ the notebook was deleted. Its assets are left for a garbage collection to find """
+        with self._lock:
+            if self._references.pop(key, None) is not None:
+                self._write(fsync_policy)
+
+    def renamed(self, key: str, new_key: str, fsync_policy: str):
+        with self._lock:
+            if key in self._references:
+                self._references[new_key] = self._references.pop(key)
+                self._write(fsync_policy)
+
+    def held_elsewhere(self, layout: str) -> set:
+        """ the assets referred to by the notebooks of every layout other than layout, like the copy a conversion
+        leaves behind """
+        prefix = "{}/".format(layout)
+        with self._lock:
+            return set().union(*(names for key, names in self._references.items() if not key.startswith(prefix)))
+
+    def _write(self, fsync_policy: str):
+        with atomic_write(self.filename, "w", fsync_policy) as f:
+            json.dump({key: sorted(names) for key, names in self._references.items()}, f)
+        self._changed = False
+
+
+_references = {}
+_references_lock = Lock()
+
+
+def asset_references(filename: str) -> AssetReferences:
+    """ the shared reference index kept in filename """
+    with _references_lock:
+        if filename not in _references:
+            _references[filename] = AssetReferences(filename)
+        return _references[filename]
@@ -0,0 +1,74 @@
+""" converts a workspace between storage backends, losslessly in both directions.
+
+Usage: python -m storage.convert <from backend> <to backend> <workspace dir> [asset dir] """
+
+import sys
+from functools import partial
+from sqlite3 import Error as DatabaseError
+from PySide6.QtCore import QObject, Signal
+from storage import open_store, BACKENDS
+from utilities.save_worker import g_save_worker
+from utilities.log import g_log
+
+# the writer thread key of conversions
+CONVERT_KEY = "workspace/convert"
+
+
+def convert(source, destination, progress=None):
+    """ copy every notebook and asset in the source store into the destination store, replacing what's there. The
+    source is left untouched. Run on the writer thread (or with it idle). progress, if given, is called with the
+    number of assets and notebooks copied so far and the total after each one """
+    names = source.asset_names()
+    ids = source.notebook_ids()
+    total = len(names) + len(ids)
+    for done, name in enumerate(names, 1):
+        destination.write_asset(name, source.read_asset(name))
+        if progress is not None:
+            progress(done, total)
+    for done, id in enumerate(ids, len(names) + 1):
+        destination.write_notebook(id, source.read_notebook(id))
+        if progress is not None:
+            progress(done, total)
+    for id in destination.notebook_ids():
+        if id not in ids:
+            destination.remove_notebook(id)
+
+
+class WorkspaceConverter(QObject):
+    """ runs conversions as writer thread jobs, so they copy the workspace as it was saved by every save queued before
+    them, and nothing is written while they read. Stores read settings (like the fsync policy) as they write, so
+    settings shouldn't change while a conversion runs.
+
+    progressed is emitted with the number of assets and notebooks copied and the total, and converted with the backend
+    converted to and None, or the error that stopped the conversion. Both are emitted on the GUI thread """
+
+    progressed = Signal(int, int)
+    converted = Signal(str, object)
+
+    def convert(self, source: str, destination: str):
+        """ queue the conversion of the workspace from the source backend to the destination backend. Save anything
+        unsaved first, or it won't be copied """
+        job = partial(self._convert, open_store(source), open_store(destination), destination)
+        g_save_worker.submit(CONVERT_KEY, job)
+
+    def _convert(self, source, destination, backend: str):
+        try:
+            convert(source, destination, self.progressed.emit)
+        except (OSError, ValueError, DatabaseError) as e:
+            g_log.exception("couldn't convert the workspace to %s", backend)
+            self.converted.emit(backend, e)
+            return
+        self.converted.emit(backend, None)
+
+
+g_workspace_converter = WorkspaceConverter()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] not in BACKENDS or sys.argv[2] not in BACKENDS:
+        print(__doc__)
+        sys.exit(1)
+    from settings.__init__ import settings
+    settings.override("workspace_dir", sys.argv[3])
+    settings.override("asset_dir", sys.argv[4] if len(sys.argv) > 4 else sys.argv[3])
+    convert(open_store(sys.argv[1]), open_store(sys.argv[2]))
@@ -0,0 +1,60 @@
+""" parse notebooks in worker processes while the workspace loads. Parsing YAML is pure Python, CPU bound work, so
+threads wouldn't run it any faster; separate processes let a large workspace load on every core at once """
+
+import sys
+from PySide6.QtCore import QObject, Signal
+from multiprocessing import get_context, cpu_count
+from functools import partial
+from importlib import import_module
+from contextlib import contextmanager
+
+# what workers start from in place of the application's main module, which spawned processes otherwise import again:
+# the parsers, and nothing but YAML with them, where main.py would bring in Qt and every widget
+WORKER_MAIN = "utilities.notebook_files"
+
+
+@contextmanager
+def _worker_main():
+    """ processes spawned inside start from WORKER_MAIN. Only the pool's first workers do; one started to replace a
+    worker that died would import the real main module again, which is slower but still works """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = import_module(WORKER_MAIN)
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+class ParallelLoader(QObject):
+    """ Runs the notebook parsers of a store in a pool of worker processes. Each result is delivered to the GUI thread
+    through the parsed signal as it arrives, with the notebook's id and the parser's return value (to pass to the
+    store's parsed_notebook), or None if the parser failed. """
+
+    parsed = Signal(str, object)
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self._pool = None
+
+    def start(self, parsers: dict):
+        """ parse each notebook in parsers, a dict of notebook id to the store's notebook_parser for it """
+        if len(parsers) == 0:
+            return
+        # fork isn't safe from a process already running Qt and the writer thread, so always start fresh interpreters
+        with _worker_main():
+            self._pool = get_context("spawn").Pool(min(len(parsers), cpu_count()))
+        for id, parser in parsers.items():
+            self._pool.apply_async(
+                parser, callback=partial(self._done, id), error_callback=partial(self._failed, id)
+            )
+        # let the workers exit once the last notebook is parsed
+        self._pool.close()
+
+    def _done(self, id: str, result):
+        """ runs on the pool's result thread. Emitting queues the result onto the GUI thread """
+        self.parsed.emit(id, result)
+
+    def _failed(self, id: str, error: BaseException):
+        # the notebook will be loaded (and the error reported) normally when it's opened
+        self.parsed.emit(id, None)
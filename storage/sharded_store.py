@@ -0,0 +1,126 @@
+""" A YAML workspace split into a file per page: each notebook is a notebook-<id>.fnshards folder, holding a small
+manifest of its sections and pages (in order) and a page-<uid>.fnpage file per page. Saving only rewrites the pages
+that changed, and renaming a section or page only rewrites the manifest. Assets are stored as in the YAML layout """
+
+from os import path, listdir, rename, remove, makedirs
+from shutil import rmtree
+from functools import partial
+from uuid import uuid4
+from settings.__init__ import settings
+from utilities.notebook_files import MANIFEST_FILE, PAGE_PREFIX, PAGE_EXTENSION, page_file, read_yaml, write_yaml
+from utilities.notebook_files import parse_sharded_notebook
+from storage.yaml_store import YamlStore, NOTEBOOK_PREFIX
+from storage import BACKEND_SHARDED
+
+NOTEBOOK_DIR_EXTENSION = ".fnshards"
+
+
+def _layout(data: dict):
+    """ split notebook data into the manifest and the pages (by uid) it's stored as """
+    manifest = {"sections": {}}
+    pages = {}
+    for section_id, section in data["sections"].items():
+        manifest["sections"][section_id] = {"pages": {}}
+        for page_id, page in section["pages"].items():
+            # only data that didn't come from a Page (like a conversion from another layout) can lack a uid
+            uid = page.get("uid") or uuid4().hex
+            manifest["sections"][section_id]["pages"][page_id] = uid
+            pages[uid] = page
+    return manifest, pages
+
+
+class ShardedStore(YamlStore):
+
+    layout = BACKEND_SHARDED
+
+    def __init__(self, workspace_dir: str, asset_dir: str):
+        super().__init__(workspace_dir, asset_dir)
+        # what each notebook's files on disk hold, by notebook id: its manifest, and its pages by uid. Saves compare
+        # against these to skip what hasn't changed
+        self._manifests = {}
+        self._pages = {}
+
+    def notebook_dir(self, id: str) -> str:
+        return path.join(self.workspace_dir, "{}{}{}".format(NOTEBOOK_PREFIX, id, NOTEBOOK_DIR_EXTENSION))
+
+    def notebook_ids(self) -> list:
+        return sorted(
+            each[len(NOTEBOOK_PREFIX):-len(NOTEBOOK_DIR_EXTENSION)] for each in listdir(self.workspace_dir)
+            if each.startswith(NOTEBOOK_PREFIX) and each.endswith(NOTEBOOK_DIR_EXTENSION)
+        )
+
+    def load_notebook(self, id: str) -> dict:
+        return self.parsed_notebook(id, parse_sharded_notebook(self.notebook_dir(id), id))
+
+    def notebook_parser(self, id: str):
+        return partial(parse_sharded_notebook, self.notebook_dir(id), id)
+
+    def read_notebook(self, id: str) -> dict:
+        return parse_sharded_notebook(self.notebook_dir(id), id)
+
+    def parsed_notebook(self, id: str, result) -> dict:
+        self._manifests[id], self._pages[id] = _layout(result)
+        self._references.loaded(self._reference_key(id), result)
+        return result
+
+    def load_page(self, notebook: str, section: str, page: str):
+        """ the marshalled data of a single page, or None if it doesn't exist """
+        directory = self.notebook_dir(notebook)
+        try:
+            uid = read_yaml(path.join(directory, MANIFEST_FILE))["sections"][section]["pages"][page]
+        except (FileNotFoundError, KeyError):
+            return None
+        data = read_yaml(page_file(directory, uid))
+        data["uid"] = uid
+        return data
+
+    def notebook_job(self, id: str, data: dict, records):
+        # every save compares against what's on disk, so the latest job is all that needs writing
+        return partial(self._write_notebook, id, data, settings.fsync_policy)
+
+    def write_notebook(self, id: str, data: dict):
+        self._write_notebook(id, data, settings.fsync_policy)
+
+    def _write_notebook(self, id: str, data: dict, fsync_policy: str):
+        """ write the pages that changed since the last save, then the manifest if it changed, then remove pages that
+        are gone. Until the manifest is replaced, it only refers to pages that still exist """
+        directory = self.notebook_dir(id)
+        makedirs(directory, exist_ok=True)
+        manifest, pages = _layout(data)
+        if id in self._pages:
+            saved = self._pages[id]
+        else:
+            # nothing is known about what's there, so rewrite every page and clear out any others
+            saved = {each[len(PAGE_PREFIX):-len(PAGE_EXTENSION)]: None for each in listdir(directory)
+                     if each.startswith(PAGE_PREFIX) and each.endswith(PAGE_EXTENSION)}
+        for uid, page in pages.items():
+            previous = saved.get(uid)
+            # pages that haven't changed are marshalled to the very same dict, so most are skipped by identity
+            if previous is not page and previous != page:
+                write_yaml(page_file(directory, uid), {key: value for key, value in page.items() if key != "uid"},
+                       fsync_policy)
+        if manifest != self._manifests.get(id):
+            write_yaml(path.join(directory, MANIFEST_FILE), manifest, fsync_policy)
+        for uid in saved:
+            if uid not in pages:
+                try:
+                    remove(page_file(directory, uid))
+                except FileNotFoundError:
+                    """ Do nothing """
+        self._manifests[id] = manifest
+        self._pages[id] = pages
+        self._notebook_written(id, data, fsync_policy)
+
+    def remove_notebook(self, id: str):
+        rmtree(self.notebook_dir(id), ignore_errors=True)
+        self._manifests.pop(id, None)
+        self._pages.pop(id, None)
+        self._references.removed(self._reference_key(id), settings.fsync_policy)
+
+    def rename_notebook(self, id: str, new_id: str):
+        # the id is the folder name, so nothing inside needs rewriting
+        rename(self.notebook_dir(id), self.notebook_dir(new_id))
+        for each in (self._manifests, self._pages):
+            if id in each:
+                each[new_id] = each.pop(id)
+        self._references.renamed(self._reference_key(id), self._reference_key(new_id), settings.fsync_policy)
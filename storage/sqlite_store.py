@@ -0,0 +1,340 @@
+""" A workspace kept in a single SQLite database, in WAL mode, with a row per notebook, section, page, item and asset.
+Unlike the YAML layout, a single page can be loaded, a single item saved, and the whole workspace queried, without
+reading anything else """
+
+import sqlite3
+import json
+from os import path
+from functools import partial
+from threading import local
+from settings.__init__ import settings
+from utilities.atomic_write import FSYNC_NEVER, FSYNC_FILE, FSYNC_ALWAYS
+from storage import encode_asset
+from storage.assets import referenced_assets
+
+DATABASE_FILE = "workspace.fndb"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notebooks (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sections (
+    notebook TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (notebook, id)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    notebook TEXT NOT NULL,
+    section TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    PRIMARY KEY (notebook, section, id)
+);
+CREATE TABLE IF NOT EXISTS items (
+    notebook TEXT NOT NULL,
+    section TEXT NOT NULL,
+    page TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    value TEXT,
+    -- everything in the item's contents other than type and value, as JSON
+    contents TEXT NOT NULL,
+    PRIMARY KEY (notebook, section, page, id)
+);
+CREATE INDEX IF NOT EXISTS items_by_page ON items (notebook, section, page, position);
+CREATE TABLE IF NOT EXISTS assets (
+    name TEXT PRIMARY KEY,
+    mimetype TEXT,
+    data BLOB NOT NULL
+);
+"""
+
+# how each fsync policy maps onto SQLite's own durability setting. In WAL mode, NORMAL can lose the last transactions
+# on power loss but never corrupts the database, which matches the "file" policy's guarantees closely enough
+_SYNCHRONOUS = {FSYNC_NEVER: "OFF", FSYNC_FILE: "NORMAL", FSYNC_ALWAYS: "FULL"}
+
+
+def _item_row(item: dict) -> tuple:
+    """ the columns (from x on) storing a marshalled item """
+    contents = dict(item["contents"])
+    type_ = contents.pop("type")
+    value = contents.pop("value", None)
+    return tuple(item["geometry"]) + (type_, value, json.dumps(contents))
+
+
+def _item_data(row) -> dict:
+    """ the marshalled item stored in row, which starts from the x column """
+    x, y, width, height, type_, value, contents = row
+    data = {"type": type_}
+    if value is not None:
+        data["value"] = value
+    data.update(json.loads(contents))
+    return {"geometry": (x, y, width, height), "contents": data}
+
+
+class SqliteStore:
+
+    def __init__(self, workspace_dir: str):
+        self.filename = path.join(workspace_dir, DATABASE_FILE)
+        # connections can't be shared between threads, and the GUI and writer threads both use the store
+        self._local = local()
+        # notebooks whose rows fell behind their saves when a write failed. Records only describe changes since the
+        # previous save, so these are written in full next time. Only touched on the writer thread
+        self._stale = set()
+        with self._connection() as db:
+            db.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.filename)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def _writer(self, fsync_policy: str) -> sqlite3.Connection:
+        db = self._connection()
+        db.execute("PRAGMA synchronous={}".format(_SYNCHRONOUS[fsync_policy]))
+        return db
+
+    def notebook_ids(self) -> list:
+        return [row[0] for row in self._connection().execute("SELECT id FROM notebooks ORDER BY position")]
+
+    def load_notebook(self, id: str) -> dict:
+        db = self._connection()
+        data = {"id": id, "sections": {}}
+        for (section,) in db.execute("SELECT id FROM sections WHERE notebook = ? ORDER BY position", (id,)):
+            data["sections"][section] = {"pages": {}}
+        for section, page, width, height in db.execute(
+                "SELECT section, id, width, height FROM pages WHERE notebook = ? ORDER BY position", (id,)):
+            data["sections"][section]["pages"][page] = {"items": {}, "geometry": (width, height)}
+        for row in db.execute("SELECT section, page, id, x, y, width, height, type, value, contents FROM items "
+                              "WHERE notebook = ? ORDER BY position", (id,)):
+            data["sections"][row[0]]["pages"][row[1]]["items"][row[2]] = _item_data(row[3:])
+        return data
+
+    def notebook_parser(self, id: str):
+        # a few indexed queries. Not worth starting a process for
+        return None
+
+    def parsed_notebook(self, id: str, result) -> dict:
+        return result
+
+    def read_notebook(self, id: str) -> dict:
+        # loading touches nothing but the calling thread's connection
+        return self.load_notebook(id)
+
+    def load_page(self, notebook: str, section: str, page: str):
+        """ the marshalled data of a single page, or None if it doesn't exist """
+        db = self._connection()
+        row = db.execute("SELECT width, height FROM pages WHERE notebook = ? AND section = ? AND id = ?",
+                         (notebook, section, page)).fetchone()
+        if row is None:
+            return None
+        data = {"items": {}, "geometry": tuple(row)}
+        for row in db.execute("SELECT id, x, y, width, height, type, value, contents FROM items WHERE notebook = ? "
+                              "AND section = ? AND page = ? ORDER BY position", (notebook, section, page)):
+            data["items"][row[0]] = _item_data(row[1:])
+        return data
+
+    def find_items(self, text: str) -> list:
+        """ (notebook, section, page, item) for every item in the workspace whose text contains text """
+        return self._connection().execute(
+            "SELECT notebook, section, page, id FROM items WHERE value LIKE ? ESCAPE '\\'",
+            ("%{}%".format(text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")),)
+        ).fetchall()
+
+    def notebook_job(self, id: str, data: dict, records):
+        return SqliteWrite(self, id, data, records, settings.fsync_policy)
+
+    def write_notebook(self, id: str, data: dict):
+        self._write_notebook(id, data, settings.fsync_policy)
+
+    def _write_notebook(self, id: str, data: dict, fsync_policy: str):
+        db = self._writer(fsync_policy)
+        with db:
+            used = self._notebook_assets(db, id)
+            self._replace_notebook(db, id, data)
+            self._release_assets(db, used - referenced_assets(data))
+        self._stale.discard(id)
+
+    @staticmethod
+    def _notebook_assets(db: sqlite3.Connection, id: str) -> set:
+        """ the assets a stored notebook's items refer to """
+        return {
+            json.loads(row[0]).get("asset_name")
+            for row in db.execute("SELECT contents FROM items WHERE notebook = ? AND type = 'image'", (id,))
+        }
+
+    @staticmethod
+    def _release_assets(db: sqlite3.Connection, names: set):
+        """ delete the assets in names that no item in the workspace refers to any more. Assets are shared between
+        every item showing the same image, so a notebook no longer using one doesn't mean nothing does """
+        names.discard(None)
+        if len(names) == 0:
+            return
+        in_use = {json.loads(row[0]).get("asset_name") for row in db.execute(
+            "SELECT contents FROM items WHERE type = 'image'")}
+        db.executemany("DELETE FROM assets WHERE name = ?", ((name,) for name in names if name not in in_use))
+
+    def _replace_notebook(self, db: sqlite3.Connection, id: str, data: dict):
+        row = db.execute("SELECT position FROM notebooks WHERE id = ?", (id,)).fetchone()
+        if row is None:
+            row = db.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM notebooks").fetchone()
+        self._delete_notebook(db, id)
+        db.execute("INSERT INTO notebooks (id, position) VALUES (?, ?)", (id, row[0]))
+        page_position = 0
+        for section_position, (section, section_data) in enumerate(data["sections"].items()):
+            db.execute("INSERT INTO sections (notebook, id, position) VALUES (?, ?, ?)",
+                       (id, section, section_position))
+            for page, page_data in section_data["pages"].items():
+                db.execute("INSERT INTO pages (notebook, section, id, position, width, height) "
+                           "VALUES (?, ?, ?, ?, ?, ?)", (id, section, page, page_position) + tuple(page_data["geometry"]))
+                page_position += 1
+                db.executemany(
+                    "INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((id, section, page, item, position) + _item_row(item_data)
+                     for position, (item, item_data) in enumerate(page_data["items"].items()))
+                )
+
+    @staticmethod
+    def _delete_notebook(db: sqlite3.Connection, id: str):
+        for table, column in (("notebooks", "id"), ("sections", "notebook"), ("pages", "notebook"),
+                              ("items", "notebook")):
+            db.execute("DELETE FROM {} WHERE {} = ?".format(table, column), (id,))
+
+    def apply_records(self, id: str, records: list, fsync_policy: str):
+        """ apply journal records to the stored notebook, touching only the rows they name """
+        db = self._writer(fsync_policy)
+        with db:
+            # only deleting or replacing an item can stop an asset being used
+            releasing = any(record["op"] in ("delete", "edit") for record in records)
+            used = self._notebook_assets(db, id) if releasing else set()
+            for record in records:
+                self._apply(db, id, record)
+            if releasing:
+                self._release_assets(db, used - self._notebook_assets(db, id))
+
+    @staticmethod
+    def _apply(db: sqlite3.Connection, id: str, record: dict):
+        op = record["op"]
+        page = (id, record["section"], record["page"])
+        where = "notebook = ? AND section = ? AND page = ?"
+        if op == "page":
+            db.execute("UPDATE pages SET width = ?, height = ? WHERE notebook = ? AND section = ? AND id = ?",
+                       tuple(record["geometry"]) + page)
+        elif op == "add":
+            position = db.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM items WHERE " + where, page).fetchone()
+            db.execute("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       page + (record["item"], position[0]) + _item_row(record["data"]))
+        elif op in ("move", "resize"):
+            db.execute("UPDATE items SET x = ?, y = ?, width = ?, height = ? WHERE " + where + " AND id = ?",
+                       tuple(record["geometry"]) + page + (record["item"],))
+        elif op == "edit":
+            _, _, _, _, type_, value, contents = _item_row({"geometry": (0, 0, 0, 0), "contents": record["contents"]})
+            db.execute("UPDATE items SET type = ?, value = ?, contents = ? WHERE " + where + " AND id = ?",
+                       (type_, value, contents) + page + (record["item"],))
+        elif op == "delete":
+            db.execute("DELETE FROM items WHERE " + where + " AND id = ?", page + (record["item"],))
+        elif op == "rename":
+            db.execute("UPDATE items SET id = ? WHERE " + where + " AND id = ?",
+                       (record["to"],) + page + (record["item"],))
+        elif op == "order":
+            db.executemany("UPDATE items SET position = ? WHERE " + where + " AND id = ?",
+                           ((position,) + page + (item,) for position, item in enumerate(record["items"])))
+
+    def remove_notebook(self, id: str):
+        db = self._writer(settings.fsync_policy)
+        with db:
+            self._delete_notebook(db, id)
+        self._stale.discard(id)
+
+    def rename_notebook(self, id: str, new_id: str):
+        db = self._writer(settings.fsync_policy)
+        with db:
+            for table, column in (("notebooks", "id"), ("sections", "notebook"), ("pages", "notebook"),
+                                  ("items", "notebook")):
+                db.execute("UPDATE {} SET {} = ? WHERE {} = ?".format(table, column, column), (new_id, id))
+        if id in self._stale:
+            self._stale.remove(id)
+            self._stale.add(new_id)
+
+    def shared_assets(self) -> set:
+        # assets live in the database, so no other layout's notebooks can be using them
+        return set()
+
+    def asset_names(self) -> list:
+        return [row[0] for row in self._connection().execute("SELECT name FROM assets")]
+
+    def read_asset(self, name: str) -> bytes:
+        row = self._connection().execute("SELECT data FROM assets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise FileNotFoundError("asset {} is not in {}".format(name, self.filename))
+        return bytes(row[0])
+
+    def asset_job(self, name: str, payload, mimetype: str):
+        return partial(self._write_asset_payload, name, payload, mimetype, settings.fsync_policy)
+
+    def _write_asset_payload(self, name: str, payload, mimetype: str, fsync_policy: str):
+        """ runs on the writer thread. Assets are named by their contents, so one that exists already is identical """
+        db = self._writer(fsync_policy)
+        if db.execute("SELECT 1 FROM assets WHERE name = ?", (name,)).fetchone() is not None:
+            return
+        with db:
+            db.execute("INSERT INTO assets (name, mimetype, data) VALUES (?, ?, ?)",
+                       (name, mimetype, encode_asset(payload, mimetype)))
+
+    def write_asset(self, name: str, data: bytes, mimetype=None):
+        db = self._writer(settings.fsync_policy)
+        with db:
+            db.execute("INSERT OR REPLACE INTO assets (name, mimetype, data) VALUES (?, ?, ?)", (name, mimetype, data))
+
+    def remove_asset_job(self, name: str):
+        return partial(self._remove_asset, name, settings.fsync_policy)
+
+    def _remove_asset(self, name: str, fsync_policy: str):
+        """ runs on the writer thread """
+        db = self._writer(fsync_policy)
+        with db:
+            db.execute("DELETE FROM assets WHERE name = ?", (name,))
+
+
+class SqliteWrite:
+    """ a save job for the writer thread. Item level changes update just their rows; anything structural rewrites the
+    notebook's rows in one transaction. Like journal writes, waiting jobs coalesce instead of being dropped """
+
+    def __init__(self, store: SqliteStore, id: str, data: dict, records, fsync_policy: str):
+        self.store = store
+        self.id = id
+        self.data = data
+        self.records = records
+        self.fsync_policy = fsync_policy
+
+    def coalesce(self, previous):
+        if self.records is not None and previous.records is not None:
+            self.records = previous.records + self.records
+        else:
+            self.records = None
+        return self
+
+    def __call__(self):
+        if self.records is None or self.id in self.store._stale:
+            self.store._write_notebook(self.id, self.data, self.fsync_policy)
+            return
+        if len(self.records) == 0:
+            return
+        try:
+            self.store.apply_records(self.id, self.records, self.fsync_policy)
+        except Exception:
+            # the transaction rolled back, and later jobs will only carry the changes after these
+            self.store._stale.add(self.id)
+            raise
@@ -0,0 +1,133 @@
+""" The original workspace layout: a folder of notebook-<id>.fnbook YAML files (each with its edit journal) and a
+folder of <asset name>.fna asset files """
+
+from os import path, listdir, rename, remove
+from functools import partial
+from settings.__init__ import settings
+from utilities.atomic_write import atomic_write
+from utilities.journal import NotebookJournal, JournalWrite, journal_file
+from utilities.notebook_files import write_snapshot, parse_notebook
+from storage import encode_asset, BACKEND_YAML
+from storage.assets import asset_references, REFERENCES_FILE
+
+NOTEBOOK_PREFIX = "notebook-"
+NOTEBOOK_EXTENSION = ".fnbook"
+ASSET_EXTENSION = ".fna"
+
+class YamlStore:
+
+    # how this layout's notebooks are told apart from other layouts' in the asset reference index
+    layout = BACKEND_YAML
+
+    def __init__(self, workspace_dir: str, asset_dir: str):
+        self.workspace_dir = workspace_dir
+        self.asset_dir = asset_dir
+        # journals of notebooks loaded or saved through this store, by notebook id
+        self._journals = {}
+        self._references = asset_references(path.join(asset_dir, REFERENCES_FILE))
+
+    def _reference_key(self, id: str) -> str:
+        return "{}/{}".format(self.layout, id)
+
+    def _notebook_written(self, id: str, data: dict, fsync_policy: str):
+        """ runs on the writer thread once a notebook is safely saved. Deletes the assets it stopped using, unless
+        another notebook still uses them """
+        keys = [self._reference_key(each) for each in self.notebook_ids()]
+        for name in self._references.written(self._reference_key(id), data, keys, fsync_policy):
+            self._remove_asset(self.asset_file(name))
+
+    def shared_assets(self) -> set:
+        return self._references.held_elsewhere(self.layout)
+
+    def notebook_file(self, id: str) -> str:
+        return path.join(self.workspace_dir, "{}{}{}".format(NOTEBOOK_PREFIX, id, NOTEBOOK_EXTENSION))
+
+    def asset_file(self, name: str) -> str:
+        return path.join(self.asset_dir, "{}{}".format(name, ASSET_EXTENSION))
+
+    def _journal(self, id: str) -> NotebookJournal:
+        if id not in self._journals:
+            # we don't know what generation is on disk, so the first save will be a full one
+            self._journals[id] = NotebookJournal(self.notebook_file(id), write_snapshot)
+        return self._journals[id]
+
+    def notebook_ids(self) -> list:
+        return sorted(
+            each[len(NOTEBOOK_PREFIX):-len(NOTEBOOK_EXTENSION)] for each in listdir(self.workspace_dir)
+            if each.startswith(NOTEBOOK_PREFIX) and each.endswith(NOTEBOOK_EXTENSION)
+        )
+
+    def load_notebook(self, id: str) -> dict:
+        return self.parsed_notebook(id, parse_notebook(self.notebook_file(id)))
+
+    def notebook_parser(self, id: str):
+        return partial(parse_notebook, self.notebook_file(id))
+
+    def read_notebook(self, id: str) -> dict:
+        return parse_notebook(self.notebook_file(id))[0]
+
+    def parsed_notebook(self, id: str, result) -> dict:
+        data, self._journals[id] = result
+        self._references.loaded(self._reference_key(id), data)
+        return data
+
+    def notebook_job(self, id: str, data: dict, records):
+        fsync_policy = settings.fsync_policy
+        return JournalWrite(self._journal(id), data, records, fsync_policy, settings.journal_compaction_kb * 1024,
+                            partial(self._notebook_written, id, fsync_policy=fsync_policy))
+
+    def write_notebook(self, id: str, data: dict):
+        self._journal(id).compact(data, settings.fsync_policy)
+        self._notebook_written(id, data, settings.fsync_policy)
+
+    def remove_notebook(self, id: str):
+        for each in (self.notebook_file(id), journal_file(self.notebook_file(id))):
+            try:
+                remove(each)
+            except FileNotFoundError:
+                """ Do nothing """
+        self._journals.pop(id, None)
+        self._references.removed(self._reference_key(id), settings.fsync_policy)
+
+    def rename_notebook(self, id: str, new_id: str):
+        filename = self.notebook_file(new_id)
+        rename(self.notebook_file(id), filename)
+        journal = self._journal(id)
+        journal.rename(filename)
+        del self._journals[id]
+        self._journals[new_id] = journal
+        self._references.renamed(self._reference_key(id), self._reference_key(new_id), settings.fsync_policy)
+
+    def asset_names(self) -> list:
+        return [each[:-len(ASSET_EXTENSION)] for each in listdir(self.asset_dir) if each.endswith(ASSET_EXTENSION)]
+
+    def read_asset(self, name: str) -> bytes:
+        with open(self.asset_file(name), "rb") as f:
+            return f.read()
+
+    def asset_job(self, name: str, payload, mimetype: str):
+        return partial(self._write_asset_payload, self.asset_file(name), payload, mimetype, settings.fsync_policy)
+
+    def remove_asset_job(self, name: str):
+        return partial(self._remove_asset, self.asset_file(name))
+
+    def write_asset(self, name: str, data: bytes, mimetype=None):
+        with atomic_write(self.asset_file(name), "wb", settings.fsync_policy) as f:
+            f.write(data)
+
+    @staticmethod
+    def _write_asset_payload(filename: str, payload, mimetype: str, fsync_policy: str):
+        """ runs on the writer thread. Assets are named by their contents, so one that exists already is identical.
+        Written atomically, as a truncated asset would otherwise never be rewritten """
+        if path.exists(filename):
+            return
+        with atomic_write(filename, "wb", fsync_policy) as f:
+            f.write(encode_asset(payload, mimetype))
+
+    @staticmethod
+    def _remove_asset(filename: str):
+        """ runs on the writer thread """
+        try:
+            remove(filename)
+        except FileNotFoundError:
+            """ Do nothing """
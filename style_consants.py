@@ -9,6 +9,8 @@ PAGE_BG = "#ffe"
 
 ITEM_BORDER_COLOR = "#bbe"
 
+SELECTION_BORDER_COLOR = "#66c"
+
 PAGE_ITEM_MENU_BG = "#eef"
 
 IMAGE_ITEM_TOOLBAR_BG = "rgba(255, 255, 239, 64)"
@@ -0,0 +1,27 @@
+""" what tests of widgets share: an offscreen application, and a fresh workspace for each test """
+
+import os
+import tempfile
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import QCoreApplication
+from PySide6.QtWidgets import QApplication
+
+g_app = QApplication.instance() or QApplication([])
+# so tests never touch the settings of a real installation
+QCoreApplication.setOrganizationName("freenote-tests")
+
+from settings.__init__ import settings
+
+
+def workspace() -> tempfile.TemporaryDirectory:
+    """ a temporary workspace directory, made the configured one """
+    directory = tempfile.TemporaryDirectory()
+    settings.override("workspace_dir", directory.name)
+    settings.override("asset_dir", directory.name)
+    return directory
+
+
+def process_events():
+    g_app.processEvents()
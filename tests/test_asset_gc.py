@@ -0,0 +1,49 @@
+""" the asset scan must not offer to remove assets that another layout's copy of the workspace still uses """
+
+import tempfile
+import unittest
+from storage.asset_gc import scan_assets
+from storage.convert import convert
+from storage.sharded_store import ShardedStore
+from storage.yaml_store import YamlStore
+
+IMAGE = "a" * 64
+
+
+def notebook(*assets) -> dict:
+    return {"id": "nb", "sections": {"s": {"pages": {"p": {
+        "geometry": (800, 600),
+        "items": {name: {"geometry": (0, 0, 10, 10), "contents": {"type": "image", "asset_name": name}}
+                  for name in assets},
+    }}}}}
+
+
+class SharedAssetsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.yaml = YamlStore(self.dir.name, self.dir.name)
+        self.sharded = ShardedStore(self.dir.name, self.dir.name)
+        self.yaml.write_asset(IMAGE, b"image")
+        self.yaml.write_notebook("nb", notebook(IMAGE))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_converted_copy_keeps_its_assets(self):
+        convert(self.yaml, self.sharded)
+        # the converted copy stops using the image, which the original still does
+        self.sharded.write_notebook("nb", notebook())
+        report = scan_assets(self.sharded)
+        self.assertEqual(report.orphaned, [])
+        self.assertEqual(report.shared, {IMAGE})
+        self.assertEqual(scan_assets(self.yaml).orphaned, [])
+
+    def test_unused_by_every_layout(self):
+        convert(self.yaml, self.sharded)
+        self.sharded.write_asset("b" * 64, b"stray")
+        self.assertEqual(scan_assets(self.sharded).orphaned, ["b" * 64])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+""" edits made right after a workspace is loaded are saved, even when the window closes before autosave fires """
+
+import unittest
+from PySide6.QtCore import QRect
+from tests.gui import workspace, process_events
+from binder import Binder
+from main import MainWindow
+from page_item import PageItem
+from storage import workspace_store
+from utilities.save_worker import g_save_worker
+
+
+class SaveAfterLoadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = workspace()
+        binder = Binder()
+        binder.load_workspace()
+        page = self._page(binder)
+        page._add_item(PageItem("Text Box", QRect(10, 10, 200, 100)))
+        binder.save()
+        g_save_worker.flush()
+        binder.deleteLater()
+        process_events()
+
+    def tearDown(self):
+        g_save_worker.flush()
+        self.dir.cleanup()
+
+    @staticmethod
+    def _page(binder: Binder):
+        notebook = binder.notebooks[0]
+        notebook._check_handle_new_section(0)
+        section = notebook.sections[0]
+        section._check_handle_new_section(0)
+        return section.pages[0]
+
+    def _saved_geometry(self):
+        data = workspace_store().read_notebook(workspace_store().notebook_ids()[0])
+        section = next(iter(data["sections"].values()))
+        page = next(iter(section["pages"].values()))
+        return tuple(page["items"]["Text Box"]["geometry"])
+
+    def test_edit_then_close(self):
+        window = MainWindow()
+        window.show()
+        process_events()
+        item = next(iter(self._page(window._content.binder).items))
+        item.setGeometry(QRect(50, 60, 200, 100))
+        window.close()
+        self.assertEqual(self._saved_geometry(), (50, 60, 200, 100))
+
+    def test_loading_writes_nothing(self):
+        binder = Binder()
+        binder.load_workspace()
+        process_events()
+        self.assertFalse(binder.dirty)
+        binder.deleteLater()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+""" converting the workspace between backends happens on the writer thread, reporting its progress, and only when asked
+for; validating the setting never touches the workspace """
+
+import unittest
+from tests.gui import workspace, process_events
+from settings.__init__ import settings
+from storage import open_store, BACKEND_YAML, BACKEND_SQLITE
+from storage.convert import g_workspace_converter
+from utilities.save_worker import g_save_worker
+
+NOTEBOOK = {"id": "nb", "sections": {"s": {"pages": {"p": {"geometry": (800, 600), "items": {}}}}}}
+
+
+class ConvertTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = workspace()
+        open_store(BACKEND_YAML).write_asset("image", b"image")
+        open_store(BACKEND_YAML).write_notebook("nb", NOTEBOOK)
+        self.progress = []
+        self.results = []
+        g_workspace_converter.progressed.connect(self._progressed)
+        g_workspace_converter.converted.connect(self._converted)
+
+    def tearDown(self):
+        g_workspace_converter.progressed.disconnect(self._progressed)
+        g_workspace_converter.converted.disconnect(self._converted)
+        self.dir.cleanup()
+
+    def _progressed(self, done: int, total: int):
+        self.progress.append((done, total))
+
+    def _converted(self, backend: str, error):
+        self.results.append((backend, error))
+
+    def test_convert(self):
+        g_workspace_converter.convert(BACKEND_YAML, BACKEND_SQLITE)
+        g_save_worker.flush()
+        process_events()
+        self.assertEqual(self.results, [(BACKEND_SQLITE, None)])
+        self.assertEqual(self.progress, [(1, 2), (2, 2)])
+        store = open_store(BACKEND_SQLITE)
+        self.assertEqual(store.notebook_ids(), ["nb"])
+        self.assertEqual(store.read_asset("image"), b"image")
+
+    def test_validating_converts_nothing(self):
+        self.assertTrue(settings["storage_backend"].validate(BACKEND_SQLITE))
+        self.assertEqual(open_store(BACKEND_SQLITE).notebook_ids(), [])
@@ -0,0 +1,57 @@
+""" a debouncer kept busy still fires by its max wait """
+
+import unittest
+from unittest import mock
+from utilities.debounce import Debouncer
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class MaxWaitTest(unittest.TestCase):
+    """ time is faked, and the scheduler's part played by calling the debouncer's scheduled call once it's due """
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch("utilities.debounce.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fired = []
+
+    def _restart_continuously(self, debouncer: Debouncer, seconds: float, every=1 / 64):
+        # times are multiples of a power of two, so they add up exactly
+        start = self.clock.now
+        debouncer.action = lambda: self.fired.append(self.clock.now - start)
+        for _ in range(round(seconds / every)):
+            debouncer.start()
+            self.clock.now += every
+            while debouncer._call is not None and self.clock.now >= debouncer._call.deadline:
+                debouncer._expire()
+        debouncer.stop()
+
+    def test_fires_by_max_wait(self):
+        self._restart_continuously(Debouncer(timeout=0.125, max_wait=0.5), 1.75)
+        self.assertEqual(self.fired, [0.5, 1.0, 1.5])
+
+    def test_without_max_wait_never_fires_while_busy(self):
+        self._restart_continuously(Debouncer(timeout=0.125), 1.75)
+        self.assertEqual(self.fired, [])
+
+    def test_fires_after_a_pause(self):
+        debouncer = Debouncer(timeout=0.05, max_wait=0.2)
+        debouncer.action = lambda: self.fired.append(self.clock.now)
+        debouncer.start()
+        self.clock.now += 0.05
+        debouncer._expire()
+        self.assertEqual(len(self.fired), 1)
+        self.assertIsNone(debouncer._call)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+""" a frame throttle only passes on the latest value posted each frame """
+
+import unittest
+from time import monotonic, sleep
+from tests.gui import process_events
+from utilities.debounce import FrameThrottle
+
+
+class FrameThrottleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.throttle = FrameThrottle()
+        self.values = []
+        self.throttle.action = self.values.append
+
+    def _wait_frames(self, frames=3):
+        deadline = monotonic() + frames * FrameThrottle.frame_interval()
+        while monotonic() < deadline:
+            process_events()
+            sleep(0.002)
+        process_events()
+
+    def test_coalesces_to_the_latest(self):
+        for value in range(10):
+            self.throttle.post(value)
+        self.assertEqual(self.values, [])
+        self._wait_frames()
+        self.assertEqual(self.values, [9])
+
+    def test_one_call_per_frame(self):
+        self.throttle.post(1)
+        self._wait_frames()
+        self.throttle.post(2)
+        self.throttle.post(3)
+        self._wait_frames()
+        self.assertEqual(self.values, [1, 3])
+
+    def test_flush(self):
+        self.throttle.post(1)
+        self.throttle.post(2)
+        self.throttle.flush()
+        self.assertEqual(self.values, [2])
+        # the frame's call was cancelled, and there's nothing left to pass on
+        self._wait_frames()
+        self.throttle.flush()
+        self.assertEqual(self.values, [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+""" the thumbnail cache on disk stays within its budget, removing the least recently used thumbnails first """
+
+import tempfile
+import unittest
+from os import listdir, path, utime
+from PySide6.QtGui import QImage, QColor
+from utilities.image_cache import ThumbnailCache, THUMBNAIL_PRUNE_TO
+
+
+def image(width: int) -> QImage:
+    result = QImage(width, width, QImage.Format_RGB32)
+    # noise doesn't compress, so every thumbnail is about the same size
+    for x in range(width):
+        for y in range(width):
+            result.setPixelColor(x, y, QColor((x * 7919 + y * 104729) % 256, (x * y) % 256, (x + y * 31) % 256))
+    return result
+
+
+class ThumbnailBudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = ThumbnailCache(self.dir.name)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def size(self) -> int:
+        return sum(path.getsize(path.join(self.dir.name, each)) for each in listdir(self.dir.name))
+
+    def test_stays_within_budget(self):
+        self.cache.write("first", image(64), 1 << 30)
+        budget = path.getsize(self.cache._file("first", 64)) * 10
+        for width in range(65, 105):
+            self.cache.write("asset", image(width), budget)
+        self.assertLessEqual(self.size(), budget)
+        self.assertIsNone(self.cache.read("first", 64))
+
+    def test_recently_read_are_kept(self):
+        self.cache.write("kept", image(64), 1 << 30)
+        self.cache.write("dropped", image(64), 1 << 30)
+        size = path.getsize(self.cache._file("kept", 64))
+        utime(self.cache._file("kept", 64), (0, 0))
+        utime(self.cache._file("dropped", 64), (1, 1))
+        # the kept thumbnail is the oldest, but has been read since
+        self.assertIsNotNone(self.cache.read("kept", 64))
+        # room for two of the three once pruned
+        self.cache.write("new", image(64), int(2 * size / THUMBNAIL_PRUNE_TO) + 1)
+        self.assertIsNotNone(self.cache.read("kept", 64))
+        self.assertIsNotNone(self.cache.read("new", 64))
+        self.assertIsNone(self.cache.read("dropped", 64))
+
+
+if __name__ == "__main__":
+    unittest.main()
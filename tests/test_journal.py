@@ -0,0 +1,115 @@
+""" journal writes that fail part way must not lose edits: the next save has to write everything saved since """
+
+import copy
+import errno
+import json
+import tempfile
+import unittest
+from os import path
+from unittest import mock
+from utilities.journal import NotebookJournal, diff
+
+
+def write_snapshot(filename: str, data: dict, fsync_policy: str):
+    with open(filename, "w") as f:
+        json.dump(data, f)
+
+
+def read(filename: str) -> dict:
+    with open(filename) as f:
+        data = json.load(f)
+    NotebookJournal.replay(filename, data, write_snapshot)
+    return _tupled(data)
+
+
+def _tupled(data: dict) -> dict:
+    for section in data["sections"].values():
+        for page in section["pages"].values():
+            page["geometry"] = tuple(page["geometry"])
+            for item in page["items"].values():
+                item["geometry"] = tuple(item["geometry"])
+    return data
+
+
+def notebook(*items) -> dict:
+    return {"id": "nb", "sections": {"s": {"pages": {"p": {
+        "geometry": (0, 0, 800, 600),
+        "items": {name: {"geometry": (x, 0, 10, 10), "contents": name} for name, x in items},
+    }}}}}
+
+
+def failing_open(torn: bool):
+    """ an open for the journal that fails appends with ENOSPC, after writing part of them if torn """
+    real_open = open
+
+    def fake(file, mode="r", *args, **kwargs):
+        if "a" not in mode:
+            return real_open(file, mode, *args, **kwargs)
+        f = real_open(file, mode, *args, **kwargs)
+
+        def write(lines):
+            if torn:
+                f.buffer.write(lines.encode()[:len(lines) // 2])
+            raise OSError(errno.ENOSPC, "No space left on device")
+
+        f.write = write
+        return f
+
+    return fake
+
+
+class JournalFailureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = path.join(self.dir.name, "notebook-nb.fnbook")
+        self.journal = NotebookJournal(self.filename, write_snapshot)
+        self.saved = notebook(("a", 0))
+        self.journal.compact(self.saved, "never")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def save(self, data: dict):
+        """ what Notebook.save does: diff against the last data handed to the writer, whatever became of it """
+        records = diff(self.saved, data)
+        self.saved = data
+        self.journal.write(data, records, "never", 1 << 20)
+
+    def check_failed_append_is_rewritten(self, torn: bool):
+        first = notebook(("a", 5))
+        with mock.patch("builtins.open", failing_open(torn)):
+            with self.assertRaises(OSError):
+                self.save(first)
+        second = copy.deepcopy(first)
+        second["sections"]["s"]["pages"]["p"]["items"]["b"] = {"geometry": (20, 0, 10, 10), "contents": "b"}
+        self.save(second)
+        self.assertEqual(read(self.filename), second)
+
+    def test_failed_append(self):
+        self.check_failed_append_is_rewritten(torn=False)
+
+    def test_torn_append(self):
+        self.check_failed_append_is_rewritten(torn=True)
+
+    def test_failed_snapshot(self):
+        # a new section can't be journaled, so this save writes a snapshot
+        first = notebook(("a", 5))
+        first["sections"]["t"] = {"pages": {}}
+        self.journal._write_snapshot = mock.Mock(side_effect=OSError(errno.EIO, "Input/output error"))
+        with self.assertRaises(OSError):
+            self.save(first)
+        self.journal._write_snapshot = write_snapshot
+        second = copy.deepcopy(first)
+        second["sections"]["s"]["pages"]["p"]["items"]["a"]["contents"] = "edited"
+        self.save(second)
+        self.assertEqual(read(self.filename), second)
+
+    def test_appends_replay(self):
+        self.save(notebook(("a", 5)))
+        self.save(notebook(("a", 5), ("b", 20)))
+        self.assertEqual(read(self.filename), notebook(("a", 5), ("b", 20)))
+
+
+if __name__ == "__main__":
+    unittest.main()
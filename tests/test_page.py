@@ -0,0 +1,51 @@
+""" a page's size is saved with it, so the cached marshal of a page must not outlive a change of its size """
+
+import unittest
+from PySide6.QtCore import QRect
+from tests.gui import workspace, process_events
+from binder import Binder
+from page_item import PageItem
+
+
+class PageSizeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = workspace()
+        self.binder = Binder()
+        self.binder.load_workspace()
+        notebook = self.binder.notebooks[0]
+        notebook._check_handle_new_section(0)
+        section = notebook.sections[0]
+        section._check_handle_new_section(0)
+        self.page = section.pages[0]
+        self.item = PageItem("Text Box", QRect(10, 10, 200, 100))
+        self.page._add_item(self.item)
+        process_events()
+
+    def tearDown(self):
+        self.binder.deleteLater()
+        process_events()
+        self.dir.cleanup()
+
+    def _saved_size(self) -> tuple:
+        return tuple(self.page.marshal()["geometry"])
+
+    def test_shrinking_after_a_save(self):
+        self.item.setGeometry(QRect(4000, 3000, 200, 100))
+        self.assertEqual(self._saved_size(), (4199, 3099))
+        # moved back and saved before the page has shrunk to fit
+        self.item.setGeometry(QRect(10, 10, 200, 100))
+        self.assertEqual(self._saved_size(), (4199, 3099))
+        self.page._eval_resize()
+        self.assertLess(self.page.width(), 4199)
+        self.assertEqual(self._saved_size(), (self.page.width(), self.page.height()))
+
+    def test_same_size_stays_clean(self):
+        self.page._eval_resize()
+        self.page.marshal()
+        self.page._eval_resize()
+        self.assertFalse(self.page.dirty)
+
+
+if __name__ == "__main__":
+    unittest.main()
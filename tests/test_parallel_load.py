@@ -0,0 +1,44 @@
+""" workers parsing the workspace start from the parsers' module, which must stay free of Qt, and parse notebooks the
+same as loading them directly """
+
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from os import path
+from tests.gui import process_events
+from storage.parallel_load import ParallelLoader, WORKER_MAIN
+from storage.yaml_store import YamlStore
+from storage.sharded_store import ShardedStore
+
+NOTEBOOK = {"id": "nb", "sections": {"s": {"pages": {"p": {"uid": "u" * 32, "geometry": (800, 600), "items": {}}}}}}
+
+
+class ParallelLoadTest(unittest.TestCase):
+
+    def test_worker_main_imports_no_qt(self):
+        root = path.dirname(path.dirname(path.abspath(__file__)))
+        code = "import sys; sys.path.insert(0, {!r}); import {}; print(any(name.startswith('PySide6') for name in " \
+               "sys.modules))".format(root, WORKER_MAIN)
+        # isolated, so nothing the environment runs at startup counts
+        output = subprocess.run([sys.executable, "-I", "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "False")
+
+    def test_parse(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for store in (YamlStore(directory, directory), ShardedStore(directory, directory)):
+                store.write_notebook("nb", NOTEBOOK)
+                results = {}
+                loader = ParallelLoader(store)
+                loader.parsed.connect(results.__setitem__)
+                loader.start({"nb": store.notebook_parser("nb")})
+                deadline = time.monotonic() + 30
+                while not results and time.monotonic() < deadline:
+                    process_events()
+                    time.sleep(0.01)
+                self.assertEqual(store.parsed_notebook("nb", results["nb"]), store.read_notebook("nb"))
+
+
+if __name__ == "__main__":
+    unittest.main()
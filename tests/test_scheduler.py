@@ -0,0 +1,72 @@
+""" the scheduler's heap runs calls in deadline order, once due, skipping cancelled calls and those whose owner is
+gone """
+
+import unittest
+from time import monotonic, sleep
+from threading import Thread
+from PySide6.QtCore import QObject
+from shiboken6 import delete
+from tests.gui import process_events
+from utilities.scheduler import Scheduler
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.calls = []
+
+    def _call(self, name: str):
+        return lambda: self.calls.append(name)
+
+    def test_deadline_order(self):
+        now = monotonic()
+        self.scheduler.call_at(now - 1, self._call("c"))
+        self.scheduler.call_at(now - 3, self._call("a"))
+        self.scheduler.call_at(now - 2, self._call("b1"))
+        # ties run in the order they were scheduled
+        self.scheduler.call_at(now - 2, self._call("b2"))
+        self.scheduler._fire()
+        self.assertEqual(self.calls, ["a", "b1", "b2", "c"])
+
+    def test_only_due_calls_run(self):
+        self.scheduler.call_later(60, self._call("later"))
+        self.scheduler.call_at(monotonic() - 1, self._call("due"))
+        self.scheduler._fire()
+        self.assertEqual(self.calls, ["due"])
+        self.assertEqual(len(self.scheduler._heap), 1)
+        self.assertTrue(self.scheduler._timer.isActive())
+
+    def test_cancelled_and_orphaned_calls_are_skipped(self):
+        owner = QObject()
+        past = monotonic() - 1
+        self.scheduler.call_at(past, self._call("cancelled")).cancel()
+        self.scheduler.call_at(past, self._call("orphaned"), owner)
+        self.scheduler.call_at(past, self._call("kept"))
+        delete(owner)
+        self.scheduler._fire()
+        self.assertEqual(self.calls, ["kept"])
+
+    def test_failing_call_doesnt_stop_the_rest(self):
+        def fail():
+            raise RuntimeError("failed")
+        past = monotonic() - 1
+        self.scheduler.call_at(past, fail)
+        self.scheduler.call_at(past, self._call("after"))
+        with self.assertLogs("freenote", "ERROR"):
+            self.scheduler._fire()
+        self.assertEqual(self.calls, ["after"])
+
+    def test_call_from_another_thread(self):
+        thread = Thread(target=self.scheduler.call_later, args=(0, self._call("threaded")))
+        thread.start()
+        thread.join()
+        deadline = monotonic() + 2
+        while not self.calls and monotonic() < deadline:
+            process_events()
+            sleep(0.01)
+        self.assertEqual(self.calls, ["threaded"])
+
+
+if __name__ == "__main__":
+    unittest.main()
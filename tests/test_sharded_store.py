@@ -0,0 +1,61 @@
+""" renaming a section or a page in the sharded layout only rewrites the notebook's manifest """
+
+import tempfile
+import unittest
+from os import path
+from unittest import mock
+from storage import sharded_store
+from storage.sharded_store import ShardedStore, MANIFEST_FILE
+
+
+def page(uid: str, text: str) -> dict:
+    return {"uid": uid, "geometry": (800, 600),
+            "items": {"Text Box": {"geometry": (0, 0, 10, 10), "contents": {"type": "text", "value": text}}}}
+
+
+def notebook(first="first", second="second") -> dict:
+    return {"id": "nb", "sections": {
+        first: {"pages": {"one": page("a" * 32, "1"), "two": page("b" * 32, "2")}},
+        second: {"pages": {"three": page("c" * 32, "3")}},
+    }}
+
+
+class RenameTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = ShardedStore(self.dir.name, self.dir.name)
+        self.store.write_notebook("nb", notebook())
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _written(self, data: dict) -> set:
+        """ the names of the files saving data writes """
+        with mock.patch("storage.sharded_store.write_yaml", wraps=sharded_store.write_yaml) as write:
+            self.store.write_notebook("nb", data)
+        return {path.basename(call.args[0]) for call in write.call_args_list}
+
+    def test_section_rename(self):
+        self.assertEqual(self._written(notebook(first="renamed")), {MANIFEST_FILE})
+        self.assertEqual(list(self.store.read_notebook("nb")["sections"]), ["renamed", "second"])
+
+    def test_page_rename(self):
+        data = notebook()
+        pages = data["sections"]["first"]["pages"]
+        data["sections"]["first"]["pages"] = {"renamed": pages["one"], "two": pages["two"]}
+        self.assertEqual(self._written(data), {MANIFEST_FILE})
+        self.assertEqual(self.store.read_notebook("nb")["sections"]["first"]["pages"]["renamed"]["items"],
+                         page("a" * 32, "1")["items"])
+
+    def test_unchanged(self):
+        self.assertEqual(self._written(notebook()), set())
+
+    def test_edit(self):
+        data = notebook()
+        data["sections"]["second"]["pages"]["three"] = page("c" * 32, "edited")
+        self.assertEqual(self._written(data), {"page-{}.fnpage".format("c" * 32)})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+""" grid queries and page extents stay right as rectangles are moved and removed, checked against checking every
+rectangle """
+
+import random
+import unittest
+from PySide6.QtCore import QRect, QPoint
+from utilities.spatial_index import SpatialIndex
+
+
+class SpatialIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SpatialIndex(cell_size=64)
+        self.rects = {}
+
+    def _insert(self, key, rect: QRect):
+        self.index.insert(key, rect)
+        self.rects[key] = rect
+
+    def _remove(self, key):
+        self.index.remove(key)
+        del self.rects[key]
+
+    def _check(self, rng: random.Random):
+        for _ in range(20):
+            query = QRect(rng.randrange(-100, 600), rng.randrange(-100, 600), rng.randrange(1, 300),
+                          rng.randrange(1, 300))
+            expected = {key for key, rect in self.rects.items() if rect.intersects(query)}
+            self.assertEqual(self.index.intersecting(query), expected)
+            point = QPoint(rng.randrange(0, 600), rng.randrange(0, 600))
+            self.assertEqual(self.index.at(point), {key for key, rect in self.rects.items() if rect.contains(point)})
+        if self.rects:
+            right = max(rect.right() for rect in self.rects.values())
+            bottom = max(rect.bottom() for rect in self.rects.values())
+            self.assertEqual(self.index.rect(self.index.right_most).right(), right)
+            self.assertEqual(self.index.rect(self.index.bottom_most).bottom(), bottom)
+        else:
+            self.assertIsNone(self.index.right_most)
+            self.assertIsNone(self.index.bottom_most)
+
+    def test_move(self):
+        self._insert("a", QRect(10, 10, 50, 50))
+        self._insert("b", QRect(500, 400, 50, 50))
+        self._insert("b", QRect(20, 20, 10, 10))
+        self.assertEqual(self.index.at(QPoint(520, 420)), set())
+        self.assertEqual(self.index.intersecting(QRect(0, 0, 100, 100)), {"a", "b"})
+        self.assertEqual(self.index.right_most, "a")
+        self.assertEqual(len(self.index), 2)
+
+    def test_remove(self):
+        self._insert("a", QRect(10, 10, 50, 50))
+        self._insert("b", QRect(500, 400, 50, 50))
+        self._remove("b")
+        self.assertNotIn("b", self.index)
+        self.assertEqual(self.index.intersecting(QRect(0, 0, 1000, 1000)), {"a"})
+        self.assertEqual(self.index.bottom_most, "a")
+        self._remove("a")
+        self.assertIsNone(self.index.right_most)
+        # removing what isn't there does nothing
+        self.index.remove("a")
+
+    def test_empty_query(self):
+        self._insert("a", QRect(10, 10, 50, 50))
+        self.assertEqual(self.index.intersecting(QRect()), set())
+
+    def test_many_moves_and_removals(self):
+        rng = random.Random(2)
+        for step in range(1500):
+            key = rng.randrange(40)
+            if key in self.rects and rng.random() < 0.2:
+                self._remove(key)
+            else:
+                self._insert(key, QRect(rng.randrange(0, 500), rng.randrange(0, 500), rng.randrange(1, 200),
+                                        rng.randrange(1, 200)))
+            if step % 100 == 0:
+                self._check(rng)
+        self._check(rng)
+        # stale extent entries are dropped rather than piling up
+        self.assertLessEqual(len(self.index._rights), 2 * len(self.rects) + 66)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+""" item saves to the SQLite backend that fail must not lose edits: the next save has to write everything saved since """
+
+import copy
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from storage.sqlite_store import SqliteStore, SqliteWrite
+from utilities.journal import diff
+
+
+def notebook(*items) -> dict:
+    return {"id": "nb", "sections": {"s": {"pages": {"p": {
+        "geometry": (800, 600),
+        "items": {name: {"geometry": (x, 0, 10, 10), "contents": {"type": "text", "value": name}}
+                  for name, x in items},
+    }}}}}
+
+
+class SqliteFailureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = SqliteStore(self.dir.name)
+        self.saved = notebook(("a", 0))
+        self.store._write_notebook("nb", self.saved, "never")
+
+    def tearDown(self):
+        self.store._connection().close()
+        self.dir.cleanup()
+
+    def save(self, data: dict):
+        """ what Notebook.save does: diff against the last data handed to the writer, whatever became of it """
+        records = diff(self.saved, data)
+        self.saved = data
+        SqliteWrite(self.store, "nb", data, records, "never")()
+
+    def test_failed_records_are_rewritten(self):
+        first = notebook(("a", 5))
+        with mock.patch.object(SqliteStore, "_apply", side_effect=sqlite3.OperationalError("disk I/O error")):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.save(first)
+        second = copy.deepcopy(first)
+        second["sections"]["s"]["pages"]["p"]["items"]["b"] = {"geometry": (20, 0, 10, 10),
+                                                               "contents": {"type": "text", "value": "b"}}
+        self.save(second)
+        self.assertEqual(self.store.load_notebook("nb"), second)
+
+    def test_records_apply(self):
+        self.save(notebook(("a", 5)))
+        self.save(notebook(("a", 5), ("b", 20)))
+        self.assertEqual(self.store.load_notebook("nb"), notebook(("a", 5), ("b", 20)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+""" the stacking order of a page's items, checked against a plain list doing the same moves """
+
+import random
+import unittest
+from utilities.z_order import ZOrder
+
+
+class Item:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.z_index = None
+
+    def __repr__(self):
+        return self.name
+
+
+class ZOrderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.items = [Item(name) for name in "abcde"]
+        self.order = ZOrder()
+        for each in self.items:
+            self.order.append(each)
+
+    def _names(self) -> str:
+        return "".join(each.name for each in self.order)
+
+    def test_append(self):
+        self.assertEqual(self._names(), "abcde")
+        self.assertEqual(len(self.order), 5)
+        self.assertIn(self.items[0], self.order)
+
+    def test_raise_and_lower(self):
+        a, b, c, d, e = self.items
+        self.order.raise_(b)
+        self.assertEqual(self._names(), "acdeb")
+        self.order.lower(d)
+        self.assertEqual(self._names(), "daceb")
+        # already on top, or at the bottom
+        self.order.raise_(b)
+        self.order.lower(d)
+        self.assertEqual(self._names(), "daceb")
+
+    def test_raise_all_keeps_order_among_themselves(self):
+        a, b, c, d, e = self.items
+        self.order.raise_all([d, b])
+        self.assertEqual(self._names(), "acebd")
+        self.order.lower_all([e, c])
+        self.assertEqual(self._names(), "ceabd")
+
+    def test_remove_and_replace(self):
+        a, b, c, d, e = self.items
+        self.order.remove(c)
+        self.assertNotIn(c, self.order)
+        self.assertEqual(self._names(), "abde")
+        record = Item("r")
+        self.order.replace(b, record)
+        self.assertEqual(self._names(), "arde")
+        self.assertEqual(record.z_index, b.z_index)
+        self.order.append(c)
+        self.assertEqual(self._names(), "ardec")
+
+    def test_z_index_sorts_like_the_order(self):
+        model = list(self.items)
+        rng = random.Random(1)
+        for _ in range(2000):
+            item = rng.choice(model)
+            model.remove(item)
+            if rng.random() < 0.5:
+                self.order.raise_(item)
+                model.append(item)
+            else:
+                self.order.lower(item)
+                model.insert(0, item)
+        self.assertEqual(self.order.ordered(), model)
+        self.assertEqual(sorted(model, key=lambda each: each.z_index), model)
+        self.assertTrue(all(isinstance(each.z_index, int) for each in model))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+""" crash-safe file writes: write to a temporary file beside the target, sync it, then atomically rename it over the
+target. Readers (and the next launch, after a crash or power loss) see either the old file or the new one, never a
+partially written mix of both """
+
+from contextlib import contextmanager
+from tempfile import mkstemp
+from os import path, replace, remove, fsync, chmod, stat, umask
+import os
+
+# how hard each write tries to reach the disk before the rename makes it visible
+FSYNC_NEVER = "never"    # rename only; a power loss may leave an empty or stale file, but a crash never truncates it
+FSYNC_FILE = "file"      # sync the file contents before renaming over the old version
+FSYNC_ALWAYS = "always"  # also sync the directory, so the rename itself survives a power loss
+FSYNC_POLICIES = (FSYNC_NEVER, FSYNC_FILE, FSYNC_ALWAYS)
+
+# mkstemp creates files only the owner can read. Read the umask once (it can't be read without setting it) so new
+# files get the same permissions a plain open() would have given them
+_UMASK = umask(0)
+umask(_UMASK)
+
+
+@contextmanager
+def atomic_write(filename: str, mode="w", fsync_policy=FSYNC_FILE):
+    """ open a temporary file to write the new contents of filename to. When the with block exits cleanly the
+    temporary file replaces filename; if it raises, filename is left untouched and the temporary file is removed """
+    if fsync_policy not in FSYNC_POLICIES:
+        raise ValueError("unknown fsync policy {}".format(fsync_policy))
+    directory = path.dirname(path.abspath(filename))
+    fd, tmp = mkstemp(prefix=".{}.".format(path.basename(filename)), suffix=".tmp", dir=directory)
+    try:
+        with open(fd, mode) as f:
+            yield f
+            f.flush()
+            if fsync_policy != FSYNC_NEVER:
+                fsync(f.fileno())
+        try:
+            chmod(tmp, stat(filename).st_mode)
+        except FileNotFoundError:
+            chmod(tmp, 0o666 & ~_UMASK)
+        replace(tmp, filename)
+    except BaseException:
+        try:
+            remove(tmp)
+        except FileNotFoundError:
+            """ Do nothing """
+        raise
+    if fsync_policy == FSYNC_ALWAYS:
+        _fsync_directory(directory)
+
+
+def _fsync_directory(directory: str):
+    """ make a rename inside directory durable. Not every platform (namely Windows) can open a directory to sync it,
+    in which case this is best effort """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        fsync(fd)
+    except OSError:
+        """ Do nothing """
+    finally:
+        os.close(fd)
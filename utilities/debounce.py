@@ -1,56 +1,147 @@
 """ classes and functions for debouncing user actions. """
 
-from threading import Timer
+from threading import Lock
+from time import monotonic
 from PySide6.QtCore import Signal, QObject
+from PySide6.QtGui import QGuiApplication
+from utilities.scheduler import g_scheduler
+from utilities.log import g_log
+from settings.__init__ import settings
+
+# autosave aims to spend no more than this fraction of an editing session blocking the GUI thread to save
+AUTOSAVE_BUDGET = 0.02
+# bounds on how long continuous editing goes unsaved, in multiples of the autosave interval
+MIN_WAIT_INTERVALS = 5
+MAX_WAIT_INTERVALS = 60
+# the display refresh rate assumed when the screen doesn't report one
+DEFAULT_REFRESH_RATE = 60
 
 
 class Debouncer(QObject):
     """ Debouncer provides a two-way interface for taking actions after some input event, but not duplicating
     the action for every event inside a certain window. You can set the action attribute on a Debouncer instance
-    and it will call that action, or you can provide your own factory function (probably unnecessary) to create the
-    timer instance each time.
+    and it will call that action, or connect to the bounced signal. Both happen on the GUI thread, so either can add or
+    remove widgets.
+
+    Debouncers are driven by the global scheduler. Restarting one only moves its deadline forward: when the call it
+    already has scheduled comes due early, it reschedules itself for the new deadline, so a burst of events (like
+    every mouse move during a drag) costs no more than a timestamp each. Give a debouncer a parent to stop it firing
+    once the parent is deleted.
 
-    In addition to being able to execute functions asynchronously, you can also utilize the bounced signal, which
-    is useful for needing to add or remove widgets from the GUI, which normally couldn't be done in a normal function
-    due to threading constraints. """
+    With max_wait set, a burst of events that never lets up still fires the action max_wait seconds after the burst
+    began, rather than only once it stops. """
 
     bounced = Signal()
 
-    def __init__(self, timer_factory=None, timeout=3):
-        super().__init__()
+    def __init__(self, timeout=3, parent=None, max_wait=None):
+        super().__init__(parent)
         self.action = self._noop
         self.timeout = timeout
-        self.timer_factory = timer_factory
-        if timer_factory is None:
-            self.timer_factory =  self._default_timer
-        self.timer = None
+        self.max_wait = max_wait
+        self._deadline = None
+        # when the current burst has to fire by, however busy it stays
+        self._max_deadline = None
+        self._call = None
+        # start may be called from any thread
+        self._lock = Lock()
 
     def _noop(self):
         """ Does nothing """
 
-    def _default_timer(self):
-        return Timer(self.timeout, self._log_action)
-
     def _log_action(self):
-        # TODO make this actually a log
-        print("debouncer: calling action")
+        g_log.debug("debouncer: calling action")
         self.bounced.emit()
         self.action()
 
     def start(self, *args):
         """ Start the debouncing timer. If timer is reached and no action is taken, action will trigger.
          Accepts an arbitrary number of arguments to make it easier to connect to arbitrary signals """
-        if self.timer is None:
-            self.timer = self.timer_factory()
-            self.timer.start()
-        else:
-            self.timer.cancel()
-            self.timer = self.timer_factory()
-            self.timer.start()
+        with self._lock:
+            now = monotonic()
+            if self._max_deadline is None and self.max_wait is not None:
+                self._max_deadline = now + self.max_wait
+            self._deadline = now + self.timeout
+            if self._max_deadline is not None:
+                self._deadline = min(self._deadline, self._max_deadline)
+            if self._call is None:
+                self._call = g_scheduler.call_at(self._deadline, self._expire, self)
 
     def stop(self):
-        if self.timer is not None:
-            self.timer.cancel()
+        with self._lock:
+            self._deadline = None
+            self._max_deadline = None
+            if self._call is not None:
+                self._call.cancel()
+                self._call = None
+
+    def _expire(self):
+        with self._lock:
+            if self._deadline is None:
+                self._call = None
+                return
+            if monotonic() < self._deadline:
+                # restarted since this call was scheduled
+                self._call = g_scheduler.call_at(self._deadline, self._expire, self)
+                return
+            self._deadline = None
+            self._max_deadline = None
+            self._call = None
+        self._log_action()
+
+
+class FrameThrottle(QObject):
+    """ FrameThrottle passes on a stream of values (like where a drag has got to, for every mouse move) to its action at
+    most once per display frame, and only the latest of them: values posted since the last frame replace each other.
+    Unlike a Debouncer, it never waits for the stream to let up. Only used on the GUI thread """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.action = self._noop
+        self._pending = None
+        self._call = None
+
+    def _noop(self, value):
+        """ Does nothing """
+
+    @staticmethod
+    def frame_interval() -> float:
+        screen = QGuiApplication.primaryScreen()
+        rate = screen.refreshRate() if screen is not None else 0
+        return 1 / (rate or DEFAULT_REFRESH_RATE)
+
+    def post(self, value):
+        self._pending = value
+        if self._call is None:
+            self._call = g_scheduler.call_later(self.frame_interval(), self._fire, self)
+
+    def flush(self):
+        """ pass on the latest value right away, if there's one waiting """
+        if self._call is not None:
+            self._call.cancel()
+            self._fire()
+
+    def _fire(self):
+        value = self._pending
+        self._pending = None
+        self._call = None
+        self.action(value)
+
+
+class SaveDebouncer(Debouncer):
+    """ the debouncer behind autosave. Saves once editing has paused for auto_save_interval seconds, and during
+    continuous editing at least every max_wait seconds. max_wait follows how long the last save blocked the GUI thread
+    for, so cheap saves happen often and expensive ones are spread out to stay within AUTOSAVE_BUDGET """
+
+    def __init__(self):
+        super().__init__(timeout=settings.auto_save_interval)
+        self.record_save_cost(0)
+
+    def record_save_cost(self, seconds: float):
+        """ called after each save with how long it took on the GUI thread. Also picks up changes to the interval """
+        self.timeout = settings.auto_save_interval
+        self.max_wait = min(
+            max(self.timeout * MIN_WAIT_INTERVALS, seconds / AUTOSAVE_BUDGET), self.timeout * MAX_WAIT_INTERVALS
+        )
 
 
-g_save_debouncer = Debouncer()
+g_save_debouncer = SaveDebouncer()
@@ -0,0 +1,177 @@
+""" renditions of images at the sizes they're shown at. Scaling a large photo down to fit its item is slow, and resizing
+an item does it on every step of the drag, so decoded images are kept as a pyramid of successively halved levels.
+Resizes scale from the smallest level at least as wide as they need, never more than twice the size they're after.
+The widths images end up shown at are cached on disk as thumbnails, so reopening a page can show its images without
+decoding them in full. The thumbnails on disk have a byte budget too, and the least recently used are pruned.
+
+Decoded pyramids are owned by a cache with a memory budget. Image items only hold on to their pyramid while they're in
+view; otherwise they keep showing the rendition they were last shown at, and decode again (if the cache has since
+evicted them) once something like a resize needs the full image. """
+
+from PySide6.QtCore import Qt, QStandardPaths, QBuffer, QIODevice
+from PySide6.QtGui import QImage
+from os import path, makedirs, scandir, remove, utime
+from collections import OrderedDict
+from threading import Lock
+from utilities.atomic_write import atomic_write, FSYNC_NEVER
+from settings.__init__ import settings
+
+# levels stop halving once they'd be narrower than this
+PYRAMID_MIN_WIDTH = 128
+THUMBNAIL_EXTENSION = ".png"
+# once the thumbnails on disk are over budget, the least recently used are removed until they take up this much of it,
+# so pruning (which lists the whole cache) only happens every so often
+THUMBNAIL_PRUNE_TO = 0.75
+
+
+class Pyramid:
+    """ an image at its full size, then halved for as long as it stays at least PYRAMID_MIN_WIDTH wide. Built off the
+    GUI thread, as each halving is a smooth (slow) scale """
+
+    def __init__(self, image: QImage):
+        self.levels = [image]
+        while self.levels[-1].width() // 2 >= PYRAMID_MIN_WIDTH:
+            self.levels.append(self.levels[-1].scaledToWidth(self.levels[-1].width() // 2, Qt.SmoothTransformation))
+
+    @property
+    def full(self) -> QImage:
+        return self.levels[0]
+
+    def level(self, width: int) -> int:
+        """ the index of the smallest level at least width wide, or of the full image when even that's narrower """
+        for index in reversed(range(len(self.levels))):
+            if self.levels[index].width() >= width:
+                return index
+        return 0
+
+    @property
+    def size_in_bytes(self) -> int:
+        return sum(each.sizeInBytes() for each in self.levels)
+
+    def rendition(self, width: int) -> QImage:
+        """ the image smoothly scaled to width, from the nearest level. Safe off the GUI thread """
+        image = self.levels[self.level(width)]
+        if image.width() == width:
+            return image
+        return image.scaledToWidth(width, Qt.SmoothTransformation)
+
+
+class ThumbnailCache:
+    """ renditions of assets, by asset name and width, kept as files in the user's cache directory. Assets are named by
+    their contents, so one cache is safely shared by every workspace. Read and written on worker threads; a thumbnail
+    that can't be read is just a cache miss.
+
+    Reading a thumbnail touches its modification time, so the oldest thumbnails are the least recently used ones, which
+    are removed first when the cache is over budget """
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        # writes happen on several loader threads at once
+        self._lock = Lock()
+        # bytes of thumbnails on disk, counted on the first write
+        self._size = None
+
+    @property
+    def directory(self) -> str:
+        # the cache location depends on the application's name, which isn't set yet on import
+        if self._directory is None:
+            self._directory = path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation), "thumbnails")
+        return self._directory
+
+    def _file(self, name: str, width: int) -> str:
+        return path.join(self.directory, "{}-{}{}".format(name, width, THUMBNAIL_EXTENSION))
+
+    def read(self, name: str, width: int):
+        """ the cached rendition of asset name at width, or None """
+        filename = self._file(name, width)
+        image = QImage()
+        if not image.load(filename):
+            return None
+        try:
+            utime(filename)
+        except OSError:
+            """ pruned since it was read. Still a hit """
+        return image
+
+    def write(self, name: str, image: QImage, budget: int):
+        """ cache image (a rendition of asset name) under its width, unless it's already there. budget is how many
+        bytes the cache may take up, from the thumbnail_cache_mb setting (read on the GUI thread) """
+        filename = self._file(name, image.width())
+        if path.exists(filename):
+            return
+        makedirs(self.directory, exist_ok=True)
+        buffer = QBuffer()
+        buffer.open(QIODevice.WriteOnly)
+        image.save(buffer, "PNG")
+        data = bytes(buffer.data())
+        # losing a thumbnail to a crash only costs decoding the image again, so don't wait on the disk
+        with atomic_write(filename, "wb", FSYNC_NEVER) as f:
+            f.write(data)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, _, size in self._thumbnails())
+            else:
+                self._size += len(data)
+            if self._size > budget:
+                self._prune(int(budget * THUMBNAIL_PRUNE_TO))
+
+    def _thumbnails(self) -> list:
+        """ (modification time, filename, size) of every thumbnail on disk """
+        found = []
+        for each in scandir(self.directory):
+            if each.name.endswith(THUMBNAIL_EXTENSION):
+                try:
+                    stat = each.stat()
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, each.path, stat.st_size))
+        return found
+
+    def _prune(self, target: int):
+        """ remove the least recently used thumbnails until they take up no more than target bytes """
+        thumbnails = sorted(self._thumbnails())
+        self._size = sum(size for _, _, size in thumbnails)
+        for _, filename, size in thumbnails:
+            if self._size <= target:
+                break
+            try:
+                remove(filename)
+            except OSError:
+                continue
+            self._size -= size
+
+
+class DecodedImages:
+    """ decoded pyramids by asset name, least recently used first. Once they take up more than the image_memory_mb
+    setting, the least recently used are dropped. Items in view keep their own reference, so dropping a pyramid only
+    frees it once nothing shows it any more. Only used on the GUI thread """
+
+    def __init__(self):
+        self._pyramids = OrderedDict()
+        self._size = 0
+
+    def get(self, name: str):
+        """ the pyramid of asset name, or None if it isn't cached """
+        pyramid = self._pyramids.get(name)
+        if pyramid is not None:
+            self._pyramids.move_to_end(name)
+        return pyramid
+
+    def put(self, name: str, pyramid: Pyramid):
+        previous = self._pyramids.pop(name, None)
+        if previous is not None:
+            self._size -= previous.size_in_bytes
+        self._pyramids[name] = pyramid
+        self._size += pyramid.size_in_bytes
+        budget = settings.image_memory_mb * 1024 * 1024
+        # always keep the newest, however big it is
+        while self._size > budget and len(self._pyramids) > 1:
+            self._size -= self._pyramids.popitem(last=False)[1].size_in_bytes
+
+    @property
+    def size_in_bytes(self) -> int:
+        return self._size
+
+
+g_thumbnails = ThumbnailCache()
+g_decoded_images = DecodedImages()
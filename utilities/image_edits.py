@@ -0,0 +1,75 @@
+""" non-destructive image edits. An image's asset is never changed: edits are saved alongside the item, and applied to
+the decoded image once, before its pyramid of renditions is built, so showing the image at any size never repeats
+them """
+
+from PySide6.QtCore import QRect, QSize
+from PySide6.QtGui import QImage, QTransform
+
+
+class ImageEdits:
+    """ a crop (a rectangle of the original image, in its pixels), then a horizontal flip, then a rotation (clockwise,
+    in multiples of 90 degrees). Immutable; each edit returns a new ImageEdits. Safe to use off the GUI thread """
+
+    def __init__(self, crop=None, flip=False, rotation=0):
+        self.crop = crop
+        self.flip = flip
+        self.rotation = rotation % 360
+
+    @classmethod
+    def unmarshal(cls, data: dict):
+        """ from an image item's saved transform. Before cropping and flipping, only the rotation was saved """
+        crop = data.get("crop")
+        return cls(QRect(*crop) if crop else None, data.get("flip", False), data.get("rotation", 0))
+
+    def marshal(self) -> dict:
+        data = {"rotation": self.rotation}
+        # only saved when used, so images saved before they existed are unchanged by loading and saving them again
+        if self.crop is not None:
+            data["crop"] = [self.crop.x(), self.crop.y(), self.crop.width(), self.crop.height()]
+        if self.flip:
+            data["flip"] = True
+        return data
+
+    @property
+    def key(self) -> str:
+        """ tells renditions of differently edited copies of an image apart. Empty for an unedited image """
+        key = ""
+        if self.crop is not None:
+            key += "-c{}.{}.{}.{}".format(self.crop.x(), self.crop.y(), self.crop.width(), self.crop.height())
+        if self.flip:
+            key += "-f"
+        if self.rotation:
+            key += "-r{}".format(self.rotation)
+        return key
+
+    def rotated(self, degrees: int):
+        return ImageEdits(self.crop, self.flip, self.rotation + degrees)
+
+    def flipped(self):
+        # mirrors the image as it's shown. Flipping happens before rotating, which reverses the rotation
+        return ImageEdits(self.crop, not self.flip, -self.rotation)
+
+    def cropped(self, crop):
+        """ crop is a rectangle of the original image, or None to undo cropping """
+        return ImageEdits(crop, self.flip, self.rotation)
+
+    def _transform(self) -> QTransform:
+        transform = QTransform().rotate(self.rotation)
+        if self.flip:
+            transform = QTransform.fromScale(-1, 1) * transform
+        return transform
+
+    def apply(self, image: QImage) -> QImage:
+        """ the edited image """
+        if self.crop is not None:
+            image = image.copy(self.crop)
+        if self.flip or self.rotation:
+            image = image.transformed(self._transform())
+        return image
+
+    def source_rect(self, rect: QRect, size: QSize) -> QRect:
+        """ the rectangle of the original image that shows as rect of the edited image. size is the original's """
+        cropped = self.crop if self.crop is not None else QRect(0, 0, size.width(), size.height())
+        # the transform as QImage.transformed applied it, moved back to the origin
+        transform = QImage.trueMatrix(self._transform(), cropped.width(), cropped.height())
+        return transform.inverted()[0].mapRect(rect).translated(cropped.topLeft()).intersected(cropped)
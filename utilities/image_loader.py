@@ -0,0 +1,79 @@
+""" reads and decodes images on a pool of worker threads, so opening a page full of images (or dropping a large one
+onto it) never stalls the GUI thread. Results are delivered back on the GUI thread, where they can become pixmaps """
+
+from PySide6.QtCore import QObject, Signal, QMimeDatabase
+from PySide6.QtGui import QImage
+from shiboken6 import isValid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from os import cpu_count
+from utilities.log import g_log
+from storage.assets import content_name
+from utilities.image_cache import Pyramid
+
+
+class LoadedImage:
+    """ an image read and decoded by the loader """
+
+    def __init__(self, data: bytes, mimetype: str, image: QImage, edited: QImage):
+        # the encoded image, as it should be stored, and the name of the asset storing it
+        self.data = data
+        self.mimetype = mimetype
+        self.name = content_name(data)
+        # decoded as it's stored, then as it's shown (see ImageEdits) at the sizes it's scaled down from
+        self.image = image
+        self.pyramid = Pyramid(edited)
+
+
+def _load(read, prepare, edit) -> LoadedImage:
+    """ runs on a worker thread. QImage (unlike QPixmap) is safe to use off the GUI thread, and Qt releases the GIL
+    while decoding, so images decode in parallel """
+    data = read()
+    mimetype = QMimeDatabase().mimeTypeForData(data).name()
+    if prepare is not None:
+        data, mimetype = prepare(data, mimetype)
+    image = QImage()
+    if not image.loadFromData(data):
+        raise ValueError("{} isn't an image Qt can read".format(mimetype))
+    return LoadedImage(data, mimetype, image, image if edit is None else edit(image))
+
+
+class ImageLoader(QObject):
+    """ ImageLoader runs image loads on its worker threads. Each load reads the encoded image with read() (which must
+    not touch widgets), optionally passes it through prepare(data, mimetype) -> (data, mimetype), and decodes it. The
+    decoded image can then be edited with edit(image) -> image before its renditions are made.
+    callback is then called on the GUI thread with the LoadedImage, or with the exception that stopped it loading. A
+    load's owner is a QObject; once it's deleted, the callback is skipped. run does the same for any other work on
+    images, like scaling and caching renditions. """
+
+    _finished = Signal(object, object)
+
+    def __init__(self, workers=None):
+        super().__init__()
+        self._executor = ThreadPoolExecutor(max_workers=workers or min(4, cpu_count() or 1),
+                                            thread_name_prefix="image-loader")
+        self._finished.connect(self._deliver)
+
+    def load(self, read, callback, owner, prepare=None, edit=None):
+        self.run(partial(_load, read, prepare, edit), callback, owner)
+
+    def run(self, function, callback, owner):
+        """ call function() on a worker thread, then callback with its result on the GUI thread """
+        future = self._executor.submit(function)
+        future.add_done_callback(partial(self._done, callback, owner))
+
+    def _done(self, callback, owner, future):
+        """ runs on the worker thread. Emitting queues the result onto the GUI thread """
+        error = future.exception()
+        self._finished.emit(partial(callback, future.result() if error is None else error), owner)
+
+    def _deliver(self, callback, owner):
+        if not isValid(owner):
+            return
+        try:
+            callback()
+        except Exception:
+            g_log.exception("image loader callback failed")
+
+
+g_image_loader = ImageLoader()
@@ -0,0 +1,216 @@
+""" the image an image item shows, whichever page backend draws the item: where its bytes come from, decoding them
+(with the item's edits) in the background, smooth renditions and the thumbnails cached of them, and saving the image as
+an asset. Items decide when to ask for each, and show what they're handed back """
+
+from PySide6.QtCore import QObject, Signal, QBuffer, QIODevice, QUrl
+from PySide6.QtGui import QImage
+from urllib.request import urlopen
+from functools import partial
+from utilities.image_loader import g_image_loader
+from utilities.image_cache import g_thumbnails, g_decoded_images
+from utilities.image_edits import ImageEdits
+from utilities.save_worker import g_save_worker
+from storage.assets import is_content_name
+from storage import workspace_store, asset_key
+from settings.__init__ import settings
+from utilities.log import g_log
+
+GIF_MIMETYPE = "image/gif"
+# the JPEG quality oversized images are recompressed at, when recompression is turned on
+RECOMPRESS_QUALITY = 85
+
+
+def recompressed(data: bytes, mimetype: str, limit: int):
+    """ the bytes and mimetype to store a newly added image as. Originals are kept exactly as they are, unless they're
+    bigger than limit kilobytes (0 for no limit), in which case they're re-encoded (as JPEG, or PNG for images with
+    transparency) if that makes them smaller. Animated GIFs are always kept. Safe off the GUI thread """
+    if not limit or len(data) <= limit * 1024 or mimetype == GIF_MIMETYPE:
+        return data, mimetype
+    image = QImage()
+    if not image.loadFromData(data):
+        return data, mimetype
+    if image.hasAlphaChannel():
+        format, new_mimetype, quality = "PNG", "image/png", -1
+    else:
+        format, new_mimetype, quality = "JPEG", "image/jpeg", RECOMPRESS_QUALITY
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, format, quality)
+    if buffer.data().size() >= len(data):
+        return data, mimetype
+    return bytes(buffer.data()), new_mimetype
+
+
+def _read_url(url: str) -> bytes:
+    with urlopen(url) as f:
+        return f.read()
+
+
+def _cached_rendition(pyramid, width: int, name, budget: int):
+    """ runs on an image loader thread. Images are cached under name at the widths they settle at, for the next
+    launch, unless name is None. budget is the thumbnail cache's size in bytes """
+    image = pyramid.rendition(width)
+    if name is not None:
+        g_thumbnails.write(name, image, budget)
+    return image
+
+
+class ImageSource(QObject):
+    """ An image item's image. Owned by the item (as its QObject parent), so nothing it started loading is delivered
+    once the item is gone.
+
+    thumbnail is emitted with the cached thumbnail of a restored image, when there is one; otherwise the image is
+    decoded instead. decoded is emitted with the LoadedImage once the image has been decoded with the current edits,
+    and rendition with each smooth rendition asked for with refine, unless the edits have changed since. named is
+    emitted once a newly added (or legacy) image has been given its content name, and needs saving under it. failed is
+    emitted with the exception that stopped the image loading, which is logged; items tell the user """
+
+    thumbnail = Signal(object)
+    decoded = Signal(object)
+    rendition = Signal(object)
+    named = Signal()
+    failed = Signal(object)
+
+    def __init__(self, parent: QObject, url: str, asset_name=None, edits=None):
+        super().__init__(parent)
+        # The name of the asset once saved: a hash of the image, so identical images share one asset. Not known for
+        # newly added images until they're loaded
+        self.asset_name = asset_name
+        # whether the asset has already been written (or queued to be written) to disk
+        self._asset_saved = asset_name is not None
+        self.url = url
+        # the original encoded image and its real type. Re-encoding the image would usually only make it bigger, so
+        # these are what get saved. The bytes are only kept for images that weren't already stored as an asset
+        self._data = None
+        self.mimetype = None
+        self.edits = edits if edits is not None else ImageEdits()
+        # the size of the image as it's stored, and as it's shown (edited) once known, with the edits that size was
+        # measured with. Until an edit has decoded, items show a preview of it at the size of the previous edit
+        self.source_size = None
+        self.size = None
+        self.size_edits = None
+        self.decoding = False
+
+    @property
+    def ready(self) -> bool:
+        """ whether the image can be saved yet; newly added images can't until they've loaded """
+        return self.asset_name is not None
+
+    @property
+    def rendition_name(self) -> str:
+        """ what renditions of the image, as edited, are cached under """
+        return "{}{}".format(self.asset_name, self.edits.key)
+
+    @property
+    def asset_file(self) -> str:
+        return "{}.fna".format(self.asset_name)
+
+    @property
+    def asset_url(self) -> str:
+        """ the url saved with the item. Relative to the asset directory """
+        return QUrl.fromLocalFile(self.asset_file).url()
+
+    def load(self, width: int):
+        """ show the image at width: a restored image's cached thumbnail if it has one, else the decoded image """
+        if self.asset_name is not None and is_content_name(self.asset_name):
+            g_image_loader.run(partial(g_thumbnails.read, self.rendition_name, width), self._thumbnail_loaded, self)
+        else:
+            self.decode()
+
+    def _thumbnail_loaded(self, image):
+        if isinstance(image, Exception):
+            # treated as a cache miss
+            g_log.warning("couldn't read thumbnail of %s: %s", self.asset_name, image)
+            image = None
+        if image is None:
+            # never shown at this width before
+            self.decode()
+        elif self.size is None:
+            self.size = image.size()
+            self.size_edits = self.edits
+            self.thumbnail.emit(image)
+
+    def decode(self):
+        """ read and decode the image in the background, unless that's already under way """
+        if self.decoding:
+            return
+        self.decoding = True
+        prepare = None
+        if self._data is not None:
+            read = lambda data=self._data: data
+        elif self.asset_name is not None:
+            # restored images are read from the workspace's storage backend by asset name (their saved URLs are
+            # relative to the asset directory, and meaningless for backends that aren't files)
+            read = partial(workspace_store().read_asset, self.asset_name)
+        else:
+            # URLs for files dragged in are absolute, and read directly
+            read = partial(_read_url, self.url)
+            prepare = partial(recompressed, limit=settings.image_recompress_kb)
+        g_image_loader.load(read, partial(self._image_loaded, self.edits), self, prepare, self.edits.apply)
+
+    def _image_loaded(self, edits, image):
+        """ called on the GUI thread with the LoadedImage (edited with edits), or what stopped it from loading """
+        self.decoding = False
+        if isinstance(image, Exception):
+            g_log.error("couldn't load image %s: %s", self.asset_name or self.url, image)
+            self.failed.emit(image)
+            return
+        self.mimetype = image.mimetype
+        self.source_size = image.image.size()
+        if self.asset_name != image.name:
+            # newly added, or saved before assets were named by their contents (with a random uuid). Either way, it
+            # needs saving under its content name. The old asset is deleted once nothing saved refers to it any more
+            self.asset_name = image.name
+            self._data = image.data
+            self._asset_saved = False
+            self.named.emit()
+        if edits is not self.edits:
+            # edited again while decoding
+            self.decode()
+            return
+        self.size = image.pyramid.full.size()
+        self.size_edits = edits
+        g_decoded_images.put(self.rendition_name, image.pyramid)
+        self.decoded.emit(image)
+
+    def pixels(self):
+        """ the decoded pyramid of the image as edited, or None if it's been dropped from memory (or was never
+        decoded) """
+        if self.asset_name is None:
+            return None
+        return g_decoded_images.get(self.rendition_name)
+
+    def edit(self, edits: ImageEdits):
+        """ show the image with edits instead. Returns its pyramid if it's been decoded like this before; otherwise
+        it's decoded, and handed over with decoded """
+        self.edits = edits
+        pyramid = self.pixels()
+        if pyramid is not None:
+            self.size = pyramid.full.size()
+            self.size_edits = edits
+        else:
+            self.decode()
+        return pyramid
+
+    def refine(self, pyramid, width: int):
+        """ smoothly scale pyramid to width in the background, caching the result as a thumbnail. GIFs aren't cached;
+        they're decoded in full to be played anyway. Nor are legacy assets, which aren't named by their contents """
+        name = None
+        if self.mimetype != GIF_MIMETYPE and is_content_name(self.asset_name):
+            name = self.rendition_name
+        g_image_loader.run(partial(_cached_rendition, pyramid, width, name, settings.thumbnail_cache_mb * 1024 * 1024),
+                           partial(self._refined, self.edits), self)
+
+    def _refined(self, edits, image):
+        if isinstance(image, Exception):
+            g_log.warning("couldn't rescale image %s: %s", self.asset_name, image)
+        elif edits is self.edits:
+            self.rendition.emit(image)
+
+    def save_asset(self):
+        """ queue the original bytes to be saved as an asset, if they haven't been yet """
+        if self._asset_saved or self._data is None:
+            return
+        store = workspace_store()
+        g_save_worker.submit(asset_key(self.asset_name), store.asset_job(self.asset_name, self._data, self.mimetype))
+        self._asset_saved = True
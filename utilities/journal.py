@@ -0,0 +1,264 @@
+""" an append-only journal of edits, kept next to each notebook file, so autosaves only write what changed.
+
+A notebook on disk is its last full snapshot (the .fnbook file) plus the journal of item level edits made since. Each
+journal starts with a header naming the generation of the snapshot it applies to; a journal left over from an older
+snapshot (say, after a crash between writing a new snapshot and starting its journal) no longer matches and is
+ignored rather than replayed over newer data. Journal records are single lines of JSON, so a record torn by a crash
+only ever loses itself. """
+
+from os import path, fsync, replace
+from uuid import uuid4
+from utilities.atomic_write import atomic_write, FSYNC_NEVER
+import json
+
+JOURNAL_EXTENSION = ".fnjournal"
+
+
+def journal_file(notebook_file: str) -> str:
+    """ the journal that belongs to the given .fnbook file """
+    return path.splitext(notebook_file)[0] + JOURNAL_EXTENSION
+
+
+def _encode(record: dict) -> str:
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+def _tupled(item: dict) -> dict:
+    """ JSON has no tuples. Geometries are marshalled as tuples, so restore them to keep replayed data identical """
+    if "geometry" in item:
+        item["geometry"] = tuple(item["geometry"])
+    return item
+
+
+class NotebookJournal:
+    """ Writes a single notebook file, appending journal records where it can and compacting into a fresh snapshot
+    where it must. All writing methods run on the writer thread. """
+
+    def __init__(self, filename: str, write_snapshot, generation=None):
+        """ write_snapshot is called as write_snapshot(filename, data, fsync_policy) to write a full snapshot.
+        generation is the generation of the snapshot currently on disk, if it is known to be journaled """
+        self.filename = filename
+        self.generation = generation
+        self._write_snapshot = write_snapshot
+        self._size = None
+
+    @property
+    def journal_file(self) -> str:
+        return journal_file(self.filename)
+
+    def write(self, data: dict, records, fsync_policy: str, compact_bytes: int):
+        """ save data, the full current state of the notebook. records are the journal records that turn the last
+        saved state into data, or None if they can't be expressed as records (sections or pages changed) """
+        if records is not None and self.generation is not None:
+            if len(records) == 0:
+                return
+            if self._append(records, fsync_policy) < compact_bytes:
+                return
+        self.compact(data, fsync_policy)
+
+    def _forget(self):
+        """ after a failed write, the journal on disk no longer matches what has been saved: records were lost, or a
+        torn line hides everything after it. Compact on the next write, which writes data in full """
+        self.generation = None
+        self._size = None
+
+    def compact(self, data: dict, fsync_policy: str):
+        """ write data as a new snapshot and start an empty journal for it """
+        generation = uuid4().hex
+        snapshot = dict(data)
+        snapshot["generation"] = generation
+        header = _encode({"op": "snapshot", "generation": generation})
+        try:
+            self._write_snapshot(self.filename, snapshot, fsync_policy)
+            with atomic_write(self.journal_file, "w", fsync_policy) as f:
+                f.write(header)
+        except Exception:
+            # the snapshot may have been replaced without its journal, which would then be appended to while being
+            # ignored on load
+            self._forget()
+            raise
+        self.generation = generation
+        self._size = len(header.encode())
+
+    def _append(self, records: list, fsync_policy: str) -> int:
+        """ append records to the journal, returning its new size in bytes """
+        if self._size is None:
+            try:
+                self._size = path.getsize(self.journal_file)
+            except FileNotFoundError:
+                self._size = 0
+        lines = ""
+        if self._size == 0:
+            lines = _encode({"op": "snapshot", "generation": self.generation})
+        lines += "".join(_encode(each) for each in records)
+        try:
+            with open(self.journal_file, "a") as f:
+                f.write(lines)
+                f.flush()
+                if fsync_policy != FSYNC_NEVER:
+                    fsync(f.fileno())
+        except Exception:
+            self._forget()
+            raise
+        self._size += len(lines.encode())
+        return self._size
+
+    def rename(self, filename: str):
+        """ the notebook file was renamed to filename. Moves the journal along with it. Only call while the writer
+        thread is idle """
+        if path.exists(self.journal_file):
+            replace(self.journal_file, journal_file(filename))
+        self.filename = filename
+
+    @classmethod
+    def replay(cls, filename: str, data: dict, write_snapshot):
+        """ apply the journal belonging to filename to data, the snapshot loaded from it. Returns the journal to keep
+        writing the notebook with """
+        generation = data.pop("generation", None)
+        try:
+            with open(journal_file(filename)) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return cls(filename, write_snapshot, generation)
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            header = {}
+        if generation is None or header.get("op") != "snapshot" or header.get("generation") != generation:
+            # journal doesn't belong to this snapshot. Ignore it, and compact on the next save to replace it
+            return cls(filename, write_snapshot)
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # torn by a crash mid-append. Anything appended after it would be unreadable, so compact on the
+                # next save instead
+                return cls(filename, write_snapshot)
+            apply(data, record)
+        journal = cls(filename, write_snapshot, generation)
+        journal._size = sum(len(line.encode()) for line in lines)
+        return journal
+
+
+class JournalWrite:
+    """ a save job for the writer thread. A job waiting behind a newer one for the same notebook is coalesced into
+    it rather than dropped, so none of its records are lost """
+
+    def __init__(self, journal: NotebookJournal, data: dict, records, fsync_policy: str, compact_bytes: int,
+                 on_written=None):
+        """ on_written, if given, is called with data once it has been written """
+        self.journal = journal
+        self.data = data
+        self.records = records
+        self.fsync_policy = fsync_policy
+        self.compact_bytes = compact_bytes
+        self.on_written = on_written
+
+    def coalesce(self, previous):
+        if self.records is not None and previous.records is not None:
+            self.records = previous.records + self.records
+        else:
+            self.records = None
+        return self
+
+    def __call__(self):
+        self.journal.write(self.data, self.records, self.fsync_policy, self.compact_bytes)
+        if self.on_written is not None:
+            self.on_written(self.data)
+
+
+def apply(data: dict, record: dict):
+    """ apply a single journal record to notebook data """
+    try:
+        page = data["sections"][record["section"]]["pages"][record["page"]]
+    except KeyError:
+        return
+    items = page["items"]
+    op = record["op"]
+    if op == "page":
+        page["geometry"] = tuple(record["geometry"])
+    elif op == "add":
+        items[record["item"]] = _tupled(record["data"])
+    elif op in ("move", "resize") and record["item"] in items:
+        items[record["item"]]["geometry"] = tuple(record["geometry"])
+    elif op == "edit" and record["item"] in items:
+        items[record["item"]]["contents"] = record["contents"]
+    elif op == "delete":
+        items.pop(record["item"], None)
+    elif op == "rename" and record["item"] in items:
+        page["items"] = {
+            (record["to"] if name == record["item"] else name): each for name, each in items.items()
+        }
+    elif op == "order":
+        page["items"] = {name: items[name] for name in record["items"] if name in items}
+
+
+def diff(old: dict, new: dict):
+    """ the journal records that turn notebook data old into new. Returns None when the two differ by more than the
+    journal can record (sections or pages were added, removed, renamed or reordered), meaning a snapshot is needed.
+    Containers that weren't changed reuse their marshalled data, so anything identical by identity is skipped """
+    if old is None or old["id"] != new["id"] or list(old["sections"]) != list(new["sections"]):
+        return None
+    records = []
+    for section_id, section in new["sections"].items():
+        old_section = old["sections"][section_id]
+        if section is old_section:
+            continue
+        if list(old_section["pages"]) != list(section["pages"]):
+            return None
+        for page_id, page in section["pages"].items():
+            old_page = old_section["pages"][page_id]
+            if page is not old_page:
+                records.extend(_diff_page({"section": section_id, "page": page_id}, old_page, page))
+    return records
+
+
+def _diff_page(where: dict, old: dict, new: dict) -> list:
+    records = []
+
+    def record(op, item=None, **values):
+        each = {"op": op}
+        each.update(where)
+        if item is not None:
+            each["item"] = item
+        each.update(values)
+        records.append(each)
+
+    if tuple(old["geometry"]) != tuple(new["geometry"]):
+        record("page", geometry=new["geometry"])
+    old_items = old["items"]
+    new_items = new["items"]
+    removed = [name for name in old_items if name not in new_items]
+    added = [name for name in new_items if name not in old_items]
+    renames = {}
+    # a renamed item marshals to the same data under a different name
+    for name in list(added):
+        for old_name in removed:
+            if old_items[old_name] == new_items[name]:
+                record("rename", old_name, to=name)
+                renames[old_name] = name
+                removed.remove(old_name)
+                added.remove(name)
+                break
+    for name in removed:
+        record("delete", name)
+    for name, item in new_items.items():
+        old_item = old_items.get(name)
+        if old_item is None or old_item is item:
+            continue
+        old_geometry = tuple(old_item["geometry"])
+        geometry = tuple(item["geometry"])
+        if old_geometry[2:] != geometry[2:]:
+            record("resize", name, geometry=geometry)
+        elif old_geometry != geometry:
+            record("move", name, geometry=geometry)
+        if old_item["contents"] != item["contents"]:
+            record("edit", name, contents=item["contents"])
+    for name in added:
+        record("add", name, data=new_items[name])
+    # replaying the records above keeps surviving items in their old order with new ones at the end. Anything else
+    # means items were raised or lowered
+    order = [renames.get(name, name) for name in old_items if name not in removed] + added
+    if order != list(new_items):
+        record("order", items=list(new_items))
+    return records
@@ -0,0 +1,7 @@
+""" the application's log. Failures on background paths (writes, image loads, scheduled callbacks) are logged here,
+with their tracebacks, instead of printed; the ones the user needs to know about are also shown to them (see
+toaster.toast_near) """
+
+import logging
+
+g_log = logging.getLogger("freenote")
@@ -0,0 +1,66 @@
+""" reading and writing the YAML files notebooks are stored in. Notebooks are parsed in worker processes while the
+workspace loads, which start from this module, so it must only ever import YAML and other modules without Qt """
+
+from oyaml import load, dump
+from os import path
+from utilities.atomic_write import atomic_write
+from utilities.journal import NotebookJournal
+
+# libyaml's parser and emitter are many times faster than PyYAML's pure Python ones, particularly on the long HTML
+# strings notebooks are mostly made of. oyaml registers its ordered mapping representer with every dumper, C ones
+# included, so both write the same documents. PyYAML without libyaml falls back to the pure Python versions
+try:
+    from oyaml import CFullLoader as Loader, CDumper as Dumper
+except ImportError:
+    from oyaml import FullLoader as Loader, Dumper
+
+# the files of a notebook in the sharded layout: a manifest of its sections and pages, and a file per page
+MANIFEST_FILE = "manifest.fnmanifest"
+PAGE_PREFIX = "page-"
+PAGE_EXTENSION = ".fnpage"
+
+
+def read_yaml(filename: str):
+    with open(filename) as f:
+        return load(f, Loader=Loader)
+
+
+def write_yaml(filename: str, data, fsync_policy: str):
+    """ the previous version of the file is only replaced once the new one has been completely written """
+    with atomic_write(filename, "w", fsync_policy) as f:
+        dump(data, f, Dumper=Dumper)
+
+
+def write_snapshot(filename: str, data: dict, fsync_policy: str):
+    """ write a full notebook to disk """
+    write_yaml(filename, data, fsync_policy)
+
+
+def read_snapshot(filename: str) -> dict:
+    """ read a full notebook from disk, without its journal """
+    return read_yaml(filename)
+
+
+def parse_notebook(filename: str):
+    """ read a notebook and bring it up to date with its journal. Runs in a worker process when loading the workspace,
+    so it takes and returns only picklable data: the notebook data, and the journal to keep writing it with """
+    data = read_snapshot(filename)
+    journal = NotebookJournal.replay(filename, data, write_snapshot)
+    return data, journal
+
+
+def page_file(directory: str, uid: str) -> str:
+    return path.join(directory, "{}{}{}".format(PAGE_PREFIX, uid, PAGE_EXTENSION))
+
+
+def parse_sharded_notebook(directory: str, id: str) -> dict:
+    """ read a sharded notebook's manifest and every page in it. Runs in a worker process when loading the workspace """
+    manifest = read_yaml(path.join(directory, MANIFEST_FILE))
+    data = {"id": id, "sections": {}}
+    for section_id, section in manifest["sections"].items():
+        pages = {}
+        for page_id, uid in section["pages"].items():
+            pages[page_id] = read_yaml(page_file(directory, uid))
+            pages[page_id]["uid"] = uid
+        data["sections"][section_id] = {"pages": pages}
+    return data
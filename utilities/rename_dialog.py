@@ -1,6 +1,6 @@
 from PySide6 import QtWidgets
 from abc import abstractmethod
-from utilities.save_mixin import g_save_debouncer
+from utilities.save_mixin import g_save_debouncer, mark_dirty
 
 
 class RenameableMixin:
@@ -38,4 +38,5 @@ class RenameableMixin:
             else:
                 # Not sure if we should explicitly call the save debouncer here, or emit a signal that is connected
                 # by something using SaveMixin. TODO evaluate
+                mark_dirty(self)
                 g_save_debouncer.start()
@@ -4,31 +4,67 @@ from utilities.debounce import g_save_debouncer
 from PySide6 import QtCore
 
 
+class ChangeTracker:
+    """ Mixed into every container that is written to disk (items, pages, sections, notebooks and the binder) so
+    saves can skip anything that hasn't changed since it was last marshalled. A container is dirty whenever any of its
+    children are, so a clean container's last marshalled data can be reused as-is. """
+
+    # class level defaults so mixing in doesn't depend on __init__ ordering with Qt base classes. Anything new
+    # hasn't been saved yet, so it starts out dirty
+    dirty = True
+    _marshalled = None
+
+    def mark_dirty(self):
+        """ flag this object, and every tracked container it lives in, as changed since the last save """
+        mark_dirty(self)
+
+    def mark_clean(self, marshalled=None):
+        """ flag this object as saved. If the data it was saved as (or loaded from) is provided, it is cached and
+        returned by marshal until the object is changed again """
+        self.dirty = False
+        if marshalled is not None:
+            self._marshalled = marshalled
+
+
+def mark_dirty(widget):
+    """ walk up the Qt parent chain from widget, flagging every ChangeTracker on the way. Items live inside pages,
+    pages inside scroll areas inside sections, and so on up to the binder, so the parent chain covers all of them """
+    while widget is not None:
+        if isinstance(widget, ChangeTracker):
+            widget.dirty = True
+        widget = widget.parent()
+
+
 class SaveMixin:
 
+    def _changed(self, *args):
+        """ slot for anything that should be persisted. Accepts arbitrary args so it can connect to any signal """
+        mark_dirty(self)
+        g_save_debouncer.start()
+
     def setGeometry(self, pos: QtCore.QRect):
         super().setGeometry(pos)
-        g_save_debouncer.start()
+        self._changed()
 
     def deleteLater(self):
-        g_save_debouncer.start()
+        self._changed()
         super().deleteLater()
 
     def setText(self, text):
-        g_save_debouncer.start()
+        self._changed()
         super().setText(text)
 
     def _connect_signals(self):
         try:
-            self.textChanged.connect(g_save_debouncer.start)
+            self.textChanged.connect(self._changed)
         except AttributeError:
             """ Do nothing as this simply means this signal doesn't exist on the mixed in type """
         try:
-            self.tabCloseRequested.connect(g_save_debouncer.start)
+            self.tabCloseRequested.connect(self._changed)
         except AttributeError:
             """ Do nothing """
         try:
-            self.raised.connect(g_save_debouncer.start)
-            self.lowered.connect(g_save_debouncer.start)
+            self.raised.connect(self._changed)
+            self.lowered.connect(self._changed)
         except AttributeError:
             """ Do nothing """
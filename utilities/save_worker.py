@@ -0,0 +1,71 @@
+""" a dedicated writer thread for saving, so the GUI thread only ever has to take a snapshot of what needs saving """
+
+from PySide6.QtCore import QObject, Signal
+from threading import Thread, Condition
+from utilities.log import g_log
+
+
+class SaveWorker(QObject):
+    """ SaveWorker runs write jobs on a single background thread. Jobs are keyed (usually by the file they write) and
+    coalesced: submitting a job for a key that is still waiting to be written replaces the waiting job instead of
+    queueing another one, so a burst of saves never piles up behind a slow disk.
+
+    A job can define coalesce(previous), returning a single job doing the work of both, to be merged with the job it
+    replaces instead of dropping it.
+
+    Jobs must only work on plain data (or thread-safe types like QImage) captured on the GUI thread. They must never
+    touch widgets.
+
+    failed is emitted with the key of a job that raised, which is logged. Connected slots run on the GUI thread """
+
+    failed = Signal(str)
+
+    def __init__(self):
+        super().__init__()
+        self._cond = Condition()
+        # dicts preserve insertion order, so jobs are written in the order they were first requested
+        self._pending = {}
+        self._busy = False
+        self._thread = None
+
+    def submit(self, key: str, job):
+        """ queue job (a callable taking no arguments) to be run on the writer thread, replacing any job for the same
+        key that hasn't started yet """
+        with self._cond:
+            previous = self._pending.get(key)
+            if previous is not None and hasattr(job, "coalesce"):
+                job = job.coalesce(previous)
+            self._pending[key] = job
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="save-worker", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self):
+        """ block until every submitted job has been written. Used before closing, or before anything else touches
+        files the writer might be writing """
+        with self._cond:
+            while self._pending or self._busy:
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                jobs = list(self._pending.items())
+                self._pending.clear()
+                self._busy = True
+            for key, job in jobs:
+                try:
+                    job()
+                except Exception:
+                    # a failed write shouldn't stop later saves from happening
+                    g_log.exception("save job %s failed", key)
+                    self.failed.emit(key)
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+
+g_save_worker = SaveWorker()
@@ -0,0 +1,94 @@
+""" a single timer for everything that needs to happen after a delay: debouncers, toasts, deleting empty items and so
+on. Calls are kept in a heap ordered by deadline and a single QTimer is armed for the earliest one, so scheduling
+never starts a thread, and every callback runs on the GUI thread where it can safely touch widgets. """
+
+from PySide6.QtCore import QObject, QTimer, QThread, Signal
+from shiboken6 import isValid
+from heapq import heappush, heappop
+from itertools import count
+from threading import Lock
+from time import monotonic
+from utilities.log import g_log
+from math import ceil
+
+
+class ScheduledCall:
+    """ a callback waiting in the scheduler. Cancelling is lazy: the call is just skipped when its deadline comes """
+
+    __slots__ = ("deadline", "callback", "owner", "cancelled")
+
+    def __init__(self, deadline: float, callback, owner):
+        self.deadline = deadline
+        self.callback = callback
+        self.owner = owner
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler(QObject):
+    """ Scheduler runs callbacks on the GUI thread once their deadline (in time.monotonic() seconds) has passed. Calls
+    can be scheduled from any thread. A call can be given an owner, a QObject whose deletion cancels it, so callbacks
+    never run against widgets that no longer exist. """
+
+    _rearm_requested = Signal()
+
+    def __init__(self):
+        super().__init__()
+        self._heap = []
+        # breaks ties between equal deadlines, so calls are never compared to each other
+        self._sequence = count()
+        self._lock = Lock()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._fire)
+        self._rearm_requested.connect(self._rearm)
+
+    def call_at(self, deadline: float, callback, owner=None) -> ScheduledCall:
+        """ run callback on the GUI thread once time.monotonic() reaches deadline """
+        call = ScheduledCall(deadline, callback, owner)
+        if not isValid(self):
+            # the application is shutting down (widgets hiding as they're torn down can still start debouncers)
+            return call
+        with self._lock:
+            heappush(self._heap, (deadline, next(self._sequence), call))
+            earliest = self._heap[0][2] is call
+        if earliest:
+            if QThread.currentThread() is self.thread():
+                self._rearm()
+            else:
+                # timers can only be started from their own thread. Emitting from another thread queues the call
+                self._rearm_requested.emit()
+        return call
+
+    def call_later(self, delay: float, callback, owner=None) -> ScheduledCall:
+        """ run callback on the GUI thread after delay seconds """
+        return self.call_at(monotonic() + delay, callback, owner)
+
+    def _rearm(self):
+        with self._lock:
+            deadline = self._heap[0][0] if self._heap else None
+        if deadline is None:
+            self._timer.stop()
+        else:
+            self._timer.start(max(0, ceil((deadline - monotonic()) * 1000)))
+
+    def _fire(self):
+        now = monotonic()
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                call = heappop(self._heap)[2]
+            if call.cancelled or (call.owner is not None and not isValid(call.owner)):
+                continue
+            try:
+                call.callback()
+            except Exception:
+                # one failing callback shouldn't hold up the rest
+                g_log.exception("scheduled call failed")
+        self._rearm()
+
+
+g_scheduler = Scheduler()
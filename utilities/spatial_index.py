@@ -0,0 +1,110 @@
+""" finding things on a page by where they are, without checking every one of them """
+
+from PySide6.QtCore import QRect, QPoint
+from heapq import heappush, heappop
+from itertools import count
+
+# the side of each grid cell, in pixels. Around the size of a typical item, so most items only overlap a few cells
+CELL_SIZE = 256
+
+
+class SpatialIndex:
+    """ rectangles (by key, like the items of a page) in a uniform grid of cells, each listing the keys of the
+    rectangles overlapping it. Queries only check the rectangles in the cells they cover.
+
+    The right-most and bottom-most edges of all the rectangles are kept in heaps, so they're always known without a
+    scan. Entries for rectangles that have since moved are left in the heaps and skipped once they surface """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self._rects = {}
+        self._cells = {}
+        # entries are (-edge, sequence, key, rect). The sequence breaks ties, so keys are never compared
+        self._rights = []
+        self._bottoms = []
+        self._sequence = count()
+
+    def __len__(self):
+        return len(self._rects)
+
+    def __contains__(self, key):
+        return key in self._rects
+
+    def _cells_of(self, rect: QRect):
+        size = self.cell_size
+        for x in range(rect.left() // size, rect.right() // size + 1):
+            for y in range(rect.top() // size, rect.bottom() // size + 1):
+                yield x, y
+
+    def insert(self, key, rect: QRect):
+        """ add key with rect, or move it there if it's already in the index """
+        previous = self._rects.get(key)
+        if previous == rect:
+            return
+        if previous is not None:
+            self._unlink(key, previous)
+        rect = QRect(rect)
+        self._rects[key] = rect
+        for cell in self._cells_of(rect):
+            self._cells.setdefault(cell, set()).add(key)
+        if len(self._rights) > 2 * len(self._rects) + 64:
+            # mostly entries for where rectangles used to be, after something has been moved around a lot
+            self._rebuild_extents()
+        heappush(self._rights, (-rect.right(), next(self._sequence), key, rect))
+        heappush(self._bottoms, (-rect.bottom(), next(self._sequence), key, rect))
+
+    def _rebuild_extents(self):
+        self._rights = []
+        self._bottoms = []
+        for key, rect in self._rects.items():
+            heappush(self._rights, (-rect.right(), next(self._sequence), key, rect))
+            heappush(self._bottoms, (-rect.bottom(), next(self._sequence), key, rect))
+
+    def remove(self, key):
+        rect = self._rects.pop(key, None)
+        if rect is not None:
+            self._unlink(key, rect)
+
+    def _unlink(self, key, rect: QRect):
+        for cell in self._cells_of(rect):
+            keys = self._cells[cell]
+            keys.discard(key)
+            if not keys:
+                del self._cells[cell]
+
+    def rect(self, key) -> QRect:
+        return self._rects[key]
+
+    def _extent(self, heap: list):
+        # drop entries for rectangles that have moved or been removed since they were pushed
+        while heap and self._rects.get(heap[0][2]) is not heap[0][3]:
+            heappop(heap)
+        return heap[0] if heap else None
+
+    @property
+    def right_most(self):
+        """ the key of the rectangle reaching furthest right, or None if the index is empty """
+        entry = self._extent(self._rights)
+        return None if entry is None else entry[2]
+
+    @property
+    def bottom_most(self):
+        """ the key of the rectangle reaching furthest down, or None if the index is empty """
+        entry = self._extent(self._bottoms)
+        return None if entry is None else entry[2]
+
+    def intersecting(self, rect: QRect) -> set:
+        """ the keys of every rectangle intersecting rect """
+        found = set()
+        if rect.isEmpty():
+            return found
+        for cell in self._cells_of(rect):
+            for key in self._cells.get(cell, ()):
+                if key not in found and self._rects[key].intersects(rect):
+                    found.add(key)
+        return found
+
+    def at(self, point: QPoint) -> set:
+        """ the keys of every rectangle containing point """
+        cell = (point.x() // self.cell_size, point.y() // self.cell_size)
+        return {key for key in self._cells.get(cell, ()) if self._rects[key].contains(point)}
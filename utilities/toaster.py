@@ -1,7 +1,7 @@
 """ MixIn for emitting toast messages """
 
 from PySide6.QtCore import Signal
-from utilities.debounce import Debouncer
+from utilities.scheduler import g_scheduler
 from PySide6 import QtWidgets
 from style_consants import *
 
@@ -23,6 +23,12 @@ class ToasterMixin:
         pos.setHeight(20)
         # TODO make width and positioning based on number of characters
         label.setGeometry(pos)
-        self.debouncer = Debouncer()
-        self.debouncer.bounced.connect(label.deleteLater)
-        self.debouncer.start()
+        g_scheduler.call_later(3, label.deleteLater, label)
+
+
+def toast_near(widget, message: str):
+    """ toast message on widget, or the nearest of its parents that can show toasts. Does nothing if none can """
+    while widget is not None and not isinstance(widget, ToasterMixin):
+        widget = widget.parent()
+    if widget is not None:
+        widget.toast(message)
@@ -0,0 +1,73 @@
+""" the stacking order of a page's items """
+
+
+class ZOrder:
+    """ items in stacking order, bottom first. Each item's z_index is a sort key rather than its position: keys are
+    sparse, so raising an item to the top (or lowering it to the bottom) only gives it a key past the current top (or
+    bottom), and removing one leaves every other key as it was. Keys are whole numbers. Iterating sorts by key, once
+    per change, and almost sorted keys sort in close to linear time """
+
+    def __init__(self):
+        self._keys = {}
+        # the highest and lowest keys handed out. Not lowered when the item holding them is removed; keys only have
+        # to be in order, not contiguous
+        self._top = None
+        self._bottom = None
+        self._ordered = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, item):
+        return item in self._keys
+
+    def __iter__(self):
+        return iter(self.ordered())
+
+    def ordered(self) -> list:
+        """ every item, bottom first """
+        if self._ordered is None:
+            self._ordered = sorted(self._keys, key=self._keys.__getitem__)
+        return self._ordered
+
+    def _set(self, item, key):
+        self._keys[item] = key
+        item.z_index = key
+        if self._top is None or key > self._top:
+            self._top = key
+        if self._bottom is None or key < self._bottom:
+            self._bottom = key
+        self._ordered = None
+
+    def append(self, item):
+        """ add item on top """
+        self._set(item, 0 if self._top is None else self._top + 1)
+
+    def raise_(self, item):
+        if self._keys[item] != self._top:
+            self._set(item, self._top + 1)
+
+    def lower(self, item):
+        if self._keys[item] != self._bottom:
+            self._set(item, self._bottom - 1)
+
+    def raise_all(self, items):
+        """ bring items to the top, keeping their order among themselves """
+        for each in sorted(items, key=self._keys.__getitem__):
+            self._set(each, self._top + 1)
+
+    def lower_all(self, items):
+        """ send items to the bottom, keeping their order among themselves """
+        for each in sorted(items, key=self._keys.__getitem__, reverse=True):
+            self._set(each, self._bottom - 1)
+
+    def remove(self, item):
+        del self._keys[item]
+        self._ordered = None
+
+    def replace(self, old, new):
+        """ put new where old was, as when an item is swapped for a record of it """
+        key = self._keys.pop(old)
+        self._keys[new] = key
+        new.z_index = key
+        self._ordered = None